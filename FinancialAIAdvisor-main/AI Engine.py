@@ -1,15 +1,9 @@
-def get_currency_format(amount):
-    return "${:,.2f}".format(amount)
+import sys
 
-def calculate_recommendation(salary):
-    if salary < 30000:
-        return 10
-    elif 30000 <= salary < 60000:
-        return 15
-    elif 60000 <= salary < 100000:
-        return 20
-    else:
-        return 25
+# Bracket rules live in allocation.py so batch runs use the same logic
+from allocation import allocate_one, calculate_recommendation, get_currency_format
+from allocation import PROJECTION_YEARS, project_investment
+from allocation import main as batch_main
 
 def main():
     print("🤖 Welcome to the Salary Allocation AI Engine! 💰")
@@ -54,8 +48,7 @@ def main():
                     print("❌ Invalid input. Please enter numbers only.")
         
         # Calculate amounts
-        invest_amount = salary * (invest_percent / 100)
-        manage_amount = salary - invest_amount
+        invest_percent, invest_amount, manage_amount = allocate_one(salary, invest_percent)
         
         # Display results
         print("\n📊 Allocation Results:")
@@ -63,6 +56,22 @@ def main():
         print(f"Investing ({invest_percent}%): {get_currency_format(invest_amount)}")
         print(f"Management ({100 - invest_percent}%): {get_currency_format(manage_amount)}")
         
+        # Optional outlook for investing this amount every month
+        if invest_amount > 0:
+            outlook = input(f"\nProject investing {get_currency_format(invest_amount)} monthly for "
+                            f"{PROJECTION_YEARS} years in gold and the EGX100? (y/n): ").lower()
+            if outlook == 'y':
+                try:
+                    yearly = project_investment(invest_amount)
+                except Exception as e:
+                    print(f"❌ Projection unavailable: {e}")
+                else:
+                    print("\n🔮 Projected portfolio value (5th-95th percentile band):")
+                    for row in yearly.itertuples():
+                        print(f"Year {row.month // 12}: invested {get_currency_format(row.invested)}, "
+                              f"median {get_currency_format(row.p50)} "
+                              f"({get_currency_format(row.p5)} - {get_currency_format(row.p95)})")
+        
         # Restart option
         restart = input("\nWould you like to make another allocation? (y/n): ").lower()
         if restart != 'y':
@@ -72,4 +81,8 @@ def main():
         print("\n" + "="*50 + "\n")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # With arguments, run a batch allocation (see allocation.py --help)
+    if len(sys.argv) > 1:
+        batch_main(sys.argv[1:])
+    else:
+        main()
\ No newline at end of file
@@ -0,0 +1,345 @@
+"""Multi-user salary allocation sessions over HTTP, built on asyncio.
+
+Each session walks the same steps as the ``AI Engine.py`` prompt: enter a
+salary and get the recommendation, then take it or give a custom
+percentage, then read the allocation.  Validation and arithmetic come from
+``allocation.py``, so answers match the interactive engine.
+
+Sessions are small slotted objects kept in insertion/touch order; a
+background sweep drops the ones idle for longer than ``idle_timeout``
+from the front of that order without scanning the rest.
+
+Endpoints (JSON in and out)::
+
+    POST   /sessions                      -> {"session": id, "step": "salary"}
+    POST   /sessions/<id>/salary          {"salary": 45000}
+    POST   /sessions/<id>/allocation      {"percent": 30}   (omit to use the recommendation)
+    GET    /sessions/<id>
+    DELETE /sessions/<id>
+    GET    /health
+
+Command line::
+
+    python allocation_service.py --port 8766
+    python allocation_service.py --load-test 5000 --concurrency 500
+"""
+
+import argparse
+import asyncio
+import json
+import secrets
+import time
+from collections import OrderedDict
+
+from allocation import (allocate_one, calculate_recommendation, get_currency_format,
+                        validate_percent, validate_salary)
+
+IDLE_TIMEOUT = 15 * 60
+SWEEP_INTERVAL = 30
+MAX_BODY = 16 * 1024
+
+
+class SessionError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class Session:
+    __slots__ = ('salary', 'recommended', 'invest_percent', 'step', 'last_seen')
+
+    def __init__(self, now):
+        self.salary = None
+        self.recommended = None
+        self.invest_percent = None
+        self.step = 'salary'
+        self.last_seen = now
+
+
+def _split(salary, percent):
+    invest_percent, invest_amount, manage_amount = allocate_one(salary, percent)
+    return {
+        'invest_percent': invest_percent,
+        'invest_amount': invest_amount,
+        'manage_amount': manage_amount,
+        'manage_percent': 100 - invest_percent,
+        'formatted': {
+            'salary': get_currency_format(salary),
+            'invest_amount': get_currency_format(invest_amount),
+            'manage_amount': get_currency_format(manage_amount),
+        },
+    }
+
+
+class AllocationService:
+    """Session store plus the three allocation steps."""
+
+    def __init__(self, idle_timeout=IDLE_TIMEOUT, clock=time.monotonic):
+        self.idle_timeout = idle_timeout
+        self.clock = clock
+        self.sessions = OrderedDict()
+        self.evicted = 0
+
+    def _touch(self, session_id):
+        session = self.sessions.get(session_id)
+        if session is None:
+            raise SessionError("❌ Unknown or expired session", status=404)
+        session.last_seen = self.clock()
+        self.sessions.move_to_end(session_id)
+        return session
+
+    def create(self):
+        session_id = secrets.token_hex(8)
+        self.sessions[session_id] = Session(self.clock())
+        return {'session': session_id, 'step': 'salary'}
+
+    def recommend(self, session_id, salary):
+        # A new salary at any step restarts the allocation, like answering 'y'
+        session = self._touch(session_id)
+        session.salary = validate_salary(salary)
+        session.recommended = calculate_recommendation(session.salary)
+        session.invest_percent = None
+        session.step = 'choice'
+        return dict(_split(session.salary, session.recommended), session=session_id,
+                    step='choice', salary=session.salary,
+                    recommended_percent=session.recommended)
+
+    def allocate(self, session_id, percent=None):
+        session = self._touch(session_id)
+        if session.step == 'salary':
+            raise SessionError("❌ Enter a salary first", status=409)
+        session.invest_percent = session.recommended if percent is None else validate_percent(percent)
+        session.step = 'done'
+        return self.result(session_id)
+
+    def result(self, session_id):
+        session = self._touch(session_id)
+        state = {'session': session_id, 'step': session.step}
+        if session.salary is None:
+            return state
+        state.update(salary=session.salary, recommended_percent=session.recommended)
+        if session.invest_percent is not None:
+            state.update(_split(session.salary, session.invest_percent))
+        return state
+
+    def close(self, session_id):
+        if self.sessions.pop(session_id, None) is None:
+            raise SessionError("❌ Unknown or expired session", status=404)
+        return {'session': session_id, 'step': 'closed'}
+
+    def evict_idle(self):
+        """Drop sessions idle past the timeout; they sit at the front of the order."""
+        cutoff = self.clock() - self.idle_timeout
+        removed = 0
+        while self.sessions:
+            session_id, session = next(iter(self.sessions.items()))
+            if session.last_seen > cutoff:
+                break
+            del self.sessions[session_id]
+            removed += 1
+        self.evicted += removed
+        return removed
+
+    def route(self, method, path, body):
+        """Dispatch one request; returns ``(status, payload)``."""
+        parts = [p for p in path.split('?')[0].split('/') if p]
+        try:
+            if parts == ['health'] and method == 'GET':
+                return 200, {'status': 'ok', 'sessions': len(self.sessions), 'evicted': self.evicted}
+            if parts == ['sessions'] and method == 'POST':
+                return 201, self.create()
+            if len(parts) in (2, 3) and parts[0] == 'sessions':
+                session_id = parts[1]
+                action = parts[2] if len(parts) == 3 else None
+                if action is None and method == 'GET':
+                    return 200, self.result(session_id)
+                if action is None and method == 'DELETE':
+                    return 200, self.close(session_id)
+                if action == 'salary' and method == 'POST':
+                    return 200, self.recommend(session_id, body.get('salary'))
+                if action == 'allocation' and method == 'POST':
+                    return 200, self.allocate(session_id, body.get('percent'))
+            return 404, {'error': f"No route for {method} {path}"}
+        except SessionError as e:
+            return e.status, {'error': str(e)}
+        except ValueError as e:
+            return 400, {'error': str(e)}
+
+
+_REASONS = {200: 'OK', 201: 'Created', 400: 'Bad Request', 404: 'Not Found',
+            409: 'Conflict', 413: 'Payload Too Large'}
+
+
+async def _handle_connection(service, reader, writer):
+    # Minimal HTTP/1.1 with keep-alive; requests are tiny JSON bodies
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                break
+            method, path, _ = request_line.decode('latin-1').split(' ', 2)
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            length = int(headers.get('content-length') or 0)
+            if length > MAX_BODY:
+                # Answer, then drop the connection rather than read the body
+                status, payload = 413, {'error': 'Request body too large'}
+                headers['connection'] = 'close'
+            else:
+                raw = await reader.readexactly(length) if length else b''
+                try:
+                    body = json.loads(raw) if raw else {}
+                    if not isinstance(body, dict):
+                        raise ValueError("Body must be a JSON object")
+                    status, payload = service.route(method, path, body)
+                except ValueError as e:
+                    status, payload = 400, {'error': str(e)}
+            data = json.dumps(payload).encode()
+            keep_alive = headers.get('connection', '').lower() != 'close'
+            writer.write(
+                f"HTTP/1.1 {status} {_REASONS.get(status, 'OK')}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data)
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+        pass
+    finally:
+        writer.close()
+
+
+async def _sweep(service, interval):
+    while True:
+        await asyncio.sleep(interval)
+        service.evict_idle()
+
+
+async def serve(service, host='127.0.0.1', port=8766, sweep_interval=SWEEP_INTERVAL):
+    """Start the server and the idle sweeper; returns ``(server, sweeper task)``."""
+    server = await asyncio.start_server(
+        lambda r, w: _handle_connection(service, r, w), host, port, backlog=4096)
+    sweeper = asyncio.create_task(_sweep(service, sweep_interval))
+    return server, sweeper
+
+
+async def _request(reader, writer, method, path, payload=None):
+    data = json.dumps(payload).encode() if payload is not None else b''
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: localhost\r\n"
+                 f"Content-Length: {len(data)}\r\n\r\n".encode() + data)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        if line.lower().startswith(b'content-length:'):
+            length = int(line.split(b':')[1])
+    return status, json.loads(await reader.readexactly(length))
+
+
+async def load_test(sessions=1000, concurrency=200, host='127.0.0.1', port=0, seed=0):
+    """Drive ``sessions`` simulated users through a local server.
+
+    Each user opens a connection, enters a salary, takes the recommendation
+    or a custom percentage, reads the result and closes the session.  Every
+    result is checked against ``allocate_one``.
+    """
+    import random
+    import statistics
+
+    service = AllocationService()
+    server, sweeper = await serve(service, host, port)
+    port = server.sockets[0].getsockname()[1]
+    rng = random.Random(seed)
+    latencies = []
+    mismatches = 0
+    limit = asyncio.Semaphore(concurrency)
+
+    async def user():
+        nonlocal mismatches
+        salary = round(rng.lognormvariate(10.8, 0.6), 2)
+        percent = rng.choice([None, rng.randint(0, 100)])
+        async with limit:
+            reader, writer = await asyncio.open_connection(host, port)
+            try:
+                results = []
+                started = time.perf_counter()
+                _, created = await _request(reader, writer, 'POST', '/sessions')
+                sid = created['session']
+                latencies.append(time.perf_counter() - started)
+                for method, path, payload in (
+                        ('POST', f'/sessions/{sid}/salary', {'salary': salary}),
+                        ('POST', f'/sessions/{sid}/allocation',
+                         {} if percent is None else {'percent': percent}),
+                        ('DELETE', f'/sessions/{sid}', None)):
+                    started = time.perf_counter()
+                    status, body = await _request(reader, writer, method, path, payload)
+                    latencies.append(time.perf_counter() - started)
+                    results.append((status, body))
+                expected = allocate_one(salary, percent)
+                status, body = results[1]
+                if status != 200 or (body['invest_amount'], body['manage_amount']) != expected[1:]:
+                    mismatches += 1
+            finally:
+                writer.close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user() for _ in range(sessions)))
+    elapsed = time.perf_counter() - started
+    sweeper.cancel()
+    server.close()
+    await server.wait_closed()
+
+    latencies.sort()
+    return {
+        'sessions': sessions,
+        'requests': len(latencies),
+        'seconds': elapsed,
+        'requests_per_second': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p99_ms': latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        'mismatches': mismatches,
+        'open_sessions': len(service.sessions),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve salary allocation sessions over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8766)
+    parser.add_argument('--idle-timeout', type=float, default=IDLE_TIMEOUT)
+    parser.add_argument('--load-test', type=int, metavar='SESSIONS',
+                        help="run simulated sessions against a local server and exit")
+    parser.add_argument('--concurrency', type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if args.load_test:
+        report = asyncio.run(load_test(args.load_test, args.concurrency, args.host))
+        print(f"✅ {report['sessions']:,} sessions, {report['requests']:,} requests in "
+              f"{report['seconds']:.2f}s ({report['requests_per_second']:,.0f} req/s)")
+        print(f"Latency p50 {report['p50_ms']:.2f} ms, p99 {report['p99_ms']:.2f} ms; "
+              f"mismatches: {report['mismatches']}, sessions left open: {report['open_sessions']}")
+        return
+
+    async def run():
+        service = AllocationService(idle_timeout=args.idle_timeout)
+        server, _ = await serve(service, args.host, args.port)
+        print(f"🤖 Allocation service listening on http://{args.host}:{args.port}")
+        async with server:
+            await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -66,6 +66,21 @@ const fetchMetalPrices = async () => {
   }
 };
 
+// Local Python forecast service (services/forecasting/serve.py)
+const FORECAST_SERVICE_URL = process.env.FORECAST_SERVICE_URL || "http://127.0.0.1:8765";
+
+const fetchForecast = async (asset, model = "arima", steps = 7) => {
+  try {
+    const response = await axios.get(`${FORECAST_SERVICE_URL}/forecast`, {
+      params: { asset, model, steps },
+      timeout: 2000,
+    });
+    return response.data || "No forecast available.";
+  } catch (error) {
+    return "❌ Unable to fetch forecast.";
+  }
+};
+
 // ✅ **Handle Incoming Chat Requests**
 export const handleChatRequest = async (req, res) => {
   const { message } = req.body;
@@ -88,7 +103,11 @@ export const handleChatRequest = async (req, res) => {
 
     // ✅ Determine Relevant API
     let financialData = "❌ No relevant financial data found.";
-    if (message.includes("exchange rate") || message.includes("currency")) {
+    if (lowerMessage.includes("forecast") || lowerMessage.includes("predict")) {
+      const asset = lowerMessage.includes("egx") ? "egx100" : "gold";
+      const model = ["sarima", "prophet", "lstm"].find((name) => lowerMessage.includes(name)) || "arima";
+      financialData = await fetchForecast(asset, model);
+    } else if (message.includes("exchange rate") || message.includes("currency")) {
       financialData = await fetchCurrencyRates();
     } else if (message.includes("stock") || message.includes("market gainers")) {
       financialData = await fetchStockGainers();
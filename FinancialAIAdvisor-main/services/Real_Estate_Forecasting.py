@@ -1,200 +1,174 @@
 import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from statsmodels.tsa.arima.model import ARIMA
-from statsmodels.tsa.statespace.sarimax import SARIMAX
-from prophet import Prophet
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense, LSTM
-from sklearn.preprocessing import MinMaxScaler
+from forecasting import charts  # FORECAST_CHARTS=png|svg|show|off
+from forecasting.cache import ModelCache
+from forecasting.models import SEQUENCE_LENGTH, split_sizes
+from forecasting.options import PipelineOptions
+from forecasting.order_search import search_order
+from forecasting.results import ResultStore
+from forecasting.listings import ListingStats, concat_listings, fill_missing, read_listings
+from forecasting.routing import route
+from forecasting.runner import run_models
+from forecasting.trace import log, span  # set FORECAST_TRACE=run.jsonl to record timings
+from forecasting.valuation import VALUATION_COLUMNS, fit_valuation
 import warnings
 
 warnings.filterwarnings('ignore')
 
-# Debug Log
-def log(message):
-    print(f"DEBUG: {message}")
-
 # Load dataset
 file_path = './egypt_House_prices.csv'
 
-log("Loading dataset...")
-try:
-    # Update to load CSV file
-    df = pd.read_csv(file_path)
-    log("Dataset loaded successfully.")
-except Exception as e:
-    print(f"Error reading the CSV file: {e}")
-    exit()
-
-# Display dataset structure and initial stats
-log("Displaying dataset structure...")
-print(df.head())
-print(df.info())
-print(df.isna().sum())
-print(df.describe())
-
-"""## Data Preprocessing"""
-log("Preprocessing data...")
-
-# Convert columns to numeric (coerce errors to NaN)
-df['Price'] = pd.to_numeric(df['Price'], errors='coerce')
-df['Bedrooms'] = pd.to_numeric(df['Bedrooms'], errors='coerce')
-df['Bathrooms'] = pd.to_numeric(df['Bathrooms'], errors='coerce')
-df['Area'] = pd.to_numeric(df['Area'], errors='coerce')
-
-# Fill missing values for these numeric columns
-df['Price'].fillna(df['Price'].mean(), inplace=True)
-df['Bedrooms'].fillna(df['Bedrooms'].median(), inplace=True)
-df['Bathrooms'].fillna(df['Bathrooms'].median(), inplace=True)
-df['Area'].fillna(df['Area'].mean(), inplace=True)
-
-# Check again for any missing values after filling
-log(f"Missing values after preprocessing: {df.isna().sum()}")
-
-# Optional: If you want to visualize price trends or any other column (e.g., 'Price')
-plt.figure(figsize=(10, 6))
-sns.lineplot(data=df, x=df.index, y='Price')  # Adjust 'Price' if necessary
-plt.title('Price Trend After Preprocessing')
-plt.xlabel('Index')
-plt.ylabel('Price')
-plt.xticks(rotation=45)
-plt.show()
-log("Data preprocessing completed successfully. Proceeding to train-test split...")
-
-# Target column for forecasting
-house_prices = df['Price']  # Adjust to match the column for house prices
-
-"""### Train-Validate-Test Split"""
-log("Splitting data into train, validate, and test sets...")
-train_size = int(len(house_prices) * 0.7)  # 70% for training
-val_size = int(len(house_prices) * 0.15)   # 15% for validation
-train, val, test = (
-    house_prices[:train_size],
-    house_prices[train_size:train_size + val_size],
-    house_prices[train_size + val_size:],
-)
-
-"""### ARIMA Forecasting"""
-log("ARIMA Forecasting started...")
-arima_model = ARIMA(train, order=(1, 1, 1))
-arima_fitted = arima_model.fit()
-arima_forecast = arima_fitted.forecast(steps=len(test))
-
-# Plot ARIMA results
-plt.figure(figsize=(12, 6))
-plt.plot(train, label='Train')
-plt.plot(val, label='Validation', color='purple')
-plt.plot(test, label='Test', color='orange')
-plt.plot(test.index, arima_forecast, label='ARIMA Forecast', color='green')
-plt.title('ARIMA Forecast')
-plt.legend()
-plt.show()
-
-# Evaluate ARIMA
-arima_mae = mean_absolute_error(test, arima_forecast)
-arima_rmse = np.sqrt(mean_squared_error(test, arima_forecast))
-arima_r2 = r2_score(test, arima_forecast)
-log(f"ARIMA Metrics: MAE={arima_mae}, RMSE={arima_rmse}, R^2={arima_r2}")
-
-"""### SARIMA Forecasting"""
-log("SARIMA Forecasting started...")
-sarima_model = SARIMAX(train, order=(1, 1, 1), seasonal_order=(1, 1, 1, 12))
-sarima_fitted = sarima_model.fit(disp=False)
-sarima_forecast = sarima_fitted.forecast(steps=len(test))
-
-# Plot SARIMA results
-plt.figure(figsize=(12, 6))
-plt.plot(train, label='Train')
-plt.plot(val, label='Validation', color='purple')
-plt.plot(test, label='Test', color='orange')
-plt.plot(test.index, sarima_forecast, label='SARIMA Forecast', color='green')
-plt.title('SARIMA Forecast')
-plt.legend()
-plt.show()
-
-# Evaluate SARIMA
-sarima_mae = mean_absolute_error(test, sarima_forecast)
-sarima_rmse = np.sqrt(mean_squared_error(test, sarima_forecast))
-sarima_r2 = r2_score(test, sarima_forecast)
-log(f"SARIMA Metrics: MAE={sarima_mae}, RMSE={sarima_rmse}, R^2={sarima_r2}")
-
-"""### Prophet Forecasting"""
-log("Prophet Forecasting started...")
-
-# Ensure proper column names for Prophet (use 'Date' or an appropriate column)
-if 'Date' not in df.columns:
-    # Assuming the dataset does not have a 'Date' column, create one using the index as a date range
-    df['Date'] = pd.date_range(start='2022-01-01', periods=len(df), freq='D')
-
-# Prepare the data for Prophet
-prophet_data = df[['Date', 'Price']].rename(columns={'Date': 'ds', 'Price': 'y'})
-prophet_model = Prophet(yearly_seasonality=True)
-prophet_model.fit(prophet_data)
-
-future = prophet_model.make_future_dataframe(periods=len(test))
-prophet_forecast = prophet_model.predict(future)
-
-# Plot Prophet results
-fig = prophet_model.plot(prophet_forecast)
-plt.title('Prophet Forecast')
-plt.show()
-
-# Evaluate Prophet
-prophet_pred = prophet_forecast[-len(test):]['yhat'].values
-prophet_mae = mean_absolute_error(test, prophet_pred)
-prophet_rmse = np.sqrt(mean_squared_error(test, prophet_pred))
-prophet_r2 = r2_score(test, prophet_pred)
-log(f"Prophet Metrics: MAE={prophet_mae}, RMSE={prophet_rmse}, R^2={prophet_r2}")
-
-"""### LSTM Forecasting"""
-log("LSTM Forecasting started...")
-scaler = MinMaxScaler(feature_range=(0, 1))
-scaled_data = scaler.fit_transform(house_prices.values.reshape(-1, 1))
-
-train_scaled, val_scaled, test_scaled = (
-    scaled_data[:train_size],
-    scaled_data[train_size:train_size + val_size],
-    scaled_data[train_size + val_size:],
-)
-
-def create_sequences(data, sequence_length=60):
-    X, y = [], []
-    for i in range(len(data) - sequence_length):
-        X.append(data[i:i + sequence_length])
-        y.append(data[i + sequence_length])
-    return np.array(X), np.array(y)
-
-sequence_length = 60
-X_train, y_train = create_sequences(train_scaled, sequence_length)
-X_val, y_val = create_sequences(val_scaled, sequence_length)
-X_test, y_test = create_sequences(test_scaled, sequence_length)
-
-# Define and train LSTM model for 10 epochs
-lstm_model = Sequential([
-    LSTM(50, return_sequences=True, input_shape=(X_train.shape[1], 1)),
-    LSTM(50, return_sequences=False),
-    Dense(25),
-    Dense(1)
-])
-lstm_model.compile(optimizer='adam', loss='mean_squared_error')
-lstm_model.fit(X_train, y_train, validation_data=(X_val, y_val), batch_size=32, epochs=10)
-
-lstm_pred_scaled = lstm_model.predict(X_test)
-lstm_pred = scaler.inverse_transform(lstm_pred_scaled)
-
-# Plot LSTM results
-plt.figure(figsize=(12, 6))
-plt.plot(test.index[sequence_length:], test.values[sequence_length:], label='Test')
-plt.plot(test.index[sequence_length:], lstm_pred.flatten(), label='LSTM Forecast', color='green')
-plt.title('LSTM Forecast')
-plt.legend()
-plt.show()
-
-# Evaluate LSTM
-lstm_mae = mean_absolute_error(test.values[sequence_length:], lstm_pred.flatten())
-lstm_rmse = np.sqrt(mean_squared_error(test.values[sequence_length:], lstm_pred.flatten()))
-lstm_r2 = r2_score(test.values[sequence_length:], lstm_pred.flatten())
-log(f"LSTM Metrics: MAE={lstm_mae}, RMSE={lstm_rmse}, R^2={lstm_r2}")
+# Opt-in features (order search, fast LSTM training, routing, warm Prophet,
+# result storage) come from FORECAST_OPTIONS; see forecasting/options.py
+options = PipelineOptions.from_env()
+
+
+def main():
+    log("Loading dataset...")
+    with span('load'):
+        try:
+            # Typed, chunked read (forecasting/listings.py): categoricals, Int8
+            # rooms/floor and float32 price/area.  This first pass only gathers
+            # the imputation statistics; no chunk is kept
+            stats = ListingStats.from_chunks(read_listings(file_path))
+            log("Dataset loaded successfully.")
+        except Exception as e:
+            print(f"Error reading the CSV file: {e}")
+            exit()
+
+    # Display dataset structure and initial stats
+    log("Displaying dataset structure...")
+    print(next(read_listings(file_path, chunksize=5)))
+    print(f"{stats.rows:,} listings")
+    for column in stats.count:
+        print(f"{column}: {stats.rows - stats.count[column]:,} missing, mean {stats.mean(column):,.2f}")
+
+    """## Data Preprocessing"""
+    log("Preprocessing data...")
+
+    with span('preprocess'):
+        # Fill the missing Price/Area with the mean and Bedrooms/Bathrooms
+        # with the median, chunk by chunk.  Only the filled prices and the
+        # raw columns the hedonic model reads are kept
+        prices, valuation_chunks, missing = [], [], 0
+        for chunk in read_listings(file_path):
+            valuation_chunks.append(chunk[VALUATION_COLUMNS])
+            chunk = fill_missing(chunk, stats=stats)
+            missing = missing + chunk.isna().sum()
+            prices.append(chunk['Price'])
+        listings = concat_listings(valuation_chunks)
+
+    # Check again for any missing values after filling
+    log(f"Missing values after preprocessing: {missing}")
+
+    # Target column for forecasting
+    # Adjust to match the column for house prices; the models work in float64
+    house_prices = pd.concat(prices, ignore_index=True).astype('float64')
+
+    # Optional: If you want to visualize price trends or any other column (e.g., 'Price')
+    charts.line('real_estate_trend', [charts.series(house_prices)],
+                title='Price Trend After Preprocessing', xlabel='Index', ylabel='Price',
+                figsize=(10, 6), rotate_xticks=45)
+    log("Data preprocessing completed successfully. Proceeding to train-test split...")
+
+    """### Train-Validate-Test Split"""
+    log("Splitting data into train, validate, and test sets...")
+    with span('split'):
+        train_size, val_size = split_sizes(len(house_prices))  # 70% train, 15% validation
+        train, val, test = (
+            house_prices[:train_size],
+            house_prices[train_size:train_size + val_size],
+            house_prices[train_size + val_size:],
+        )
+
+    """### Model Fitting"""
+    cache = ModelCache()
+    configs = None
+    if options.search_orders:
+        log("Searching ARIMA/SARIMA orders...")
+        search = search_order(train, cache=cache)
+        configs = search.configs()
+        log(f"Selected ARIMA order={configs['arima']['order']}, SARIMA order={search.order}, "
+            f"seasonal_order={search.seasonal_order}")
+    configs = options.model_configs(configs)
+
+    # ARIMA, SARIMA, Prophet and LSTM fit concurrently in worker processes;
+    # fitted models are reused across runs while the data and config are unchanged
+    log("Fitting ARIMA, SARIMA, Prophet and LSTM...")
+    with span('fit'):
+        if options.route_models:
+            routed = route('real_estate', house_prices, train_size, val_size, cache=cache, configs=configs)
+            run = routed.run
+            log(f"Routing: {routed.summary()}")
+        else:
+            run = run_models(house_prices, train_size, val_size, cache=cache, configs=configs)
+        log(f"Model fitting finished in {run.seconds:.1f}s")
+    for name, error in run.failures.items():
+        log(f"Error during {name.upper()} forecasting: {error}")
+
+    """### ARIMA / SARIMA Forecasting"""
+    for name, label in (('arima', 'ARIMA'), ('sarima', 'SARIMA')):
+        result = run[name]
+        if not result.ok:
+            continue
+
+        # Plot results
+        charts.line(f'real_estate_{name}', [
+            charts.series(train, 'Train'),
+            charts.series(val, 'Validation', 'purple'),
+            charts.series(test, 'Test', 'orange'),
+            charts.series(result.forecast, f'{label} Forecast', 'green', index=test.index),
+        ], title=f'{label} Forecast')
+
+        metrics = result.metrics
+        log(f"{label} Metrics: MAE={metrics['mae']}, RMSE={metrics['rmse']}, R^2={metrics['r2']}")
+
+    """### Prophet Forecasting"""
+    # The listings have no date column, so Prophet runs on a synthetic daily
+    # index starting 2022-01-01 (see forecasting.models.prophet_frame)
+    result = run['prophet']
+    if result.ok:
+        # Plot Prophet results
+        charts.prophet('real_estate_prophet', house_prices, result.forecast,
+                       title='Prophet Forecast')
+
+        metrics = result.metrics
+        log(f"Prophet Metrics: MAE={metrics['mae']}, RMSE={metrics['rmse']}, R^2={metrics['r2']}")
+
+    """### LSTM Forecasting"""
+    result = run['lstm']
+    if result.ok:
+        sequence_length = SEQUENCE_LENGTH
+
+        # Plot LSTM results
+        charts.line('real_estate_lstm', [
+            charts.series(test[sequence_length:], 'Test'),
+            charts.series(result.forecast, 'LSTM Forecast', 'green'),
+        ], title='LSTM Forecast')
+
+        metrics = result.metrics
+        log(f"LSTM Metrics: MAE={metrics['mae']}, RMSE={metrics['rmse']}, R^2={metrics['r2']}")
+
+    """### Hedonic Valuation"""
+    # The listings are a cross-section; a model of price on the listing
+    # attributes (forecasting/valuation.py) is the like-for-like comparison
+    log("Fitting hedonic valuation model...")
+    with span('hedonic'):
+        _, metrics = fit_valuation(listings, cache=cache)
+    log(f"Hedonic Metrics: MAE={metrics['mae']}, RMSE={metrics['rmse']}, R^2={metrics['r2']}, "
+        f"median error={metrics['median_abs_pct_error']:.1f}%")
+
+    # Every forecast point, interval and metric, for readers that do not rerun the script
+    if options.store_results:
+        try:
+            run_id = ResultStore().record_run('real_estate', run, house_prices,
+                                              source='Real_Estate_Forecasting',
+                                              metrics={'hedonic': metrics})
+            log(f"Stored forecasts and metrics as run {run_id}")
+        except Exception as e:
+            log(f"Error storing results: {e}")
+
+
+if __name__ == "__main__":
+    with span('Real_Estate_Forecasting'):
+        main()
+        charts.close()
@@ -0,0 +1,206 @@
+"""One entry point for the forecasting models, importing only what it runs.
+
+The per-asset scripts import TensorFlow, Prophet, statsmodels, seaborn and
+matplotlib up front.  This command imports nothing heavy at module level:
+pandas comes in with the data, and each model backend is imported inside
+its stage only when that model is selected.  Cache hits return the stored
+forecast and metrics without deserializing the model, so a repeat
+ARIMA-only check never imports statsmodels at all.
+
+``--import-report`` prints the time spent importing each top-level package
+(first import, excluding nested packages), plus the data load; ``--budget``
+turns that into a check that exits non-zero when startup is too slow.
+
+Command line (from the repository root, or ``python forecast.py`` here)::
+
+    python -m services.forecast --asset gold --models arima,sarima
+    python -m services.forecast --asset egx100 --data ./EGX100.xls --target INDEXCLOSE --models lstm
+    python -m services.forecast --asset gold --models arima --import-report --budget 1.0
+    python -m services.forecast --asset egx100 --resolution M --models sarima,prophet
+
+Each run is recorded in the results store (``forecasting/results.py``)
+unless ``--no-store`` is given.
+"""
+
+import argparse
+import builtins
+import sys
+import threading
+import time
+from pathlib import Path
+
+STARTED = time.perf_counter()
+
+# The forecasting package lives next to this file; make it importable under
+# the same name the scripts (and spawned workers) use
+SERVICES_DIR = Path(__file__).resolve().parent
+if str(SERVICES_DIR) not in sys.path:
+    sys.path.insert(0, str(SERVICES_DIR))
+
+
+class ImportTimer:
+    """Wall time of first imports, attributed to each top-level package.
+
+    Only absolute imports of modules not yet in ``sys.modules`` are timed,
+    and time spent importing other packages from inside one is charged to
+    those packages, so ``pandas`` pulled in by ``statsmodels`` shows up as
+    pandas.  Imports from other threads pass straight through.
+    """
+
+    def __init__(self):
+        self.seconds = {}
+        self._stack = []
+        self._original = None
+        self._thread = threading.get_ident()
+
+    def install(self):
+        self._original = builtins.__import__
+        builtins.__import__ = self._import
+        return self
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules or threading.get_ident() != self._thread:
+            return self._original(name, globals, locals, fromlist, level)
+        self._stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            nested = self._stack.pop()
+            package = name.partition('.')[0]
+            self.seconds[package] = self.seconds.get(package, 0.0) + elapsed - nested
+            if self._stack:
+                self._stack[-1] += elapsed
+
+    @property
+    def total(self):
+        return sum(self.seconds.values())
+
+    def report(self, limit=12, min_seconds=0.005):
+        rows = sorted(self.seconds.items(), key=lambda item: -item[1])
+        shown = [(name, seconds) for name, seconds in rows[:limit] if seconds >= min_seconds]
+        width = max([len(name) for name, _ in shown] + [8])
+        lines = [f"  {name:<{width}} {seconds:6.3f}s" for name, seconds in shown]
+        rest = self.total - sum(seconds for _, seconds in shown)
+        if rest > 0:
+            lines.append(f"  {'(other)':<{width}} {rest:6.3f}s")
+        return '\n'.join(lines)
+
+
+IMPORTS = ImportTimer().install()
+
+
+def _model_list(text):
+    from forecasting.models import MODEL_NAMES
+
+    names = [name.strip().lower() for name in text.split(',') if name.strip()]
+    unknown = sorted(set(names) - set(MODEL_NAMES))
+    if unknown or not names:
+        raise argparse.ArgumentTypeError(
+            f"unknown model(s) {', '.join(unknown) or '(none)'}; choose from {', '.join(MODEL_NAMES)}")
+    return list(dict.fromkeys(names))
+
+
+def main(argv=None):
+    from forecasting.assets import ASSETS
+
+    parser = argparse.ArgumentParser(description="Fit and score forecasting models for one asset.")
+    parser.add_argument('--asset', choices=sorted(ASSETS), default='gold',
+                        help="which dataset layout and cleaning to use")
+    parser.add_argument('--data', help="path to the dataset (default: the asset's bundled file)")
+    parser.add_argument('--target', help="column to forecast (default: the asset's target)")
+    parser.add_argument('--resolution', choices=('D', 'W', 'M'),
+                        help="fit on daily/weekly/monthly closes (SARIMA gets a yearly period)")
+    parser.add_argument('--models', type=_model_list, default='arima,sarima,prophet,lstm',
+                        help="comma-separated subset of arima,sarima,prophet,lstm")
+    parser.add_argument('--parallel', action='store_true',
+                        help="fit the models in worker processes (pays each worker's imports)")
+    parser.add_argument('--no-cache', action='store_true', help="always refit")
+    parser.add_argument('--fast-lstm', action='store_true',
+                        help="stream, early-stop and batch up LSTM training (LSTM_FAST)")
+    parser.add_argument('--fast-prophet', action='store_true',
+                        help="skip Prophet's uncertainty intervals (PROPHET_FAST)")
+    parser.add_argument('--warm-prophet', action='store_true',
+                        help="also warm-start Prophet from its last fit; yhat may move slightly (PROPHET_WARM)")
+    parser.add_argument('--out', help="write the metrics table to this CSV")
+    parser.add_argument('--no-store', action='store_true',
+                        help="do not record the run in the results store (forecasting/results.py)")
+    parser.add_argument('--import-report', action='store_true',
+                        help="print import and load times")
+    parser.add_argument('--budget', type=float, metavar='SECONDS',
+                        help="exit with status 1 when imports plus data load exceed this")
+    args = parser.parse_args(argv)
+    if args.resolution and ASSETS[args.asset]['date_column'] is None:
+        parser.error(f"{args.asset} has no dates, so --resolution does not apply")
+
+    from forecasting.assets import load_series
+    from forecasting.cache import ModelCache
+    from forecasting.models import LSTM_FAST, PROPHET_FAST, PROPHET_WARM, split_sizes
+    from forecasting.pyramid import seasonal_order_for
+    from forecasting.runner import run_models
+    from forecasting.trace import span
+
+    with span('forecast', asset=args.asset, models=args.models):
+        load_started, imported = time.perf_counter(), IMPORTS.total
+        with span('load'):
+            series = load_series(args.asset, target=args.target, path=args.data,
+                                 resolution=args.resolution)
+        # Imports triggered by the load are already counted as imports
+        load_seconds = time.perf_counter() - load_started - (IMPORTS.total - imported)
+        train_size, val_size = split_sizes(len(series))
+        cache = None if args.no_cache else ModelCache()
+        configs = {}
+        if args.fast_lstm:
+            configs['lstm'] = LSTM_FAST
+        if args.fast_prophet or args.warm_prophet:
+            configs['prophet'] = PROPHET_WARM if args.warm_prophet else PROPHET_FAST
+        if seasonal_order_for(args.resolution):
+            configs['sarima'] = {'seasonal_order': seasonal_order_for(args.resolution)}
+        run = run_models(series, train_size, val_size, models=args.models, cache=cache,
+                         target=series.name, parallel=args.parallel and len(args.models) > 1,
+                         configs=configs or None,
+                         # Stored runs need the models for their forecast past the data
+                         load_models=not args.no_store)
+        if not args.no_store:
+            from forecasting.results import ResultStore
+
+            with span('store'), ResultStore() as store:
+                store.record_run(args.asset, run, series, resolution=args.resolution,
+                                 source='forecast.py')
+
+    print(f"{args.asset}: {series.name}, {len(series):,} rows "
+          f"(train {train_size:,}, validation {val_size:,}, test {len(series) - train_size - val_size:,})")
+    table = run.metrics_table()
+    columns = [c for c in ('mae', 'rmse', 'r2', 'seconds') if c in table]
+    print(table[columns].to_string(float_format=lambda v: f"{v:,.4f}"))
+    for name, error in run.failures.items():
+        print(f"\n{name} failed:\n{error}", file=sys.stderr)
+    if args.out:
+        table.to_csv(args.out)
+
+    # Startup is everything but the fitting itself: all imports (the
+    # backends' included) plus reading and cleaning the data
+    startup = IMPORTS.total + load_seconds
+    status = 0
+    if args.import_report or args.budget is not None:
+        print(f"\nImports ({IMPORTS.total:.3f}s):")
+        print(IMPORTS.report())
+        print(f"Data load {load_seconds:.3f}s; startup {startup:.3f}s; "
+              f"wall {time.perf_counter() - STARTED:.3f}s since entry")
+        if args.budget is not None:
+            ok = startup <= args.budget
+            print(f"Startup budget {args.budget:.3f}s: {'ok' if ok else 'EXCEEDED'}")
+            status = 0 if ok else 1
+    if run.failures:
+        status = status or 2
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,5 @@
+"""Shared building blocks for the gold, EGX100 and real-estate forecasting scripts."""
+
+from .windows import create_sequences, window_batches
+
+__all__ = ["create_sequences", "window_batches"]
@@ -0,0 +1,112 @@
+"""Where each asset's data lives and how its target series is prepared.
+
+``load_series`` reads each source the way the corresponding script does
+(the columnar store for gold and the EGX, the typed listings loader for
+real estate) and applies the same cleaning, so tools that work on a single
+series (backtests, order search, serving) see exactly what the scripts fit
+on.  ``future_dates`` continues a series on
+its own trading calendar, so every forecast past the data carries the
+dates the asset would actually trade on.
+"""
+
+from pathlib import Path
+
+import pandas as pd
+
+from . import datastore
+
+# Rows of recent history whose weekdays make up a daily series' calendar
+CALENDAR_LOOKBACK = 260
+
+ASSETS = {
+    'gold': {
+        'path': 'data.csv',
+        'date_column': 'Date',
+        'target': '24K - Global Price',
+    },
+    'egx100': {
+        'path': 'EGX100_20090802_20190827.xls',
+        'date_column': 'INDEXDATE',
+        'target': 'INDEXCLOSE',
+    },
+    'real_estate': {
+        'path': 'egypt_House_prices.csv',
+        'date_column': None,  # listings are ordered by row, not by date
+        'target': 'Price',
+        'loader': 'listings',
+    },
+}
+
+
+def asset_path(asset, path=None):
+    return path or datastore.SERVICES_DIR / ASSETS[asset]['path']
+
+
+def load_frame(asset, path=None, columns=None, **options):
+    """``asset``'s source frame as its script loads it (``options`` go to the data store)."""
+    if ASSETS[asset].get('loader') == 'listings':
+        from .listings import load_listings
+
+        return load_listings(asset_path(asset, path), columns=columns)
+    return datastore.load(asset_path(asset, path), columns=columns, **options)
+
+
+def load_series(asset, target=None, path=None, resolution=None, how='close'):
+    """Return the cleaned target series for ``asset``.
+
+    ``resolution`` ('D', 'W' or 'M') returns the ``how`` aggregate ('open',
+    'high', 'low', 'close' or 'mean') per day, week or month instead, read
+    from the asset's stored pyramid (see ``forecasting.pyramid``).
+    """
+    spec = ASSETS[asset]
+    target = target or spec['target']
+    date_column = spec['date_column']
+    columns = [target] if date_column is None else [date_column, target]
+    series = prepare_series(asset, load_frame(asset, path, columns), target)
+    if resolution is None:
+        return series
+    if date_column is None:
+        raise ValueError(f"{asset} has no dates to aggregate by")
+    from .pyramid import pyramid
+
+    # A non-default source gets a pyramid of its own
+    name = asset if path is None else f"{asset}-{Path(path).stem}"
+    return pyramid(name, series).series(resolution, how)
+
+
+def prepare_series(asset, df, target=None):
+    """Clean ``df`` (as ``load_frame`` returns it) down to its target series."""
+    spec = ASSETS[asset]
+    target = target or spec['target']
+    date_column = spec['date_column']
+    if date_column is None:
+        from .listings import fill_missing
+
+        # Mean/median fill of the typed listings, then float64 for the models,
+        # as in Real_Estate_Forecasting.py
+        series = fill_missing(df[[target]])[target].astype('float64')
+    else:
+        df = df.dropna(subset=[target]) if asset == 'gold' else df
+        df = df.assign(**{date_column: pd.to_datetime(df[date_column], errors='coerce')})
+        df = df.dropna(subset=[date_column]).set_index(date_column)
+        series = df[target].interpolate(method='linear')
+    return series.rename(target)
+
+
+def future_dates(index, steps):
+    """``steps`` dates after a DatetimeIndex, on the series' own calendar.
+
+    Daily series continue on the weekdays seen in their last
+    ``CALENDAR_LOOKBACK`` rows (Sunday to Thursday for the EGX, every day
+    for gold); weekly and monthly ones at their inferred frequency.
+    """
+    recent = pd.DatetimeIndex(index[-CALENDAR_LOOKBACK:])
+    spacing = recent.to_series().diff().median()
+    if pd.isna(spacing) or spacing <= pd.Timedelta(days=1):
+        weekdays = set(recent.dayofweek)
+        step = pd.offsets.CustomBusinessDay(
+            weekmask=''.join('1' if day in weekdays else '0' for day in range(7)))
+    else:
+        step = pd.infer_freq(recent[-10:]) if len(recent) >= 3 else None
+        step = pd.tseries.frequencies.to_offset(step) if step else spacing
+    return pd.date_range(recent[-1] + step, periods=steps, freq=step)
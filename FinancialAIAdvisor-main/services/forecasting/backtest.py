@@ -0,0 +1,203 @@
+"""Rolling-origin (walk-forward) backtests with cheap per-origin updates.
+
+ARIMA/SARIMAX are estimated once on the initial window.  At each later
+origin the fitted results are *extended* with the newly observed points,
+which runs the Kalman filter over those points only and keeps the estimated
+parameters, so an origin costs a few milliseconds instead of a refit.  The
+LSTM is trained once, fine-tuned for a few epochs on the latest windows
+every ``fine_tune_every`` origins, and forecasts all origins between
+fine-tunes as one batch.
+
+Each backtest returns the forecast errors for every (origin, horizon) pair
+and summarizes them as per-horizon error curves.
+
+Command line::
+
+    python -m forecasting.backtest --asset egx100 --models arima,lstm --origins 500 --horizon 20
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .models import (ARIMA_ORDER, LSTM_BATCH_SIZE, LSTM_EPOCHS, SARIMA_ORDER, SARIMA_SEASONAL_ORDER,
+                     SEQUENCE_LENGTH, build_lstm, positional)
+from .windows import create_sequences
+
+
+@dataclass
+class BacktestResult:
+    model: str
+    origins: np.ndarray  # position of the first unseen point (horizon 1) at each origin
+    errors: np.ndarray   # (n_origins, horizon) forecast minus actual
+    seconds: float
+
+    @property
+    def horizon(self):
+        return self.errors.shape[1]
+
+    def curve(self):
+        """Per-horizon MAE/RMSE/bias across all origins."""
+        errors = self.errors
+        return pd.DataFrame({
+            'model': self.model,
+            'horizon': np.arange(1, self.horizon + 1),
+            'mae': np.nanmean(np.abs(errors), axis=0),
+            'rmse': np.sqrt(np.nanmean(errors ** 2, axis=0)),
+            'bias': np.nanmean(errors, axis=0),
+            'origins': np.sum(~np.isnan(errors), axis=0),
+        })
+
+
+def make_origins(n, initial, step=1, horizon=1, max_origins=None):
+    """Origins from ``initial`` onward, each leaving ``horizon`` points to score.
+
+    With ``max_origins`` the most recent origins are kept.
+    """
+    origins = np.arange(initial, n - horizon + 1, step)
+    if max_origins is not None:
+        origins = origins[-max_origins:]
+    return origins
+
+
+def _actuals(values, origins, horizon):
+    # (n_origins, horizon) matrix of the values each forecast is scored on
+    return values[origins[:, None] + np.arange(horizon)[None, :]]
+
+
+def backtest_statespace(series, origins, horizon, model='arima', order=None,
+                        seasonal_order=SARIMA_SEASONAL_ORDER, window=None, refit_every=None):
+    """Walk ``origins`` with a filter-only ARIMA/SARIMAX update between them.
+
+    The model is estimated on the ``window`` points before the first origin
+    (all of them when ``window`` is None).  With ``refit_every`` the
+    parameters are re-estimated on the trailing window every that many
+    origins; otherwise they are never refit.
+    """
+    from statsmodels.tsa.arima.model import ARIMA
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    values = np.asarray(series, dtype=float)
+
+    def fit(end):
+        start = 0 if window is None else max(0, end - window)
+        endog = positional(values[start:end])
+        if model == 'arima':
+            return ARIMA(endog, order=order or ARIMA_ORDER).fit()
+        return SARIMAX(endog, order=order or SARIMA_ORDER,
+                       seasonal_order=seasonal_order).fit(disp=False)
+
+    started = time.perf_counter()
+    errors = np.empty((len(origins), horizon))
+    actual = _actuals(values, origins, horizon)
+    results = fit(origins[0])
+    seen = origins[0]
+    for i, origin in enumerate(origins):
+        if refit_every and i and i % refit_every == 0:
+            results = fit(origin)
+        elif origin > seen:
+            results = results.extend(values[seen:origin])
+        seen = origin
+        errors[i] = np.asarray(results.forecast(steps=horizon)) - actual[i]
+    return BacktestResult(model, np.asarray(origins), errors, time.perf_counter() - started)
+
+
+def _recursive_forecast(model, windows, horizon):
+    """Roll ``windows`` (batch, L, 1) forward ``horizon`` steps in one batch per step."""
+    windows = np.array(windows, dtype=np.float32)
+    out = np.empty((len(windows), horizon), dtype=np.float32)
+    for h in range(horizon):
+        step = model(windows, training=False).numpy()[:, 0]
+        out[:, h] = step
+        windows[:, :-1, 0] = windows[:, 1:, 0]
+        windows[:, -1, 0] = step
+    return out
+
+
+def backtest_lstm(series, origins, horizon, sequence_length=SEQUENCE_LENGTH, epochs=LSTM_EPOCHS,
+                  batch_size=LSTM_BATCH_SIZE, fine_tune_every=50, fine_tune_epochs=1,
+                  fine_tune_window=500):
+    """Walk ``origins`` reusing one network with short periodic fine-tunes.
+
+    The scaler and the initial weights only see data before the first
+    origin.  Every ``fine_tune_every`` origins the network trains for
+    ``fine_tune_epochs`` on the last ``fine_tune_window`` points, and the
+    following block of origins is forecast recursively as one batch.
+    """
+    values = np.asarray(series, dtype=float)
+    first = origins[0]
+    low, high = np.min(values[:first]), np.max(values[:first])
+    span = (high - low) or 1.0
+    scaled = ((values - low) / span).astype(np.float32)[:, None]
+
+    started = time.perf_counter()
+    model = build_lstm(sequence_length)
+    X, y = create_sequences(scaled[:first], sequence_length)
+    model.fit(X, y, batch_size=batch_size, epochs=epochs, verbose=0)
+
+    # Windows ending just before each origin: (n_origins, L, 1)
+    all_windows, _ = create_sequences(scaled, sequence_length)
+    forecasts = np.empty((len(origins), horizon), dtype=np.float32)
+    for start in range(0, len(origins), fine_tune_every):
+        block = origins[start:start + fine_tune_every]
+        if start:
+            recent = scaled[max(0, block[0] - fine_tune_window):block[0]]
+            X, y = create_sequences(recent, sequence_length)
+            if len(X):
+                model.fit(X, y, batch_size=batch_size, epochs=fine_tune_epochs, verbose=0)
+        forecasts[start:start + len(block)] = _recursive_forecast(
+            model, all_windows[block - sequence_length], horizon
+        )
+
+    errors = forecasts * span + low - _actuals(values, origins, horizon)
+    return BacktestResult('lstm', np.asarray(origins), errors, time.perf_counter() - started)
+
+
+def run_backtest(series, models=('arima', 'sarima', 'lstm'), horizon=20, step=1,
+                 initial=None, max_origins=500, window=None, **lstm_options):
+    """Backtest each model over the same origins; returns ``{model: BacktestResult}``."""
+    initial = initial or int(len(series) * 0.7)
+    origins = make_origins(len(series), initial, step, horizon, max_origins)
+    results = {}
+    for name in models:
+        if name in ('arima', 'sarima'):
+            results[name] = backtest_statespace(series, origins, horizon, model=name, window=window)
+        elif name == 'lstm':
+            results[name] = backtest_lstm(series, origins, horizon, **lstm_options)
+        else:
+            raise ValueError(f"No backtest for model {name!r}")
+    return results
+
+
+def main(argv=None):
+    from .assets import ASSETS, load_series
+
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the forecasting models.")
+    parser.add_argument('--asset', choices=sorted(ASSETS), default='egx100')
+    parser.add_argument('--target')
+    parser.add_argument('--models', default='arima,sarima,lstm')
+    parser.add_argument('--horizon', type=int, default=20)
+    parser.add_argument('--step', type=int, default=1)
+    parser.add_argument('--origins', type=int, default=500, help="most recent N origins")
+    parser.add_argument('--window', type=int, help="training window for the state-space fits")
+    parser.add_argument('--fine-tune-every', type=int, default=50)
+    parser.add_argument('--out', help="write the per-horizon error curves to this CSV")
+    args = parser.parse_args(argv)
+
+    series = load_series(args.asset, args.target)
+    results = run_backtest(series, models=args.models.split(','), horizon=args.horizon,
+                           step=args.step, max_origins=args.origins, window=args.window,
+                           fine_tune_every=args.fine_tune_every)
+    for name, result in results.items():
+        print(f"{name}: {len(result.origins)} origins in {result.seconds:.1f}s")
+    curves = pd.concat([result.curve() for result in results.values()], ignore_index=True)
+    if args.out:
+        curves.to_csv(args.out, index=False)
+    print(curves.pivot(index='horizon', columns='model', values='mae').to_string())
+
+
+if __name__ == '__main__':
+    main()
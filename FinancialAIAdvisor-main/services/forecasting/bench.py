@@ -0,0 +1,436 @@
+"""Stage-by-stage benchmarks of the three forecasting pipelines.
+
+Each pipeline (``gold`` for ``Gold_Forecasting.py``, ``egx100`` for
+``Stock_Price_Forecasting_Project.py``, ``real_estate`` for
+``Real_Estate_Forecasting.py``) is timed through the same stages the
+script runs: load and preprocess with the script's own loader, split, then
+every model's stage function from ``forecasting.models``, timed by the
+fit, predict and validate spans it emits.  Wall time, CPU time and the peak
+resident-memory growth are recorded per stage (for the model stages the
+memory is the span's resident-set growth).
+
+Besides the bundled files, each pipeline can run on synthetic series
+``scale`` times longer than the original.  They are random walks built from
+the original's own increments with a fixed seed, written to a CSV and
+loaded through the script's own loader like a real source.
+
+``--lstm-training`` instead compares the default LSTM training with the
+``LSTM_FAST`` mode (tf.data streaming, early stopping, larger batches) on
+each pipeline's bundled data: wall time, MAE/RMSE and the epochs early
+stopping saved.
+
+Every (pipeline, scale, model) runs in its own spawned process, plus one
+job per (pipeline, scale) for the load, preprocess and split stages.  A job
+that raises, outgrows ``MEMORY_LIMIT_MIB`` of resident memory or runs past
+``JOB_TIMEOUT`` is killed and leaves a ``failed`` or ``timeout`` row; the
+suite carries on.  SARIMA is ``skipped`` on the undated listings past
+``UNDATED_SARIMA_MAX_SCALE``: with no calendar to aggregate to, its state
+space runs over every row and ×10 already exhausts a 5 GB machine.
+
+Results are written as JSON after every job (``--out``, by default
+``benchmarks/latest.json``), so an interrupted run keeps what it measured.
+When a baseline file exists the run is compared against it and slower
+stages are flagged; the exit status is 1 if any stage regressed.
+
+Command line::
+
+    python -m forecasting.bench --scales 1,10 --models arima,sarima,lstm
+    python -m forecasting.bench --pipelines egx100 --scales 100 --models arima --epochs 1
+    python -m forecasting.bench --save-baseline
+    python -m forecasting.bench --lstm-training --pipelines gold,egx100
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from . import datastore
+from .assets import ASSETS, asset_path, load_frame, load_series, prepare_series
+from .datastore import _peak_rss_kib
+from .models import (LSTM_EPOCHS, LSTM_FAST, MODEL_NAMES, STAGES, lstm_stage, split_series,
+                     split_sizes, stage_config)
+from .trace import capture, span
+
+DEFAULT_BASELINE = datastore.SERVICES_DIR / 'benchmarks' / 'baseline.json'
+DEFAULT_OUT = DEFAULT_BASELINE.parent / 'latest.json'
+PIPELINES = ('gold', 'egx100', 'real_estate')
+# Spans every stage function in forecasting.models emits directly under its own
+STAGE_SPANS = ('fit', 'predict', 'validate')
+
+# A stage regresses when it is this much slower than the baseline *and* the
+# difference is above the noise floor (tiny stages jitter by large ratios).
+TOLERANCE = 0.25
+MIN_SECONDS = 0.05
+MIN_MEMORY_MIB = 16
+
+# Limits for each benchmark job's process
+JOB_TIMEOUT = 30 * 60
+MEMORY_LIMIT_MIB = 3 * 1024
+POLL_SECONDS = 0.5
+UNDATED_SARIMA_MAX_SCALE = 1
+# Stage label of the job that times load, preprocess and split
+DATA_JOB = 'data'
+
+
+def _current_rss_kib(pid='self'):
+    try:
+        with open(f'/proc/{pid}/status') as fh:
+            for line in fh:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return _peak_rss_kib() if pid == 'self' else 0
+
+
+class StageTimer:
+    """Collects ``{stage: {wall, cpu, peak_rss_mib}}`` for one pipeline run."""
+
+    def __init__(self):
+        self.stages = {}
+
+    @contextmanager
+    def __call__(self, stage):
+        _peak_rss_kib(reset=True)
+        rss_before = _current_rss_kib()
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            self.stages[stage] = {
+                'wall': time.perf_counter() - wall,
+                'cpu': time.process_time() - cpu,
+                'peak_rss_mib': max(0, _peak_rss_kib() - rss_before) / 1024,
+            }
+
+
+def synthetic_source(asset, scale, directory, seed=0):
+    """Write a ``scale``-times longer copy of ``asset``'s target to a CSV.
+
+    The series is a random walk whose steps are resampled from the original
+    series' increments, so level and volatility stay realistic.
+    """
+    spec = ASSETS[asset]
+    series = load_series(asset)
+    values = series.to_numpy(dtype=float)
+    rng = np.random.default_rng(seed)
+    steps = rng.choice(np.diff(values), size=len(values) * scale - 1)
+    walk = np.concatenate([[values[0]], values[0] + np.cumsum(steps)])
+    # Keep prices positive like the originals
+    walk = np.abs(walk)
+
+    frame = pd.DataFrame({spec['target']: walk})
+    options = {'numeric': [spec['target']]}
+    if spec['date_column']:
+        frame.insert(0, spec['date_column'],
+                     pd.bdate_range(series.index[0], periods=len(walk)))
+        options['dates'] = [spec['date_column']]
+    path = Path(directory) / f"{asset}_x{scale}.csv"
+    frame.to_csv(path, index=False)
+    return path, options
+
+
+def _fit_models(timer, series, train_size, val_size, models, epochs, seed):
+    """Run each model's stage function and time the spans it emits."""
+    for name in models:
+        if name not in STAGES:
+            raise ValueError(f"Unknown model {name!r}")
+        stage = STAGES[name][0]
+        config = stage_config(name)
+        if name == 'lstm':
+            import tensorflow as tf
+
+            tf.keras.utils.set_random_seed(seed)
+            config['epochs'] = epochs
+        with capture() as records, span(name):
+            stage(series, train_size, val_size, **config)
+        for record in records:
+            part = record['path'].rpartition('/')[2]
+            if record['path'] == f"{name}/{part}" and part in STAGE_SPANS:
+                timer.stages[f"{part}:{name}"] = {
+                    'wall': record['wall'], 'cpu': record['cpu'],
+                    'peak_rss_mib': max(0.0, record.get('rss_delta_mib', 0.0)),
+                }
+
+
+def run_pipeline(asset, path=None, models=MODEL_NAMES, epochs=LSTM_EPOCHS, seed=0, **options):
+    """Run one pipeline end to end; returns ``{stage: measurements}``."""
+    spec = ASSETS[asset]
+    path = path or asset_path(asset)
+    # Build the columnar copy first; the scripts only pay for that once
+    if spec.get('loader') != 'listings':
+        datastore.load(path, **options)
+
+    timer = StageTimer()
+    with timer('load'):
+        df = load_frame(asset, path, **options)
+    with timer('preprocess'):
+        series = prepare_series(asset, df, spec['target'])
+    with timer('split'):
+        train_size, val_size = split_sizes(len(series))
+        split_series(series, train_size, val_size)
+    _fit_models(timer, series, train_size, val_size, models, epochs, seed)
+    return timer.stages
+
+
+def _job(connection, asset, path, models, epochs, seed, options):
+    # Runs in a fresh interpreter; sends ('ok', stages) or ('failed', error)
+    try:
+        stages = run_pipeline(asset, path, models, epochs, seed, **options)
+    except BaseException as e:
+        connection.send(('failed', f"{type(e).__name__}: {e}"))
+    else:
+        connection.send(('ok', stages))
+    finally:
+        connection.close()
+
+
+def run_isolated(asset, path, models, epochs=LSTM_EPOCHS, seed=0, timeout=JOB_TIMEOUT,
+                 memory_limit_mib=MEMORY_LIMIT_MIB, **options):
+    """``run_pipeline`` in a spawned process; returns ``(status, stages or error)``.
+
+    ``status`` is ``'ok'``, ``'failed'`` (an exception, a crash, or resident
+    memory over ``memory_limit_mib``) or ``'timeout'``.  The process is
+    killed in the last two cases.
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_job, daemon=True,
+                              args=(sender, asset, str(path), tuple(models), epochs, seed, options))
+    process.start()
+    sender.close()
+    started = time.monotonic()
+    outcome = None
+    try:
+        while outcome is None:
+            if receiver.poll(POLL_SECONDS):
+                try:
+                    outcome = receiver.recv()
+                except EOFError:
+                    process.join()
+                    outcome = ('failed', f"worker exited with code {process.exitcode}")
+            elif not process.is_alive():
+                outcome = ('failed', f"worker exited with code {process.exitcode}")
+            elif time.monotonic() - started > timeout:
+                outcome = ('timeout', f"no result after {timeout:,.0f}s")
+            elif _current_rss_kib(process.pid) / 1024 > memory_limit_mib:
+                outcome = ('failed', f"resident memory over {memory_limit_mib:,} MiB")
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+    return outcome
+
+
+def _job_rows(asset, scale, model, path, options, epochs, seed, repeats, timeout, memory_limit_mib):
+    label = model or DATA_JOB
+    if (model == 'sarima' and ASSETS[asset]['date_column'] is None
+            and scale > UNDATED_SARIMA_MAX_SCALE):
+        return [{'pipeline': asset, 'scale': scale, 'stage': label, 'status': 'skipped',
+                 'error': f"SARIMA is not run on undated series past x{UNDATED_SARIMA_MAX_SCALE}"}]
+    runs = []
+    for _ in range(repeats):
+        status, result = run_isolated(asset, path, () if model is None else (model,), epochs, seed,
+                                      timeout, memory_limit_mib, **options)
+        if status != 'ok':
+            return [{'pipeline': asset, 'scale': scale, 'stage': label, 'status': status,
+                     'error': result}]
+        # A model job also loads the data; only the data job's timings of that count
+        runs.append({stage: measured for stage, measured in result.items()
+                     if model is None or stage.endswith(f":{model}")})
+    return [{'pipeline': asset, 'scale': scale, 'stage': stage, 'status': 'ok',
+             **{metric: min(run[stage][metric] for run in runs)
+                for metric in ('wall', 'cpu', 'peak_rss_mib')}}
+            for stage in runs[0]]
+
+
+def run_suite(pipelines=PIPELINES, scales=(1,), models=MODEL_NAMES, epochs=LSTM_EPOCHS,
+              repeats=1, seed=0, store_dir=None, timeout=JOB_TIMEOUT,
+              memory_limit_mib=MEMORY_LIMIT_MIB, on_rows=None):
+    """Benchmark every (pipeline, scale, model), each in its own process.
+
+    The fastest of ``repeats`` runs is kept.  ``on_rows`` is called with
+    each job's rows as soon as it finishes.
+    """
+    unknown = [name for name in models if name not in STAGES]
+    if unknown:
+        raise ValueError(f"Unknown model(s): {', '.join(unknown)}")
+    rows = []
+    with tempfile.TemporaryDirectory() as scratch:
+        store_dir = store_dir or Path(scratch) / 'store'
+        for asset in pipelines:
+            for scale in scales:
+                if scale == 1:
+                    path, options = asset_path(asset), {}
+                else:
+                    path, options = synthetic_source(asset, scale, scratch, seed)
+                    options['store_dir'] = store_dir
+                for model in (None, *models):
+                    new = _job_rows(asset, scale, model, path, options, epochs, seed, repeats,
+                                    timeout, memory_limit_mib)
+                    rows.extend(new)
+                    if on_rows:
+                        on_rows(new)
+    return rows
+
+
+def lstm_training(pipelines=PIPELINES, modes=None, seed=0):
+    """Train the LSTM stage once per mode on each pipeline's bundled data."""
+    import tensorflow as tf
+
+    modes = modes or {'default': stage_config('lstm'), 'fast': stage_config('lstm', **LSTM_FAST)}
+    rows = []
+    for asset in pipelines:
+        series = load_series(asset)
+        train_size, val_size = split_sizes(len(series))
+        for mode, config in modes.items():
+            tf.keras.utils.set_random_seed(seed)
+            started = time.perf_counter()
+            bundle, _, metrics = lstm_stage(series, train_size, val_size, **config)
+            rows.append({
+                'pipeline': asset, 'mode': mode, 'wall': time.perf_counter() - started,
+                'epochs_max': config['epochs'], 'epochs_run': bundle['epochs_run'],
+                'best_epoch': bundle['best_epoch'],
+                'epochs_saved': config['epochs'] - bundle['epochs_run'],
+                'mae': metrics['mae'], 'rmse': metrics['rmse'],
+            })
+    table = pd.DataFrame(rows)
+    base = table[table['mode'] == 'default'].set_index('pipeline')['wall']
+    table['speedup'] = table['pipeline'].map(base) / table['wall']
+    return table
+
+
+def environment():
+    import importlib.metadata
+
+    versions = {}
+    for package in ('numpy', 'pandas', 'statsmodels', 'prophet', 'tensorflow', 'scikit-learn'):
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'packages': versions,
+    }
+
+
+def _measured(frame):
+    # Rows of failed, timed-out and skipped jobs carry no timings
+    return frame[frame['status'] == 'ok'] if 'status' in frame else frame
+
+
+def _write_report(path, report):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(report, indent=2))
+    tmp.replace(path)
+
+
+def compare(rows, baseline_rows, tolerance=TOLERANCE, min_seconds=MIN_SECONDS,
+            min_memory_mib=MIN_MEMORY_MIB):
+    """Join a run with a baseline; ``regressed`` marks slower or hungrier stages."""
+    key = ['pipeline', 'scale', 'stage']
+    current, base = (_measured(pd.DataFrame(r)).set_index(key) for r in (rows, baseline_rows))
+    table = current.join(base, rsuffix='_base', how='inner')
+    table['ratio'] = table['wall'] / table['wall_base']
+    slower = ((table['wall'] > table['wall_base'] * (1 + tolerance))
+              & (table['wall'] - table['wall_base'] > min_seconds))
+    hungrier = ((table['peak_rss_mib'] > table['peak_rss_mib_base'] * (1 + tolerance))
+                & (table['peak_rss_mib'] - table['peak_rss_mib_base'] > min_memory_mib))
+    table['regressed'] = slower | hungrier
+    return table.reset_index()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the forecasting pipelines per stage.")
+    parser.add_argument('--pipelines', default=','.join(PIPELINES))
+    parser.add_argument('--scales', default='1,10', help="series length multipliers, e.g. 1,10,100")
+    parser.add_argument('--models', default=','.join(MODEL_NAMES))
+    parser.add_argument('--epochs', type=int, default=LSTM_EPOCHS)
+    parser.add_argument('--repeats', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=str(DEFAULT_OUT),
+                        help="JSON file this run's results are written to as they come in")
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE))
+    parser.add_argument('--save-baseline', action='store_true',
+                        help="store this run as the baseline instead of comparing against it")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE)
+    parser.add_argument('--timeout', type=float, default=JOB_TIMEOUT,
+                        help="seconds one (pipeline, scale, model) job may run")
+    parser.add_argument('--memory-limit', type=int, default=MEMORY_LIMIT_MIB, metavar='MIB',
+                        help="resident memory one job may use")
+    parser.add_argument('--lstm-training', action='store_true',
+                        help="compare default and fast LSTM training instead of the stage suite")
+    args = parser.parse_args(argv)
+
+    if args.lstm_training:
+        table = lstm_training(args.pipelines.split(','), seed=args.seed)
+        print(table.to_string(index=False, float_format=lambda v: f"{v:,.3f}"))
+        _write_report(args.out, {'environment': environment(),
+                                 'lstm_training': table.to_dict('records')})
+        return
+
+    report = {'environment': environment(),
+              'config': {k: v for k, v in vars(args).items() if k not in ('out', 'baseline')},
+              'results': []}
+
+    def on_rows(new):
+        report['results'].extend(new)
+        _write_report(args.out, report)
+        for row in new:
+            detail = (f"{row['wall']:.3f}s wall, {row['peak_rss_mib']:.1f} MiB"
+                      if row['status'] == 'ok' else row['error'])
+            print(f"{row['pipeline']} x{row['scale']} {row['stage']}: {row['status']} ({detail})",
+                  flush=True)
+
+    rows = run_suite(pipelines=args.pipelines.split(','),
+                     scales=[int(s) for s in args.scales.split(',')],
+                     models=args.models.split(','), epochs=args.epochs,
+                     repeats=args.repeats, seed=args.seed, timeout=args.timeout,
+                     memory_limit_mib=args.memory_limit, on_rows=on_rows)
+
+    table = pd.DataFrame(rows)
+    with pd.option_context('display.width', 160, 'display.max_rows', None):
+        print()
+        print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"\nResults written to {args.out}")
+
+    baseline = Path(args.baseline)
+    if args.save_baseline:
+        _write_report(baseline, report)
+        print(f"\nBaseline saved to {baseline}")
+        return
+    if not baseline.exists():
+        print(f"\nNo baseline at {baseline}; run with --save-baseline to create one")
+        return
+
+    diff = compare(rows, json.loads(baseline.read_text())['results'], tolerance=args.tolerance)
+    regressed = diff[diff['regressed']]
+    if regressed.empty:
+        print(f"\nNo regressions against {baseline} ({len(diff)} stages compared)")
+        return
+    print(f"\n{len(regressed)} stage(s) regressed against {baseline}:")
+    print(regressed[['pipeline', 'scale', 'stage', 'wall_base', 'wall', 'ratio',
+                     'peak_rss_mib_base', 'peak_rss_mib']].to_string(
+        index=False, float_format=lambda v: f"{v:.3f}"))
+    sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
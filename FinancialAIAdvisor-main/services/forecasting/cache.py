@@ -0,0 +1,291 @@
+"""On-disk cache of fitted models, forecasts and metrics.
+
+Entries are keyed by a fingerprint of the target series (values and index),
+the target column, the split sizes, the model name and its config, so a
+rerun on an unchanged file skips fitting entirely.  Each entry is a
+directory holding the serialized model, the pickled forecast and a
+``meta.json`` with metrics and bookkeeping used for eviction.
+
+Command line::
+
+    python -m forecasting.cache stats
+    python -m forecasting.cache evict --max-bytes 500M --max-age 7d
+    python -m forecasting.cache invalidate [--model arima] [--target INDEXCLOSE] [--key KEY]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+
+DEFAULT_CACHE_DIR = Path(
+    os.environ.get('FORECAST_CACHE_DIR', Path(__file__).resolve().parent.parent / '.model_cache')
+)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+# 2: stage metrics include the validation slice (val_mae, ...)
+# 3: every family's validation score is out of sample, from a train-only fit
+CACHE_VERSION = 3
+
+
+def fingerprint(series):
+    """Hash a Series or DataFrame including its index, in one vectorized pass."""
+    hashed = pd.util.hash_pandas_object(series, index=True).values
+    return hashlib.sha256(hashed.tobytes()).hexdigest()
+
+
+def _jsonable(value):
+    if isinstance(value, (tuple, list)):
+        return [_jsonable(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _jsonable(v) for k, v in sorted(value.items())}
+    if hasattr(value, 'item'):
+        return value.item()
+    return value
+
+
+def _dir_size(path):
+    return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+
+
+# Serializers per model kind: (save(model, directory), load(directory))
+
+def _save_pickle(model, directory):
+    with open(directory / 'model.pkl', 'wb') as fh:
+        pickle.dump(model, fh, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _load_pickle(directory):
+    with open(directory / 'model.pkl', 'rb') as fh:
+        return pickle.load(fh)
+
+
+def _save_prophet(model, directory):
+    from prophet.serialize import model_to_json
+
+    (directory / 'model.json').write_text(model_to_json(model))
+
+
+def _load_prophet(directory):
+    from prophet.serialize import model_from_json
+
+    return model_from_json((directory / 'model.json').read_text())
+
+
+def _save_keras(bundle, directory):
+    from .lstm_numpy import EXPORT_NAME, export
+
+    # Plain float32 weights too, for serving without TensorFlow
+    export(bundle, directory / EXPORT_NAME)
+    bundle = dict(bundle)
+    bundle.pop('model').save(directory / 'model.keras')
+    _save_pickle(bundle, directory)
+
+
+def _load_keras(directory):
+    from tensorflow.keras.models import load_model
+
+    bundle = _load_pickle(directory)
+    bundle['model'] = load_model(directory / 'model.keras')
+    return bundle
+
+
+SERIALIZERS = {
+    'pickle': (_save_pickle, _load_pickle),
+    'prophet': (_save_prophet, _load_prophet),
+    'keras': (_save_keras, _load_keras),
+}
+
+
+class ModelCache:
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES,
+                 max_age=DEFAULT_MAX_AGE, enabled=True):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+
+    def key(self, series, target, splits, model, config):
+        payload = {
+            'version': CACHE_VERSION,
+            'data': fingerprint(series),
+            'target': target,
+            'splits': _jsonable(splits),
+            'model': model,
+            'config': _jsonable(config),
+        }
+        blob = json.dumps(payload, sort_keys=True).encode()
+        return hashlib.sha256(blob).hexdigest()[:32]
+
+    def _entry(self, key):
+        return self.root / key
+
+    def path(self, key):
+        """Directory of the entry for ``key``, or None when it is not cached."""
+        directory = self._entry(key)
+        return directory if self.enabled and (directory / 'meta.json').exists() else None
+
+    def entries(self):
+        if not self.root.exists():
+            return []
+        found = []
+        for directory in self.root.iterdir():
+            meta_path = directory / 'meta.json'
+            if directory.is_dir() and meta_path.exists():
+                try:
+                    found.append((directory, json.loads(meta_path.read_text())))
+                except (OSError, ValueError):
+                    continue
+        return found
+
+    def load(self, key, load_model=True):
+        """Return ``(model, forecast, metrics)`` for ``key``, or None on a miss.
+
+        With ``load_model=False`` the model is not deserialized (it comes back
+        as None), so its backend never has to be imported.
+        """
+        if not self.enabled:
+            return None
+        directory = self._entry(key)
+        meta_path = directory / 'meta.json'
+        if not meta_path.exists():
+            return None
+        try:
+            meta = json.loads(meta_path.read_text())
+            if self.max_age is not None and time.time() - meta['created'] > self.max_age:
+                self.invalidate(key=key)
+                return None
+            model = SERIALIZERS[meta['kind']][1](directory) if load_model else None
+            with open(directory / 'forecast.pkl', 'rb') as fh:
+                forecast = pickle.load(fh)
+        except Exception:
+            # A half-written or incompatible entry is just a miss
+            self.invalidate(key=key)
+            return None
+        meta['last_access'] = time.time()
+        meta_path.write_text(json.dumps(meta))
+        return model, forecast, meta['metrics']
+
+    def store(self, key, fitted, forecast, metrics, kind='pickle', **info):
+        if not self.enabled:
+            return
+        self.root.mkdir(parents=True, exist_ok=True)
+        # Write into a scratch directory and rename so readers never see a
+        # partial entry.
+        tmp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=self.root))
+        try:
+            SERIALIZERS[kind][0](fitted, tmp)
+            with open(tmp / 'forecast.pkl', 'wb') as fh:
+                pickle.dump(forecast, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            now = time.time()
+            meta = dict(info, key=key, kind=kind, metrics=metrics, created=now, last_access=now)
+            meta['size'] = _dir_size(tmp)
+            (tmp / 'meta.json').write_text(json.dumps(_jsonable(meta)))
+            target = self._entry(key)
+            if target.exists():
+                shutil.rmtree(target)
+            tmp.rename(target)
+        finally:
+            if tmp.exists():
+                shutil.rmtree(tmp, ignore_errors=True)
+        self.evict()
+
+    def get_or_fit(self, key, fit, kind='pickle', **info):
+        cached = self.load(key)
+        if cached is not None:
+            return cached
+        fitted, forecast, metrics = fit()
+        self.store(key, fitted, forecast, metrics, kind=kind, **info)
+        return fitted, forecast, metrics
+
+    def invalidate(self, key=None, model=None, target=None):
+        """Drop matching entries (all entries when no filter is given)."""
+        removed = 0
+        for directory, meta in self.entries():
+            if key is not None and meta.get('key') != key:
+                continue
+            if model is not None and meta.get('model') != model:
+                continue
+            if target is not None and meta.get('target') != target:
+                continue
+            shutil.rmtree(directory, ignore_errors=True)
+            removed += 1
+        return removed
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones over ``max_bytes``."""
+        now = time.time()
+        live = []
+        removed = 0
+        for directory, meta in self.entries():
+            if self.max_age is not None and now - meta['created'] > self.max_age:
+                shutil.rmtree(directory, ignore_errors=True)
+                removed += 1
+            else:
+                live.append((meta['last_access'], meta['size'], directory))
+        if self.max_bytes is not None:
+            total = sum(size for _, size, _ in live)
+            for _, size, directory in sorted(live, key=lambda item: item[0]):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(directory, ignore_errors=True)
+                total -= size
+                removed += 1
+        return removed
+
+
+def _parse_size(text):
+    units = {'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3}
+    text = text.strip().upper()
+    if text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def _parse_age(text):
+    units = {'S': 1, 'M': 60, 'H': 3600, 'D': 86400}
+    text = text.strip().upper()
+    if text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the fitted-model cache.")
+    parser.add_argument('--root', default=str(DEFAULT_CACHE_DIR))
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('stats')
+    evict = sub.add_parser('evict')
+    evict.add_argument('--max-bytes', type=_parse_size, default=DEFAULT_MAX_BYTES)
+    evict.add_argument('--max-age', type=_parse_age, default=DEFAULT_MAX_AGE)
+    invalidate = sub.add_parser('invalidate')
+    invalidate.add_argument('--key')
+    invalidate.add_argument('--model')
+    invalidate.add_argument('--target')
+    args = parser.parse_args(argv)
+
+    if args.command == 'stats':
+        cache = ModelCache(args.root)
+        entries = cache.entries()
+        for _, meta in sorted(entries, key=lambda item: item[1]['last_access']):
+            print(f"{meta['key']}  {meta.get('model', '?'):8} {meta.get('target', '?')!s:28} "
+                  f"{meta['size'] / 1024:10.1f} KiB")
+        print(f"{len(entries)} entries, {sum(m['size'] for _, m in entries) / 1024 ** 2:.1f} MiB")
+    elif args.command == 'evict':
+        cache = ModelCache(args.root, max_bytes=args.max_bytes, max_age=args.max_age)
+        print(f"Evicted {cache.evict()} entries")
+    else:
+        cache = ModelCache(args.root)
+        removed = cache.invalidate(key=args.key, model=args.model, target=args.target)
+        print(f"Invalidated {removed} entries")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,328 @@
+"""Deferred, headless chart rendering for the forecasting scripts.
+
+The scripts describe each chart as data (``line`` / ``prophet``) instead of
+drawing it with pyplot.  What happens next depends on the mode, taken from
+``FORECAST_CHARTS`` unless ``configure`` is called:
+
+* ``off``: nothing is built or drawn; a chart call costs a function call;
+* ``png`` / ``svg`` (or ``png,svg``): charts are queued to a pool of worker
+  processes on the non-interactive Agg backend and written to
+  ``FORECAST_CHART_DIR`` (default ``services/charts``) while the script
+  carries on; ``close`` waits for them;
+* ``show``: the old behaviour, one blocking window per chart.
+
+When the variable is unset the mode is ``show`` if a display is available
+and ``off`` otherwise, so headless runs never pay for plotting.
+
+Long lines are reduced to at most ``FORECAST_CHART_POINTS`` points before
+they are queued, keeping each bucket's minimum and maximum so spikes
+survive; the 10-year EGX100 close draws the same picture from a fraction
+of the points.
+"""
+
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .trace import log, span
+
+MODES = ('off', 'show', 'png', 'svg')
+DEFAULT_DIR = Path(os.environ.get('FORECAST_CHART_DIR',
+                                  Path(__file__).resolve().parent.parent / 'charts'))
+MAX_POINTS = int(os.environ.get('FORECAST_CHART_POINTS', 2000))
+DEFAULT_WORKERS = int(os.environ.get('FORECAST_CHART_WORKERS', 0)) or None
+DPI = 100
+
+# Prophet's own plot colours
+PROPHET_BLUE = '#0072B2'
+
+
+@dataclass
+class Line:
+    x: np.ndarray
+    y: np.ndarray
+    label: str = None
+    color: str = None
+    style: str = '-'
+    size: float = None
+
+
+@dataclass
+class Band:
+    x: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    color: str = PROPHET_BLUE
+    alpha: float = 0.2
+
+
+@dataclass
+class Chart:
+    name: str
+    lines: list
+    bands: list = field(default_factory=list)
+    title: str = None
+    xlabel: str = None
+    ylabel: str = None
+    figsize: tuple = (12, 6)
+    rotate_xticks: float = None
+    legend: bool = True
+
+
+def downsample_indices(y, max_points=MAX_POINTS):
+    """Positions to keep so a line of ``y`` keeps its shape in about ``max_points``.
+
+    Missing values are dropped.  Each of about ``max_points // 2`` equal
+    buckets keeps its lowest and highest point (in x order), plus the first
+    and last points overall.
+    """
+    y = np.asarray(y, dtype=float)
+    valid = np.flatnonzero(~np.isnan(y))
+    n = len(valid)
+    if max_points is None or n <= max_points:
+        return valid
+    width = -(-n // max(1, max_points // 2))
+    rows = -(-n // width)
+    # One bucket per row; the padding can never be a row's min or max
+    padded = np.full(rows * width, np.inf)
+    padded[:n] = y[valid]
+    lows = padded.reshape(rows, width).argmin(axis=1)
+    padded[n:] = -np.inf
+    highs = padded.reshape(rows, width).argmax(axis=1)
+    starts = np.arange(rows) * width
+    return valid[np.unique(np.concatenate([starts + lows, starts + highs, [0, n - 1]]))]
+
+
+def downsample(x, y, max_points=MAX_POINTS):
+    """``(x, y)`` reduced with ``downsample_indices``."""
+    keep = downsample_indices(y, max_points)
+    return np.asarray(x)[keep], np.asarray(y, dtype=float)[keep]
+
+
+def _values(data, index=None):
+    values = np.asarray(getattr(data, 'values', data), dtype=float).ravel()
+    if index is None:
+        index = getattr(data, 'index', None)
+    x = np.arange(len(values)) if index is None else np.asarray(index)
+    return x, values
+
+
+def series(data, label=None, color=None, index=None, **style):
+    """A ``Line`` for a Series (its index on x) or an array (positions or ``index``)."""
+    x, y = _values(data, index)
+    return Line(x, y, label, color, **style)
+
+
+def pyramid_series(name, data, label=None, color=None, start=None, end=None, how='close',
+                   max_points=MAX_POINTS, **style):
+    """A ``Line`` of dated ``data`` at the finest resolution with at most ``max_points`` bins.
+
+    Reads the bins of ``[start, end]`` from the series' stored pyramid (see
+    ``forecasting.pyramid``), so the cost follows the points drawn.
+    """
+    from .pyramid import pyramid
+
+    _, values = pyramid(name, data).window(max_points, start, end, how)
+    return series(values, label, color, **style)
+
+
+def _draw(chart):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=chart.figsize)
+    for band in chart.bands:
+        ax.fill_between(band.x, band.lower, band.upper, color=band.color, alpha=band.alpha)
+    for line in chart.lines:
+        if line.style == '-':
+            ax.plot(line.x, line.y, label=line.label, color=line.color)
+        else:
+            ax.plot(line.x, line.y, line.style, label=line.label, color=line.color,
+                    markersize=line.size)
+    if chart.title:
+        ax.set_title(chart.title)
+    if chart.xlabel:
+        ax.set_xlabel(chart.xlabel)
+    if chart.ylabel:
+        ax.set_ylabel(chart.ylabel)
+    if chart.rotate_xticks:
+        plt.setp(ax.get_xticklabels(), rotation=chart.rotate_xticks)
+    if chart.legend and any(line.label for line in chart.lines):
+        ax.legend()
+    fig.tight_layout()
+    return fig
+
+
+def _init_worker():
+    os.environ['MPLBACKEND'] = 'Agg'
+
+
+def _render(chart, paths):
+    # Runs in a worker process
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+
+    started = time.perf_counter()
+    fig = _draw(chart)
+    for path in paths:
+        fig.savefig(path, dpi=DPI)
+    plt.close(fig)
+    return paths, time.perf_counter() - started
+
+
+def _has_display():
+    if os.environ.get('MPLBACKEND', '').lower() == 'agg':
+        return False
+    if sys.platform in ('darwin', 'win32'):
+        return True
+    return bool(os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+
+
+def _parse_mode(mode):
+    mode = (mode or '').strip().lower()
+    if not mode:
+        return ['show'] if _has_display() else ['off']
+    modes = [m.strip() for m in mode.split(',') if m.strip()]
+    unknown = [m for m in modes if m not in MODES]
+    if unknown:
+        raise ValueError(f"Unknown chart mode(s) {unknown}; use one of {', '.join(MODES)}")
+    if len(modes) > 1 and not set(modes) <= {'png', 'svg'}:
+        raise ValueError("Only png and svg can be combined")
+    return modes
+
+
+class ChartQueue:
+    """Collects charts and renders them according to ``mode``."""
+
+    def __init__(self, mode=None, directory=DEFAULT_DIR, workers=DEFAULT_WORKERS,
+                 max_points=MAX_POINTS):
+        self.modes = _parse_mode(mode if mode is not None else os.environ.get('FORECAST_CHARTS'))
+        self.directory = Path(directory)
+        self.workers = workers
+        self.max_points = max_points
+        self.pool = None
+        self.pending = []
+        self.written = []
+        self.render_seconds = 0.0
+
+    @property
+    def enabled(self):
+        return self.modes != ['off']
+
+    def _reduce(self, chart):
+        chart.lines = [Line(*downsample(line.x, line.y, self.max_points), line.label,
+                            line.color, line.style, line.size) for line in chart.lines]
+        bands = []
+        for band in chart.bands:
+            # One set of positions for both edges, so they stay aligned
+            keep = np.union1d(downsample_indices(band.lower, self.max_points),
+                              downsample_indices(band.upper, self.max_points))
+            bands.append(Band(np.asarray(band.x)[keep], np.asarray(band.lower)[keep],
+                              np.asarray(band.upper)[keep], band.color, band.alpha))
+        chart.bands = bands
+        return chart
+
+    def submit(self, chart):
+        if not self.enabled:
+            return
+        chart = self._reduce(chart)
+        if self.modes == ['show']:
+            import matplotlib.pyplot as plt
+
+            _draw(chart)
+            plt.show()
+            return
+        if self.pool is None:
+            import multiprocessing
+            from concurrent.futures import ProcessPoolExecutor
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            workers = self.workers or min(2, os.cpu_count() or 1)
+            self.pool = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        paths = [str(self.directory / f"{chart.name}.{fmt}") for fmt in self.modes]
+        self.pending.append((chart.name, self.pool.submit(_render, chart, paths)))
+
+    def close(self):
+        """Wait for queued charts; returns the paths written."""
+        if self.pool is None:
+            return self.written
+        with span('charts.wait', charts=len(self.pending)):
+            for name, future in self.pending:
+                try:
+                    paths, seconds = future.result()
+                    self.written.extend(paths)
+                    self.render_seconds += seconds
+                except Exception as e:
+                    log(f"Error rendering chart {name}: {e}")
+            self.pool.shutdown()
+        self.pool = None
+        self.pending = []
+        return self.written
+
+
+_queue = None
+
+
+def configure(mode=None, directory=DEFAULT_DIR, workers=DEFAULT_WORKERS, max_points=MAX_POINTS):
+    """Replace the module queue (waiting for anything already queued)."""
+    global _queue
+    if _queue is not None:
+        _queue.close()
+    _queue = ChartQueue(mode, directory, workers, max_points)
+    return _queue
+
+
+def queue():
+    global _queue
+    if _queue is None:
+        _queue = ChartQueue()
+    return _queue
+
+
+def line(name, lines, title=None, xlabel=None, ylabel=None, figsize=(12, 6), rotate_xticks=None):
+    """Queue a line chart; ``lines`` are ``Line`` objects (see ``series``)."""
+    charts = queue()
+    if charts.enabled:
+        charts.submit(Chart(name, list(lines), title=title, xlabel=xlabel, ylabel=ylabel,
+                            figsize=figsize, rotate_xticks=rotate_xticks))
+
+
+def prophet(name, series_, forecast, title=None, xlabel='ds', ylabel='y'):
+    """Queue a chart in the style of ``Prophet.plot``: history points, yhat and its interval.
+
+    Drawn from the forecast frame and the fitted series, so rendering never
+    imports Prophet.
+    """
+    charts = queue()
+    if not charts.enabled:
+        return
+    from .models import prophet_frame
+
+    history = prophet_frame(series_)
+    ds = np.asarray(forecast['ds'])
+    lines = [Line(np.asarray(history['ds']), history['y'].to_numpy(dtype=float), 'Observed', 'k', '.', 2),
+             Line(ds, forecast['yhat'].to_numpy(dtype=float), 'Forecast', PROPHET_BLUE)]
+    bands = []
+    if 'yhat_lower' in forecast:
+        bands.append(Band(ds, forecast['yhat_lower'].to_numpy(dtype=float),
+                          forecast['yhat_upper'].to_numpy(dtype=float)))
+    charts.submit(Chart(name, lines, bands, title=title, xlabel=xlabel, ylabel=ylabel,
+                        figsize=(10, 6), legend=False))
+
+
+def close():
+    """Wait for the module queue and log where the charts went."""
+    if _queue is None:
+        return []
+    pending = len(_queue.pending)
+    started = time.perf_counter()
+    written = _queue.close()
+    if pending:
+        log(f"Rendered {pending} chart(s) to {_queue.directory} "
+            f"(waited {time.perf_counter() - started:.2f}s, {_queue.render_seconds:.2f}s drawing)")
+    return written
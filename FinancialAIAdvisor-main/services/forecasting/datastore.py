@@ -0,0 +1,269 @@
+"""Columnar, memory-mapped copies of the bundled datasets.
+
+Each source file (the EGX100 ``.xls``, the gold ``data.csv`` and the
+house-price CSV) is parsed once and written as one ``.npy`` file per column
+plus a ``schema.json`` sidecar.  Later loads memory-map those arrays instead
+of going through ``read_excel``/``read_csv``; the store is rebuilt when the
+source's size/mtime change and its content hash no longer matches.
+
+Text columns are stored as categorical codes, dates as int64 nanoseconds,
+and numbers keep their parsed dtype.
+
+Command line::
+
+    python -m forecasting.datastore ingest ./data.csv
+    python -m forecasting.datastore bench
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .trace import span
+
+SERVICES_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_STORE_DIR = Path(os.environ.get('FORECAST_DATA_STORE', SERVICES_DIR / '.datastore'))
+SCHEMA_VERSION = 1
+
+# Per-source parsing options.  ``dates`` are parsed to datetime64 and
+# ``numeric`` columns are coerced like the scripts' ``pd.to_numeric(...,
+# errors='coerce')`` calls.
+SOURCES = {
+    'data.csv': {'dates': ['Date']},
+    'EGX100_20090802_20190827.xls': {'dates': ['INDEXDATE']},
+    'egypt_House_prices.csv': {'numeric': ['Price', 'Bedrooms', 'Bathrooms', 'Area']},
+}
+
+
+def file_hash(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_source(path, dates=(), numeric=()):
+    """Parse ``path`` the slow way; this is what the store replaces."""
+    path = Path(path)
+    if path.suffix in ('.xls', '.xlsx'):
+        df = pd.read_excel(path, engine='xlrd' if path.suffix == '.xls' else None)
+    else:
+        df = pd.read_csv(path)
+    df.columns = df.columns.str.strip().str.lstrip('\ufeff')
+    for column in dates:
+        df[column] = pd.to_datetime(df[column], errors='coerce')
+    for column in numeric:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    return df
+
+
+def _encode_column(series):
+    """Return ``(array, column schema)`` for one column."""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        values = series.values.astype('datetime64[ns]').view('int64')
+        return values, {'kind': 'datetime', 'dtype': 'int64'}
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_numeric_dtype(series):
+        values = series.to_numpy()
+        return values, {'kind': 'numeric', 'dtype': values.dtype.str}
+    categorical = pd.Categorical(series)
+    categories = [str(c) for c in categorical.categories]
+    codes = categorical.codes
+    if len(categories) < 2 ** 7:
+        codes = codes.astype(np.int8)
+    elif len(categories) < 2 ** 15:
+        codes = codes.astype(np.int16)
+    return codes, {'kind': 'category', 'dtype': codes.dtype.str, 'categories': categories}
+
+
+def _store_path(source, store_dir):
+    source = Path(source).resolve()
+    tag = hashlib.sha1(str(source).encode()).hexdigest()[:8]
+    return Path(store_dir) / f"{source.stem}-{tag}"
+
+
+def ingest(source, store_dir=DEFAULT_STORE_DIR, **options):
+    """Parse ``source`` and (re)write its columnar copy; returns the store path."""
+    source = Path(source)
+    options = options or SOURCES.get(source.name, {})
+    df = read_source(source, **options)
+
+    target = _store_path(source, store_dir)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix='.tmp-', dir=target.parent))
+    try:
+        columns = []
+        for i, name in enumerate(df.columns):
+            values, column = _encode_column(df[name])
+            column.update(name=name, file=f"c{i:03d}.npy")
+            np.save(tmp / column['file'], np.ascontiguousarray(values))
+            columns.append(column)
+        stat = source.stat()
+        schema = {
+            'version': SCHEMA_VERSION,
+            'source': str(source.resolve()),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'sha256': file_hash(source),
+            'options': options,
+            'rows': len(df),
+            'columns': columns,
+        }
+        (tmp / 'schema.json').write_text(json.dumps(schema, indent=1))
+        if target.exists():
+            shutil.rmtree(target)
+        tmp.rename(target)
+    finally:
+        if tmp.exists():
+            shutil.rmtree(tmp, ignore_errors=True)
+    return target
+
+
+def _fresh_schema(source, store_dir, options):
+    """Return the stored schema if it still matches ``source``, else None."""
+    schema_path = _store_path(source, store_dir) / 'schema.json'
+    if not schema_path.exists():
+        return None
+    schema = json.loads(schema_path.read_text())
+    if schema.get('version') != SCHEMA_VERSION or schema.get('options') != options:
+        return None
+    stat = Path(source).stat()
+    if stat.st_size == schema['size'] and stat.st_mtime_ns == schema['mtime_ns']:
+        return schema
+    # Touched but possibly unchanged (e.g. re-downloaded): compare contents
+    if stat.st_size == schema['size'] and file_hash(source) == schema['sha256']:
+        schema['mtime_ns'] = stat.st_mtime_ns
+        schema_path.write_text(json.dumps(schema, indent=1))
+        return schema
+    return None
+
+
+def load(source, columns=None, store_dir=DEFAULT_STORE_DIR, **options):
+    """Return ``source`` as a DataFrame backed by memory-mapped column files.
+
+    Only the requested ``columns`` are mapped.  The store is built or
+    refreshed first when it is missing or stale.
+    """
+    source = Path(source)
+    options = options or SOURCES.get(source.name, {})
+    schema = _fresh_schema(source, store_dir, options)
+    if schema is None:
+        with span('datastore.ingest', source=source.name):
+            ingest(source, store_dir, **options)
+        schema = _fresh_schema(source, store_dir, options)
+
+    directory = _store_path(source, store_dir)
+    wanted = None if columns is None else set(columns)
+    data = {}
+    for column in schema['columns']:
+        if wanted is not None and column['name'] not in wanted:
+            continue
+        values = np.load(directory / column['file'], mmap_mode='r')
+        if column['kind'] == 'datetime':
+            values = values.view('datetime64[ns]')
+        elif column['kind'] == 'category':
+            values = pd.Categorical.from_codes(values, column['categories'])
+        data[column['name']] = values
+    return pd.DataFrame(data, copy=False)
+
+
+def _peak_rss_kib(reset=False):
+    # Linux lets us reset the high-water mark so the import of pandas does
+    # not hide the load's own peak; elsewhere fall back to ru_maxrss.
+    try:
+        if reset:
+            with open('/proc/self/clear_refs', 'w') as fh:
+                fh.write('5')
+        with open('/proc/self/status') as fh:
+            for line in fh:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _measure(job):
+    # Runs in a fresh interpreter so peaks reflect only this load path
+    import tracemalloc
+
+    kind, path, trace = job
+    before = _peak_rss_kib(reset=True)
+    if trace:
+        tracemalloc.start()
+    started = time.perf_counter()
+    if kind == 'parse':
+        df = read_source(path, **SOURCES.get(Path(path).name, {}))
+    else:
+        df = load(path)
+    # Touch every numeric value so lazily mapped pages are counted too
+    for name in df.select_dtypes('number').columns:
+        np.asarray(df[name]).sum()
+    seconds = time.perf_counter() - started
+    heap = 0
+    if trace:
+        heap = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return seconds, (_peak_rss_kib() - before) / 1024, heap / 1024 ** 2
+
+
+def benchmark(paths, repeats=3):
+    """Compare parsing each source against loading its columnar copy."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    for path in paths:
+        load(path)  # make sure the store exists before timing it
+        for kind in ('parse', 'store'):
+            runs = []
+            # Timed runs first, then one run under tracemalloc (which slows
+            # allocation-heavy parsing) for the heap peak
+            for trace in [False] * repeats + [True]:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                    runs.append(pool.submit(_measure, (kind, str(path), trace)).result())
+            timed = runs[:-1]
+            rows.append({'source': Path(path).name, 'path': kind,
+                         'seconds': min(r[0] for r in timed),
+                         'peak_rss_mib': min(r[1] for r in timed),
+                         'peak_heap_mib': runs[-1][2]})
+    table = pd.DataFrame(rows).set_index(['source', 'path'])
+    speedup = table['seconds'].xs('parse', level='path') / table['seconds'].xs('store', level='path')
+    return table, speedup
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or benchmark the columnar data store.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    ingest_cmd = sub.add_parser('ingest')
+    ingest_cmd.add_argument('paths', nargs='*')
+    bench_cmd = sub.add_parser('bench')
+    bench_cmd.add_argument('paths', nargs='*')
+    bench_cmd.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    paths = args.paths or [SERVICES_DIR / name for name in SOURCES]
+    if args.command == 'ingest':
+        for path in paths:
+            print(f"{path} -> {ingest(path)}")
+    else:
+        table, speedup = benchmark(paths, repeats=args.repeats)
+        print(table.to_string(float_format=lambda v: f"{v:.4f}"))
+        print()
+        print("Load speedup (parse / store):")
+        print(speedup.to_string(float_format=lambda v: f"{v:.1f}x"))
+
+
+if __name__ == '__main__':
+    main()
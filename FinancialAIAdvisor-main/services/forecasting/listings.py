@@ -0,0 +1,402 @@
+"""Typed, memory-compact views of the house-price listings (``egypt_House_prices.csv``).
+
+Every column arrives as text.  The loader reads it with an explicit schema:
+
+* ``Type``, ``City``, ``Compound``, ``Payment_Option`` and the other
+  descriptive columns become categoricals (duplicate spellings folded);
+* ``Bedrooms``, ``Bathrooms`` and ``Level`` become nullable ``Int8``, with
+  the floor encodings ``Ground`` -> 0 and ``10+`` -> 10;
+* ``Price`` and ``Area`` become ``float32``;
+* ``Delivery_Date`` is kept as a category and also parsed into
+  ``Delivery_Ready`` (``Ready to move``) and ``Delivery_Year``.
+
+The CSV is read in chunks with every column as a categorical, so each
+conversion above runs once per distinct label and is then a code lookup;
+no chunk ever holds a Python string per cell.  ``ListingStats`` keeps
+running sums and small-integer histograms, so the mean/median imputation
+the real-estate script does needs one pass to gather and is then applied
+chunk by chunk::
+
+    stats = ListingStats.from_chunks(read_listings(path))
+    for chunk in read_listings(path):
+        chunk = fill_missing(chunk, stats=stats)
+
+``iter_listings`` wraps those two passes, so memory is bounded by one
+chunk however large the file is.  ``load_listings`` concatenates the
+chunks into one frame and is meant for files that fit in memory.
+
+Command line::
+
+    python -m forecasting.listings stats
+    python -m forecasting.listings bench --scale 20
+"""
+
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .datastore import SERVICES_DIR
+
+LISTINGS_PATH = SERVICES_DIR / 'egypt_House_prices.csv'
+CHUNK_ROWS = 250_000
+
+CATEGORICAL = ['Type', 'Furnished', 'Compound', 'Payment_Option', 'Delivery_Term', 'City']
+SMALL_INT = ['Bedrooms', 'Bathrooms', 'Level']
+NUMERIC = ['Price', 'Bedrooms', 'Bathrooms', 'Area']
+
+# What Real_Estate_Forecasting.py fills missing values with
+IMPUTE = {'Price': 'mean', 'Bedrooms': 'median', 'Bathrooms': 'median', 'Area': 'mean'}
+
+# Floors: 'Ground' is 0 and '10+' is capped at 10; 'Highest' and 'Unknown'
+# carry no number and become missing
+LEVEL_CODES = {'Ground': 0, '10+': 10}
+READY_TO_MOVE = 'Ready to move'
+
+TYPE_SPELLINGS = {'Standalone Villa': 'Stand Alone Villa', 'Twin house': 'Twin House'}
+
+
+def _as_categorical(values):
+    values = pd.Series(values, copy=False)
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        return values.array
+    return pd.Categorical(values.astype('string'))
+
+
+def _decode(values, parse, dtype):
+    """Apply ``parse`` to the distinct labels of ``values`` and broadcast by code."""
+    categorical = _as_categorical(values)
+    parsed = pd.array(parse(pd.Index(categorical.categories.astype('string'))), dtype=dtype)
+    codes = categorical.codes
+    out = parsed.take(np.where(codes >= 0, codes, 0))
+    out[codes < 0] = pd.NA
+    return out
+
+
+def _numbers(labels):
+    return pd.to_numeric(pd.Series(labels).str.strip(), errors='coerce').to_numpy(dtype=np.float64)
+
+
+def _small_ints(numbers):
+    # Rounded to whole units; anything that does not fit in an int8 is
+    # treated as a data-entry error and left missing
+    numbers = np.round(numbers)
+    numbers[(numbers < -128) | (numbers > 127)] = np.nan
+    return pd.array(numbers, dtype='Int8')
+
+
+def parse_level(values):
+    """Vectorized floor number (``Int8``) for the ``Level`` column."""
+    def parse(labels):
+        labels = labels.str.strip()
+        mapped = pd.Series(labels).map(LEVEL_CODES).to_numpy(dtype=np.float64)
+        return _small_ints(np.where(np.isnan(mapped), _numbers(labels), mapped))
+
+    return _decode(values, parse, 'Int8')
+
+
+def parse_delivery(values):
+    """``(ready, year)`` arrays for the ``Delivery_Date`` column.
+
+    ``ready`` is True for ``Ready to move``, missing for ``Unknown`` and
+    False otherwise; ``year`` is the four-digit year when one is given.
+    """
+    def ready(labels):
+        labels = labels.str.strip()
+        flags = pd.array(labels == READY_TO_MOVE, dtype='boolean')
+        flags[np.asarray(labels == 'Unknown')] = pd.NA
+        return flags
+
+    def year(labels):
+        numbers = _numbers(labels)
+        numbers[(numbers < 1900) | (numbers > 2200)] = np.nan
+        return pd.array(numbers, dtype='Int16')
+
+    return _decode(values, ready, 'boolean'), _decode(values, year, 'Int16')
+
+
+def _clean_categorical(values, spellings=None):
+    """Strip and fold the labels, then rebuild the codes without touching each row."""
+    categorical = _as_categorical(values)
+    labels = pd.Index(categorical.categories.astype('string')).str.strip()
+    if spellings:
+        labels = labels.map(lambda label: spellings.get(label, label))
+    categories = pd.Index(sorted(labels.unique().dropna()))
+    remap = categories.get_indexer(labels)
+    codes = categorical.codes
+    new_codes = np.where(codes >= 0, remap[np.where(codes >= 0, codes, 0)], -1)
+    return pd.Categorical.from_codes(new_codes, categories)
+
+
+def clean_listings(df):
+    """Return a typed copy of a raw listings frame."""
+    out = pd.DataFrame(index=df.index)
+    for column in NUMERIC:
+        if column not in df:
+            continue
+        values = df[column]
+        if pd.api.types.is_numeric_dtype(values):
+            numbers = values.to_numpy(dtype=np.float64, na_value=np.nan)
+            out[column] = (_small_ints(numbers.copy()) if column in SMALL_INT
+                           else numbers.astype(np.float32))
+        elif column in SMALL_INT:
+            out[column] = _decode(values, lambda labels: _small_ints(_numbers(labels)), 'Int8')
+        else:
+            out[column] = _decode(values, _numbers, 'Float64').to_numpy(
+                dtype=np.float32, na_value=np.nan)
+    if 'Level' in df:
+        out['Level'] = parse_level(df['Level'])
+    for column in CATEGORICAL:
+        if column in df:
+            out[column] = _clean_categorical(df[column], TYPE_SPELLINGS if column == 'Type' else None)
+    if 'Delivery_Date' in df:
+        out['Delivery_Date'] = _clean_categorical(df['Delivery_Date'])
+        out['Delivery_Ready'], out['Delivery_Year'] = parse_delivery(out['Delivery_Date'])
+    return out
+
+
+def encode_categories(values, categories):
+    """Codes of ``values`` against a fixed vocabulary; unseen values become NaN."""
+    codes = pd.Categorical(values, categories=categories).codes.astype(np.float64)
+    codes[codes < 0] = np.nan
+    return codes
+
+
+class ListingStats:
+    """Running statistics for imputation, updated one chunk at a time.
+
+    Means keep a float64 count and sum per column; medians are exact for
+    the small-integer columns, read off a ``bincount`` histogram.
+    """
+
+    def __init__(self):
+        self.rows = 0
+        self.count = {}
+        self.total = {}
+        self.histogram = {}
+
+    def update(self, chunk):
+        self.rows += len(chunk)
+        for column in NUMERIC + ['Level']:
+            if column not in chunk:
+                continue
+            values = chunk[column].to_numpy(dtype=np.float64, na_value=np.nan)
+            values = values[~np.isnan(values)]
+            self.count[column] = self.count.get(column, 0) + len(values)
+            self.total[column] = self.total.get(column, 0.0) + float(values.sum())
+            if column in SMALL_INT:
+                # int8 values, shifted so the histogram index is never negative
+                counts = np.bincount(values.astype(np.int64) + 128, minlength=256)
+                self.histogram[column] = self.histogram.get(column, 0) + counts
+        return self
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """Statistics over every frame in ``chunks`` (e.g. ``read_listings(path)``)."""
+        stats = cls()
+        for chunk in chunks:
+            stats.update(chunk)
+        return stats
+
+    def mean(self, column):
+        count = self.count.get(column, 0)
+        return self.total[column] / count if count else np.nan
+
+    def median(self, column):
+        if column not in SMALL_INT:
+            raise ValueError(f"A streaming median is only kept for {', '.join(SMALL_INT)}, not {column!r}")
+        histogram = self.histogram.get(column)
+        if histogram is None or not histogram.sum():
+            return np.nan
+        cumulative = np.cumsum(histogram)
+        n = cumulative[-1]
+        # Same convention as pandas: the mean of the two middle values
+        lower = np.searchsorted(cumulative, (n + 1) // 2)
+        upper = np.searchsorted(cumulative, n // 2 + 1)
+        return (lower + upper) / 2 - 128
+
+    def fill_values(self, impute=IMPUTE):
+        return {column: getattr(self, how)(column) for column, how in impute.items()}
+
+
+def fill_missing(listings, impute=IMPUTE, stats=None):
+    """Fill the ``impute`` columns (mean/median); ``stats`` default to the frame's own."""
+    stats = stats or ListingStats().update(listings)
+    values = {}
+    for column, value in stats.fill_values(impute).items():
+        if column in listings and not np.isnan(value):
+            # A half-way median of an integer column rounds to a whole number
+            values[column] = round(value) if column in SMALL_INT else value
+    return listings.fillna(values)
+
+
+def read_listings(path=LISTINGS_PATH, chunksize=CHUNK_ROWS, columns=None):
+    """Yield typed chunks of a listings CSV of any size (only ``columns`` if given)."""
+    usecols = None if columns is None else (lambda name: name.strip() in columns)
+    reader = pd.read_csv(path, dtype='category', chunksize=chunksize, encoding='utf-8-sig',
+                         usecols=usecols)
+    for chunk in reader:
+        chunk.columns = chunk.columns.str.strip()
+        yield clean_listings(chunk)
+
+
+def iter_listings(path=LISTINGS_PATH, chunksize=CHUNK_ROWS, columns=None, impute=IMPUTE, stats=None):
+    """Yield typed chunks with the ``impute`` columns filled.
+
+    The fill values are whole-file statistics, so unless ``stats`` is given
+    the file is read twice: once into ``ListingStats``, then chunk by chunk
+    through ``fill_missing``.
+    """
+    if impute and stats is None:
+        stats = ListingStats.from_chunks(read_listings(path, chunksize, columns))
+    for chunk in read_listings(path, chunksize, columns):
+        yield fill_missing(chunk, impute, stats) if impute else chunk
+
+
+def concat_listings(chunks):
+    """Concatenate typed chunks, merging each categorical's categories.
+
+    Columns are taken out of ``chunks`` (which is emptied) as they are
+    merged, so the peak is about one copy of the frame, not two.
+    """
+    from pandas.api.types import union_categoricals
+
+    if len(chunks) == 1:
+        return chunks.pop().reset_index(drop=True)
+    parts = {column: [] for column in chunks[0].columns}
+    while chunks:
+        chunk = chunks.pop()
+        for column, arrays in parts.items():
+            arrays.insert(0, chunk[column])
+    data = {}
+    for column in list(parts):
+        arrays = parts.pop(column)
+        if isinstance(arrays[0].dtype, pd.CategoricalDtype):
+            data[column] = union_categoricals(arrays, sort_categories=True)
+        else:
+            data[column] = pd.concat(arrays, ignore_index=True).array
+        del arrays
+    return pd.DataFrame(data, copy=False)
+
+
+def load_listings(path=LISTINGS_PATH, chunksize=CHUNK_ROWS, impute=None, columns=None):
+    """Read ``path`` into one typed frame; for files that fit in memory.
+
+    With ``impute`` (e.g. ``IMPUTE``) the missing values are filled from
+    statistics gathered while the chunks were read.  Larger files go
+    through ``iter_listings`` instead.
+    """
+    stats = ListingStats()
+    chunks = []
+    for chunk in read_listings(path, chunksize, columns):
+        if impute:
+            stats.update(chunk)
+        chunks.append(chunk)
+    listings = concat_listings(chunks)
+    return fill_missing(listings, impute, stats) if impute else listings
+
+
+def _load_untyped(path):
+    # What the real-estate script used to do
+    df = pd.read_csv(path)
+    for column in NUMERIC:
+        df[column] = pd.to_numeric(df[column], errors='coerce')
+    df['Price'] = df['Price'].fillna(df['Price'].mean())
+    df['Bedrooms'] = df['Bedrooms'].fillna(df['Bedrooms'].median())
+    df['Bathrooms'] = df['Bathrooms'].fillna(df['Bathrooms'].median())
+    df['Area'] = df['Area'].fillna(df['Area'].mean())
+    return df
+
+
+def _measure(job):
+    # Runs in a fresh interpreter so the peak covers only this load
+    from .datastore import _peak_rss_kib
+
+    kind, path, chunksize = job
+    before = _peak_rss_kib(reset=True)
+    started = time.perf_counter()
+    if kind == 'streamed':
+        # Chunk by chunk, keeping only the running Price sum
+        total = count = frame_mib = 0
+        for chunk in iter_listings(path, chunksize):
+            total += float(chunk['Price'].to_numpy(dtype=np.float64).sum())
+            count += len(chunk)
+            frame_mib = max(frame_mib, chunk.memory_usage(deep=True).sum() / 1024 ** 2)
+        return time.perf_counter() - started, (_peak_rss_kib() - before) / 1024, frame_mib, total / count
+    if kind == 'untyped':
+        df = _load_untyped(path)
+    else:
+        df = load_listings(path, chunksize, impute=IMPUTE)
+    seconds = time.perf_counter() - started
+    frame_mib = df.memory_usage(deep=True).sum() / 1024 ** 2
+    return seconds, (_peak_rss_kib() - before) / 1024, frame_mib, df['Price'].mean()
+
+
+def _replicate(path, scale, directory):
+    # A ``scale``-times longer copy of the CSV, written line for line
+    target = Path(directory) / f"{Path(path).stem}_x{scale}.csv"
+    with open(path, 'rb') as source:
+        header = source.readline()
+        body = source.read()
+    if not body.endswith(b'\n'):
+        body += b'\n'
+    with open(target, 'wb') as out:
+        out.write(header)
+        for _ in range(scale):
+            out.write(body)
+    return target
+
+
+def benchmark(path=LISTINGS_PATH, scale=1, chunksize=CHUNK_ROWS):
+    """Peak memory and time of the untyped load versus ``load_listings`` and ``iter_listings``.
+
+    ``frame_mib`` is the whole frame for the loaders and the largest chunk
+    for the streamed pass.
+    """
+    import multiprocessing
+    import tempfile
+    from concurrent.futures import ProcessPoolExecutor
+
+    context = multiprocessing.get_context('spawn')
+    rows = []
+    with tempfile.TemporaryDirectory() as scratch:
+        source = path if scale == 1 else _replicate(path, scale, scratch)
+        for kind in ('untyped', 'typed', 'streamed'):
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                seconds, peak, frame, mean = pool.submit(_measure, (kind, str(source), chunksize)).result()
+            rows.append({'loader': kind, 'seconds': seconds, 'peak_rss_mib': peak,
+                         'frame_mib': frame, 'mean_price': mean})
+    return pd.DataFrame(rows).set_index('loader')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load or benchmark the typed house listings.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    stats_cmd = sub.add_parser('stats')
+    stats_cmd.add_argument('path', nargs='?', default=str(LISTINGS_PATH))
+    stats_cmd.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    bench_cmd = sub.add_parser('bench')
+    bench_cmd.add_argument('path', nargs='?', default=str(LISTINGS_PATH))
+    bench_cmd.add_argument('--scale', type=int, default=1, help="replicate the file this many times")
+    bench_cmd.add_argument('--chunk-size', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    if args.command == 'stats':
+        started = time.perf_counter()
+        stats = ListingStats.from_chunks(read_listings(args.path, args.chunk_size))
+        print(f"{stats.rows:,} listings streamed in {time.perf_counter() - started:.2f}s")
+        for column, value in stats.fill_values().items():
+            print(f"{column:>10}: {IMPUTE[column]} {value:,.2f} over {stats.count[column]:,} values")
+        return
+
+    table = benchmark(args.path, args.scale, args.chunk_size)
+    print(table.to_string(float_format=lambda v: f"{v:,.3f}"))
+    for kind in ('typed', 'streamed'):
+        ratio = table.loc['untyped', 'peak_rss_mib'] / max(table.loc[kind, 'peak_rss_mib'], 1e-9)
+        print(f"Peak memory reduction ({kind}): {ratio:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
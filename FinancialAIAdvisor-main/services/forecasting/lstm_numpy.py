@@ -0,0 +1,427 @@
+"""TensorFlow-free LSTM inference.
+
+``export`` writes a fitted LSTM bundle (the ``lstm_stage`` result: Keras
+model, ``MinMaxScaler`` and sequence length) to one ``.npz`` file of float32
+arrays.  ``load`` reads it back as an ``LSTMBundle`` whose ``model`` is a
+``NumpyLSTM``: the same stacked LSTM/Dense forward pass in NumPy, with
+Keras' gate order (input, forget, cell, output) and activations, and a
+scaler that only knows ``transform`` / ``inverse_transform``.  Neither
+TensorFlow nor scikit-learn is imported, so loading takes milliseconds.
+
+Each LSTM layer projects all time steps of the whole batch through its
+input kernel in one matmul, then runs one ``(batch, units) @ (units,
+4 * units)`` matmul per step; predictions agree with ``model.predict`` to
+float32 round-off.
+
+The model cache writes ``lstm.npz`` next to every Keras entry, and
+``forecasting.serve --lstm-backend numpy`` serves from it.
+
+Command line::
+
+    python -m forecasting.lstm_numpy export gold lstm-gold.npz
+    python -m forecasting.lstm_numpy check egx100 --batch 256
+"""
+
+import argparse
+import json
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+EXPORT_VERSION = 1
+EXPORT_NAME = 'lstm.npz'
+
+
+def _sigmoid(x, out=None):
+    out = np.negative(x, out=out)
+    np.exp(out, out=out)
+    out += 1
+    return np.reciprocal(out, out=out)
+
+
+def _hard_sigmoid(x, out=None):
+    # Keras 3 definition: relu6(x + 3) / 6
+    out = np.add(x, 3, out=out)
+    np.clip(out, 0, 6, out=out)
+    out /= 6
+    return out
+
+
+def _linear(x, out=None):
+    if out is None:
+        return x
+    out[...] = x
+    return out
+
+
+ACTIVATIONS = {
+    'sigmoid': _sigmoid,
+    'hard_sigmoid': _hard_sigmoid,
+    'tanh': lambda x, out=None: np.tanh(x, out=out),
+    'relu': lambda x, out=None: np.maximum(x, 0, out=out),
+    'linear': _linear,
+}
+
+
+@dataclass
+class LSTMLayer:
+    kernel: np.ndarray              # (features, 4 * units), gates i, f, c, o
+    recurrent_kernel: np.ndarray    # (units, 4 * units)
+    bias: np.ndarray                # (4 * units,)
+    activation: str = 'tanh'
+    recurrent_activation: str = 'sigmoid'
+    return_sequences: bool = False
+
+    @property
+    def units(self):
+        return self.recurrent_kernel.shape[0]
+
+    def __call__(self, x, state=None, return_state=False):
+        """Run over ``x``; ``state`` is an initial ``(h, c)``, broadcast to the batch."""
+        batch, steps, features = x.shape
+        units = self.units
+        act = ACTIVATIONS[self.activation]
+        gate = ACTIVATIONS[self.recurrent_activation]
+        # Input contributions for every step in one matmul
+        projected = (x.reshape(batch * steps, features) @ self.kernel + self.bias)
+        projected = projected.reshape(batch, steps, 4 * units)
+        if state is None:
+            h = np.zeros((batch, units), dtype=np.float32)
+            c = np.zeros((batch, units), dtype=np.float32)
+        else:
+            h, c = (np.array(np.broadcast_to(s, (batch, units)), dtype=np.float32) for s in state)
+        z = np.empty((batch, 4 * units), dtype=np.float32)
+        outputs = np.empty((batch, steps, units), dtype=np.float32) if self.return_sequences else None
+        for t in range(steps):
+            np.matmul(h, self.recurrent_kernel, out=z)
+            z += projected[:, t]
+            i = gate(z[:, :units])
+            f = gate(z[:, units:2 * units])
+            g = act(z[:, 2 * units:3 * units])
+            o = gate(z[:, 3 * units:])
+            c *= f
+            c += i * g
+            h = o * act(c)
+            if outputs is not None:
+                outputs[:, t] = h
+        out = outputs if self.return_sequences else h
+        return (out, (h, c)) if return_state else out
+
+
+@dataclass
+class DenseLayer:
+    kernel: np.ndarray
+    bias: np.ndarray
+    activation: str = 'linear'
+
+    def __call__(self, x):
+        return ACTIVATIONS[self.activation](x @ self.kernel + self.bias)
+
+
+class NumpyLSTM:
+    """A stack of ``LSTMLayer`` / ``DenseLayer`` with ``model.predict``'s contract."""
+
+    def __init__(self, layers):
+        self.layers = list(layers)
+
+    @property
+    def input_shape(self):
+        return (None, None, self.layers[0].kernel.shape[0])
+
+    @classmethod
+    def from_keras(cls, model):
+        layers = []
+        for layer in model.layers:
+            kind = type(layer).__name__
+            config = layer.get_config()
+            weights = [np.ascontiguousarray(w, dtype=np.float32) for w in layer.get_weights()]
+            if kind == 'LSTM':
+                if not config.get('use_bias', True):
+                    weights.append(np.zeros(weights[1].shape[1], dtype=np.float32))
+                layers.append(LSTMLayer(*weights, activation=config['activation'],
+                                        recurrent_activation=config['recurrent_activation'],
+                                        return_sequences=config['return_sequences']))
+            elif kind == 'Dense':
+                if not config.get('use_bias', True):
+                    weights.append(np.zeros(weights[0].shape[1], dtype=np.float32))
+                layers.append(DenseLayer(*weights, activation=config['activation']))
+            elif kind in ('InputLayer', 'Dropout'):
+                continue    # nothing to do at inference time
+            else:
+                raise ValueError(f"Cannot export layer {layer.name!r} of type {kind}")
+            activations = [getattr(layers[-1], a) for a in ('activation', 'recurrent_activation')
+                           if hasattr(layers[-1], a)]
+            unknown = [a for a in activations if a not in ACTIVATIONS]
+            if unknown:
+                raise ValueError(f"Unsupported activation(s) {unknown} in layer {layer.name!r}")
+        return cls(layers)
+
+    def predict(self, x, batch_size=1024, verbose=0):
+        """Outputs for windows ``x`` of shape ``(batch, steps, features)``."""
+        x = np.asarray(x, dtype=np.float32)
+        if x.ndim == 2:
+            x = x[..., None]
+        outputs = []
+        for start in range(0, len(x), batch_size):
+            out = x[start:start + batch_size]
+            for layer in self.layers:
+                out = layer(out)
+            outputs.append(out)
+        return np.concatenate(outputs) if outputs else np.empty((0, 1), dtype=np.float32)
+
+    __call__ = predict
+
+    def rollout(self, windows, steps):
+        """Feed each prediction back as the newest input for ``steps`` steps.
+
+        ``windows`` is ``(batch, length, 1)``; returns ``(batch, steps)``.
+        """
+        windows = np.array(windows, dtype=np.float32)
+        out = np.empty((len(windows), steps), dtype=np.float32)
+        for h in range(steps):
+            step = self.predict(windows)[:, 0]
+            out[:, h] = step
+            windows[:, :-1, 0] = windows[:, 1:, 0]
+            windows[:, -1, 0] = step
+        return out
+
+    def sample_paths(self, window, noise, share_prefix=True):
+        """Rollouts of one ``window`` with ``noise[:, h]`` added to step ``h``'s prediction.
+
+        ``window`` holds ``length`` inputs, ``noise`` is ``(paths, steps)``;
+        returns ``(paths, steps)``.  All paths are one batch.  At step ``h``
+        the first ``length - h`` inputs are still the observed ones, the
+        same for every path, so with ``share_prefix`` each layer runs them
+        once and only the ``h`` simulated steps run for the whole batch,
+        starting from that shared state.  The result is the same either way.
+        """
+        window = np.asarray(window, dtype=np.float32).reshape(-1)
+        noise = np.asarray(noise, dtype=np.float32)
+        paths, steps = noise.shape
+        length = len(window)
+        out = np.empty((paths, steps), dtype=np.float32)
+        for h in range(steps):
+            shared = max(length - h, 0)
+            simulated = out[:, h - (length - shared):h]
+            if not share_prefix:
+                x = np.concatenate([np.broadcast_to(window[h:], (paths, shared)), simulated],
+                                   axis=1)
+                out[:, h] = self.predict(x, batch_size=paths)[:, 0]
+            else:
+                out[:, h] = self._predict_shared(window[h:], simulated)[:, 0]
+            out[:, h] += noise[:, h]
+        return out
+
+    def _predict_shared(self, prefix, suffix):
+        # ``prefix`` (shared inputs) followed by each row of ``suffix``
+        prefix = prefix[None, :, None] if len(prefix) else None
+        suffix = suffix[..., None] if suffix.shape[1] else None
+        for layer in self.layers:
+            if not isinstance(layer, LSTMLayer):
+                prefix = None if prefix is None else layer(prefix)
+                suffix = None if suffix is None else layer(suffix)
+                continue
+            state = None
+            if prefix is not None:
+                prefix, state = layer(prefix, return_state=True)
+            if suffix is not None:
+                suffix = layer(suffix, state=state)
+                if not layer.return_sequences:
+                    prefix = None   # only its state was needed
+        # Without simulated inputs (step 0) every path has the prefix's output
+        return suffix if suffix is not None else prefix
+
+
+@dataclass
+class Scaler:
+    """The ``transform`` / ``inverse_transform`` half of a fitted ``MinMaxScaler``."""
+    scale_: np.ndarray
+    min_: np.ndarray
+
+    @classmethod
+    def from_sklearn(cls, scaler):
+        return cls(np.asarray(scaler.scale_, dtype=np.float64),
+                   np.asarray(scaler.min_, dtype=np.float64))
+
+    def transform(self, x):
+        return np.asarray(x, dtype=np.float64) * self.scale_ + self.min_
+
+    def inverse_transform(self, x):
+        return (np.asarray(x, dtype=np.float64) - self.min_) / self.scale_
+
+
+@dataclass
+class LSTMBundle:
+    """What ``lstm_stage`` returns, minus TensorFlow; indexable like the dict."""
+    model: NumpyLSTM
+    scaler: Scaler
+    sequence_length: int
+
+    def __getitem__(self, key):
+        return getattr(self, key)
+
+    def keys(self):
+        return ('model', 'scaler', 'sequence_length')
+
+    def forecast(self, values, steps):
+        """``steps`` forecasts (original units) following the series ``values``."""
+        values = np.asarray(values, dtype=float)[-self.sequence_length:]
+        window = self.scaler.transform(values.reshape(-1, 1)).astype(np.float32)[None]
+        scaled = self.model.rollout(window, steps)[0]
+        return self.scaler.inverse_transform(scaled.reshape(-1, 1)).ravel()
+
+
+def to_numpy(bundle):
+    """An ``lstm_stage`` bundle (Keras model, sklearn scaler) as an ``LSTMBundle``."""
+    if isinstance(bundle, LSTMBundle):
+        return bundle
+    model = bundle['model']
+    if not isinstance(model, NumpyLSTM):
+        model = NumpyLSTM.from_keras(model)
+    scaler = bundle['scaler']
+    if not isinstance(scaler, Scaler):
+        scaler = Scaler.from_sklearn(scaler)
+    return LSTMBundle(model, scaler, int(bundle['sequence_length']))
+
+
+def export(bundle, path):
+    """Write an ``lstm_stage`` bundle (Keras model) to ``path`` as float32 arrays."""
+    bundle = to_numpy(bundle)
+    model, scaler = bundle.model, bundle.scaler
+    arrays = {'scaler.scale': scaler.scale_, 'scaler.min': scaler.min_}
+    layout = []
+    for i, layer in enumerate(model.layers):
+        if isinstance(layer, LSTMLayer):
+            layout.append({'kind': 'lstm', 'activation': layer.activation,
+                           'recurrent_activation': layer.recurrent_activation,
+                           'return_sequences': layer.return_sequences})
+            arrays[f'{i}.recurrent_kernel'] = layer.recurrent_kernel
+        else:
+            layout.append({'kind': 'dense', 'activation': layer.activation})
+        arrays[f'{i}.kernel'] = layer.kernel
+        arrays[f'{i}.bias'] = layer.bias
+    header = {'version': EXPORT_VERSION, 'sequence_length': int(bundle['sequence_length']),
+              'layers': layout}
+    with open(path, 'wb') as fh:
+        np.savez(fh, header=np.array(json.dumps(header)), **arrays)
+    return path
+
+
+def load(path):
+    """Read an ``export`` file back as an ``LSTMBundle``."""
+    with np.load(path) as data:
+        header = json.loads(str(data['header']))
+        if header['version'] != EXPORT_VERSION:
+            raise ValueError(f"{path}: export version {header['version']}, "
+                             f"expected {EXPORT_VERSION}")
+        layers = []
+        for i, spec in enumerate(header['layers']):
+            spec = dict(spec)
+            kind = spec.pop('kind')
+            if kind == 'lstm':
+                layers.append(LSTMLayer(data[f'{i}.kernel'], data[f'{i}.recurrent_kernel'],
+                                        data[f'{i}.bias'], **spec))
+            else:
+                layers.append(DenseLayer(data[f'{i}.kernel'], data[f'{i}.bias'], **spec))
+        scaler = Scaler(data['scaler.scale'], data['scaler.min'])
+    return LSTMBundle(NumpyLSTM(layers), scaler, header['sequence_length'])
+
+
+def load_cached(cache, key):
+    """The exported bundle of cache entry ``key``, or None when there is none.
+
+    Entries written before exports existed have no ``lstm.npz``; one is
+    added from the Keras model (importing TensorFlow once) when possible.
+    """
+    directory = cache.path(key)
+    if directory is None:
+        return None
+    path = directory / EXPORT_NAME
+    if not path.exists():
+        cached = cache.load(key)
+        if cached is None:
+            return None
+        export(cached[0], path)
+    return load(path)
+
+
+def _windows(asset, batch):
+    from .assets import load_series
+    from .cache import ModelCache
+    from .models import run_stage, split_sizes
+    from .windows import create_sequences
+
+    series = load_series(asset)
+    train_size, val_size = split_sizes(len(series))
+    bundle, _, _ = run_stage('lstm', series, train_size, val_size, cache=ModelCache(),
+                             target=series.name)
+    scaled = bundle['scaler'].transform(np.asarray(series, dtype=float).reshape(-1, 1))
+    windows, _ = create_sequences(scaled, bundle['sequence_length'])
+    return bundle, windows[-batch:].astype(np.float32)
+
+
+def check(asset, batch=256, repeat=5):
+    """Compare the NumPy forward pass with ``model.predict`` on ``asset``'s last windows."""
+    import tempfile
+    from pathlib import Path
+
+    bundle, windows = _windows(asset, batch)
+    with tempfile.TemporaryDirectory() as scratch:
+        path = export(bundle, Path(scratch) / EXPORT_NAME)
+        size = path.stat().st_size
+        started = time.perf_counter()
+        fast = load(path)
+        load_seconds = time.perf_counter() - started
+
+    def best(fn):
+        fn()  # warm up (and let Keras build its predict function)
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            timings.append(time.perf_counter() - started)
+        return result, min(timings)
+
+    expected, keras_seconds = best(lambda: bundle['model'].predict(windows, verbose=0))
+    actual, numpy_seconds = best(lambda: fast.model.predict(windows))
+    diff = np.abs(np.asarray(expected, dtype=np.float64) - actual)
+    single, single_seconds = best(lambda: fast.model.predict(windows[-1:]))
+    return {
+        'windows': len(windows), 'export_bytes': size, 'load_seconds': load_seconds,
+        'max_abs_diff': float(diff.max()), 'keras_seconds': keras_seconds,
+        'numpy_seconds': numpy_seconds, 'numpy_single_seconds': single_seconds,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export and check TensorFlow-free LSTM weights.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    exp = sub.add_parser('export', help="write an asset's cached LSTM to an .npz file")
+    exp.add_argument('asset')
+    exp.add_argument('path')
+    chk = sub.add_parser('check', help="compare with model.predict and time both")
+    chk.add_argument('asset')
+    chk.add_argument('--batch', type=int, default=256)
+    chk.add_argument('--tolerance', type=float, default=1e-4)
+    args = parser.parse_args(argv)
+
+    if args.command == 'export':
+        bundle, _ = _windows(args.asset, 1)
+        export(bundle, args.path)
+        print(f"Wrote {args.path}")
+        return 0
+    result = check(args.asset, args.batch)
+    print(f"{args.asset}: {result['windows']} windows, export {result['export_bytes'] / 1024:.0f} KiB "
+          f"loaded in {result['load_seconds'] * 1000:.1f}ms")
+    print(f"  keras predict {result['keras_seconds'] * 1000:8.1f}ms")
+    print(f"  numpy predict {result['numpy_seconds'] * 1000:8.1f}ms "
+          f"(single window {result['numpy_single_seconds'] * 1000:.2f}ms)")
+    ok = result['max_abs_diff'] <= args.tolerance
+    print(f"  max |difference| {result['max_abs_diff']:.2e} (scaled units): "
+          f"{'ok' if ok else 'EXCEEDS'} {args.tolerance:g}")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -0,0 +1,326 @@
+"""Model stages shared by the forecasting scripts.
+
+Each ``*_stage`` function takes the full target series plus the split sizes,
+fits one model family and returns ``(model, forecast, metrics)``.
+``metrics`` scores the test slice and, with a ``val_`` prefix, the
+validation slice.  Every family earns its validation score the same way: a
+fit on the training slice alone forecasts the whole validation slice ahead
+from the end of training, so model routing can rank and weight families
+on it.  Modelling libraries are imported inside the stages so that callers
+only pay for the backends they actually run.
+"""
+
+import numpy as np
+import pandas as pd
+
+from .trace import keras_callbacks, span
+from .windows import create_sequences, window_dataset
+
+ARIMA_ORDER = (1, 1, 1)
+SARIMA_ORDER = (1, 1, 1)
+SARIMA_SEASONAL_ORDER = (1, 1, 1, 12)
+SEQUENCE_LENGTH = 60
+LSTM_EPOCHS = 10
+LSTM_BATCH_SIZE = 32
+LSTM_LEARNING_RATE = 0.001  # Adam's default, tuned for LSTM_BATCH_SIZE
+
+# Opt-in Prophet refresh modes: PROPHET_FAST skips the uncertainty intervals
+# (same yhat); PROPHET_WARM also starts from the last fit's parameters, which
+# moves yhat by up to prophet_warm.WARM_TOLERANCE of the series level
+PROPHET_FAST = {'fast': True}
+PROPHET_WARM = {'warm_start': True, 'fast': True}
+
+# Opt-in training mode (``configs={'lstm': LSTM_FAST}``): windows streamed
+# through tf.data, larger batches with a scaled learning rate, and an epoch
+# cap that early stopping on validation loss rarely reaches
+LSTM_FAST = {'pipeline': 'stream', 'epochs': 50, 'patience': 5, 'batch_size': 128,
+             'lr_scaling': 'sqrt'}
+
+MODEL_NAMES = ("arima", "sarima", "prophet", "lstm")
+
+
+def split_sizes(n, train_frac=0.7, val_frac=0.15):
+    # Same 70/15/15 cut the scripts have always used
+    return int(n * train_frac), int(n * val_frac)
+
+
+def split_series(series, train_size, val_size):
+    return (
+        series[:train_size],
+        series[train_size:train_size + val_size],
+        series[train_size + val_size:],
+    )
+
+
+def evaluate(actual, predicted):
+    # Same formulas as sklearn's mean_absolute_error / mean_squared_error /
+    # r2_score, without importing sklearn (about a second of cold start)
+    actual = np.asarray(actual, dtype=float).ravel()
+    predicted = np.asarray(predicted, dtype=float).ravel()
+    error = actual - predicted
+    residual = np.sum(error ** 2)
+    total = np.sum((actual - actual.mean()) ** 2)
+    if total != 0:
+        r2 = 1 - residual / total
+    else:
+        r2 = 1.0 if residual == 0 else 0.0
+    return {
+        "mae": float(np.mean(np.abs(error))),
+        "rmse": float(np.sqrt(residual / len(actual))),
+        "r2": float(r2),
+    }
+
+
+def with_validation(metrics, actual, predicted):
+    """``metrics`` plus ``val_mae`` / ``val_rmse`` / ``val_r2`` for the validation slice."""
+    if len(actual) == 0:
+        return metrics
+    return dict(metrics, **{f'val_{k}': v for k, v in evaluate(actual, predicted).items()})
+
+
+def positional(series):
+    # Trading-day and listing indexes have no fixed frequency, which
+    # statsmodels refuses to forecast from; fit on positions and put the
+    # real index back on the forecast instead.
+    return pd.Series(np.asarray(series, dtype=float), name=getattr(series, 'name', None))
+
+
+def arima_stage(series, train_size, val_size, order=ARIMA_ORDER):
+    from statsmodels.tsa.arima.model import ARIMA
+
+    train, val, test = split_series(series, train_size, val_size)
+    with span('fit'):
+        fitted = ARIMA(positional(train), order=tuple(order)).fit()
+    with span('predict'):
+        ahead = np.asarray(fitted.forecast(steps=max(len(test), len(val))))
+        forecast = pd.Series(ahead[:len(test)], index=test.index)
+    return fitted, forecast, with_validation(evaluate(test, forecast), val, ahead[:len(val)])
+
+
+def sarima_stage(series, train_size, val_size, order=SARIMA_ORDER,
+                 seasonal_order=SARIMA_SEASONAL_ORDER):
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    train, val, test = split_series(series, train_size, val_size)
+    with span('fit'):
+        fitted = SARIMAX(positional(train), order=tuple(order),
+                         seasonal_order=tuple(seasonal_order)).fit(disp=False)
+    with span('predict'):
+        ahead = np.asarray(fitted.forecast(steps=max(len(test), len(val))))
+        forecast = pd.Series(ahead[:len(test)], index=test.index)
+    return fitted, forecast, with_validation(evaluate(test, forecast), val, ahead[:len(val)])
+
+
+def prophet_frame(series):
+    # Listings have no dates; Prophet gets the same synthetic daily index
+    # the real-estate script has always used.
+    if isinstance(series.index, pd.DatetimeIndex):
+        ds = series.index
+    else:
+        ds = pd.date_range(start='2022-01-01', periods=len(series), freq='D')
+    return pd.DataFrame({'ds': ds, 'y': series.values})
+
+
+def prophet_stage(series, train_size, val_size, yearly_seasonality=True, warm_start=False,
+                  fast=False):
+    """Prophet on the whole series (see ``prophet_warm`` for ``warm_start`` and ``fast``).
+
+    The returned model and its test score are in-sample, as in the scripts;
+    the validation score comes from a second, training-slice-only fit.
+    """
+    from .prophet_warm import fit_prophet
+
+    _, val, test = split_series(series, train_size, val_size)
+    frame = prophet_frame(series)
+    with span('fit'):
+        model, _ = fit_prophet(frame, series.name, warm_start=warm_start,
+                               fast=fast, yearly_seasonality=yearly_seasonality)
+    with span('predict'):
+        future = model.make_future_dataframe(periods=len(test))
+        forecast = model.predict(future)
+    prediction = forecast[-len(test):]['yhat'].values
+    val_prediction = np.empty(0)
+    if len(val):
+        with span('validate'):
+            # yhat only, and no warm-start state: this fit is thrown away
+            held_out, _ = fit_prophet(frame[:train_size], warm_start=False, fast=True,
+                                      yearly_seasonality=yearly_seasonality)
+            val_prediction = held_out.predict(
+                frame[['ds']][train_size:train_size + len(val)])['yhat'].to_numpy()
+    return model, forecast, with_validation(evaluate(test, prediction), val, val_prediction)
+
+
+def scaled_learning_rate(batch_size, scaling=None, base=LSTM_LEARNING_RATE,
+                         base_batch_size=LSTM_BATCH_SIZE):
+    """``base`` scaled for ``batch_size`` by the ``'linear'`` or ``'sqrt'`` rule."""
+    ratio = batch_size / base_batch_size
+    if scaling is None:
+        return base
+    if scaling == 'linear':
+        return base * ratio
+    if scaling == 'sqrt':
+        return base * ratio ** 0.5
+    raise ValueError(f"Unknown learning-rate scaling {scaling!r}; use 'linear' or 'sqrt'")
+
+
+def build_lstm(sequence_length=SEQUENCE_LENGTH, n_features=1, n_outputs=1, learning_rate=None):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, LSTM
+    from tensorflow.keras.optimizers import Adam
+
+    model = Sequential([
+        LSTM(50, return_sequences=True, input_shape=(sequence_length, n_features)),
+        LSTM(50, return_sequences=False),
+        Dense(25),
+        Dense(n_outputs)
+    ])
+    model.compile(optimizer=Adam(learning_rate or LSTM_LEARNING_RATE), loss='mean_squared_error')
+    return model
+
+
+def lstm_stage(series, train_size, val_size, sequence_length=SEQUENCE_LENGTH,
+               epochs=LSTM_EPOCHS, batch_size=LSTM_BATCH_SIZE, pipeline='arrays',
+               patience=None, lr_scaling=None):
+    """LSTM on 0-1 scaled windows.
+
+    ``pipeline='stream'`` feeds the windows through ``window_dataset``
+    instead of handing Keras the window arrays; ``patience`` stops after
+    that many epochs without a lower validation loss and restores the best
+    weights; ``lr_scaling`` adapts the learning rate to ``batch_size`` (see
+    ``scaled_learning_rate``).  The bundle records ``epochs_run`` and
+    ``best_epoch``.
+    """
+    from sklearn.preprocessing import MinMaxScaler
+
+    from .lstm_numpy import to_numpy
+
+    train, val, test = split_series(series, train_size, val_size)
+    scaler = MinMaxScaler(feature_range=(0, 1))
+    scaled_data = scaler.fit_transform(np.asarray(series, dtype=float).reshape(-1, 1))
+    scaled_data = scaled_data.astype(np.float32)
+    train_scaled, val_scaled, test_scaled = split_series(scaled_data, train_size, val_size)
+
+    if pipeline == 'stream':
+        train_data = (window_dataset(train_scaled, sequence_length, batch_size, shuffle=True),)
+        val_data = window_dataset(val_scaled, sequence_length, batch_size)
+        samples = max(len(train_scaled) - sequence_length, 0)
+    elif pipeline == 'arrays':
+        X_train, y_train = create_sequences(train_scaled, sequence_length)
+        train_data = (X_train, y_train)
+        val_data = create_sequences(val_scaled, sequence_length)
+        samples = len(X_train)
+    else:
+        raise ValueError(f"Unknown LSTM pipeline {pipeline!r}; use 'arrays' or 'stream'")
+    X_test, _ = create_sequences(test_scaled, sequence_length)
+
+    callbacks = keras_callbacks()
+    if patience is not None:
+        from tensorflow.keras.callbacks import EarlyStopping
+
+        callbacks.append(EarlyStopping(monitor='val_loss', patience=patience,
+                                       restore_best_weights=True))
+    model = build_lstm(sequence_length, learning_rate=scaled_learning_rate(batch_size, lr_scaling))
+    with span('fit', epochs=epochs, samples=samples) as attrs:
+        history = model.fit(*train_data, validation_data=val_data,
+                            batch_size=None if pipeline == 'stream' else batch_size,
+                            shuffle=pipeline != 'stream',  # the dataset reshuffles itself
+                            epochs=epochs, callbacks=callbacks)
+        val_loss = history.history.get('val_loss', [])
+        epochs_run = len(history.history.get('loss', []))
+        best_epoch = int(np.argmin(val_loss)) + 1 if val_loss else epochs_run
+        if attrs is not None:
+            attrs.update(epochs_run=epochs_run, best_epoch=best_epoch)
+
+    with span('predict'):
+        prediction = scaler.inverse_transform(model.predict(X_test)).flatten()
+    # The first sequence_length test points only serve as the first window
+    forecast = pd.Series(prediction, index=test.index[sequence_length:])
+    bundle = {'model': model, 'scaler': scaler, 'sequence_length': sequence_length,
+              'epochs_run': epochs_run, 'best_epoch': best_epoch}
+    val_prediction = np.empty(0)
+    if len(val):
+        with span('validate'):
+            # Rolled forward from the end of training on its own predictions
+            # (in NumPy, no per-step Keras call), like the other families
+            val_prediction = to_numpy(bundle).forecast(train.values, len(val))
+    metrics = evaluate(test.values[sequence_length:], prediction)
+    return bundle, forecast, with_validation(metrics, val.values, val_prediction)
+
+
+def forecast_ahead(name, model, series, train_size, steps):
+    """``(yhat, lower, upper)`` for ``steps`` points past the end of ``series``.
+
+    ``model`` is what ``name``'s stage returned.  ARIMA/SARIMA filter the
+    rows after the training slice through without re-estimating, the LSTM
+    rolls forward from the last window and Prophet predicts on the series'
+    own calendar (see ``assets.future_dates``).  ``lower``/``upper`` are
+    None unless the model has intervals.
+    """
+    values = np.asarray(series, dtype=float)
+    if name in ('arima', 'sarima'):
+        yhat = model.extend(values[train_size:]).forecast(steps=steps)
+        return np.asarray(yhat, dtype=float), None, None
+    if name == 'lstm':
+        from .lstm_numpy import to_numpy
+
+        return to_numpy(model).forecast(values, steps), None, None
+    if name == 'prophet':
+        if isinstance(series.index, pd.DatetimeIndex):
+            from .assets import future_dates
+
+            future = pd.DataFrame({'ds': future_dates(series.index, steps)})
+        else:
+            future = model.make_future_dataframe(periods=steps, include_history=False)
+        frame = model.predict(future)
+        bands = [frame[column].to_numpy(dtype=float) if column in frame else None
+                 for column in ('yhat_lower', 'yhat_upper')]
+        return frame['yhat'].to_numpy(dtype=float), *bands
+    raise ValueError(f"Unknown model {name!r}")
+
+
+# name -> (stage function, cache serializer, default config)
+STAGES = {
+    'arima': (arima_stage, 'pickle', {'order': ARIMA_ORDER}),
+    'sarima': (sarima_stage, 'pickle', {'order': SARIMA_ORDER,
+                                        'seasonal_order': SARIMA_SEASONAL_ORDER}),
+    'prophet': (prophet_stage, 'prophet', {'yearly_seasonality': True}),
+    'lstm': (lstm_stage, 'keras', {'sequence_length': SEQUENCE_LENGTH,
+                                   'epochs': LSTM_EPOCHS,
+                                   'batch_size': LSTM_BATCH_SIZE}),
+}
+
+
+def stage_config(name, **overrides):
+    config = dict(STAGES[name][2])
+    config.update(overrides)
+    return config
+
+
+def run_stage(name, series, train_size, val_size, cache=None, target=None, load_model=True,
+              **overrides):
+    """Fit one model family, going through ``cache`` when one is given.
+
+    ``load_model=False`` is for callers that only want the forecast and
+    metrics: a cache hit then skips deserializing the model.
+    """
+    stage, kind, _ = STAGES[name]
+    config = stage_config(name, **overrides)
+
+    def fit():
+        return stage(series, train_size, val_size, **config)
+
+    with span(name, rows=len(series)) as attrs:
+        if cache is None:
+            return fit()
+        key = cache.key(series, target or series.name, (train_size, val_size), name, config)
+        with span('cache.load'):
+            cached = cache.load(key, load_model=load_model)
+        if attrs is not None:
+            attrs['cache_hit'] = cached is not None
+        if cached is not None:
+            return cached
+        fitted, forecast, metrics = fit()
+        with span('cache.store'):
+            cache.store(key, fitted, forecast, metrics, kind=kind, model=name,
+                        target=target or series.name)
+        return fitted, forecast, metrics
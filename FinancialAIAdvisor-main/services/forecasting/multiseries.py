@@ -0,0 +1,145 @@
+"""Forecast every usable price series in the gold ``data.csv`` in one pass.
+
+``data.csv`` carries local buy/sell prices for six karats and about thirty
+global karat series, most of the latter almost empty.  The frame is loaded
+once, sparse columns are dropped, and every remaining column is
+interpolated and scaled together.  ARIMA/SARIMA/Prophet fits for all series
+share one worker pool (``runner.run_frame``), and a single multi-output LSTM
+learns all series at once instead of one network per column.
+
+Command line::
+
+    python -m forecasting.multiseries ./data.csv --models arima,sarima,lstm --out gold_all.csv
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from . import datastore
+from .models import (LSTM_BATCH_SIZE, LSTM_EPOCHS, SEQUENCE_LENGTH, build_lstm, evaluate,
+                     split_series, split_sizes)
+from .runner import run_frame
+from .windows import create_sequences
+
+# Columns with less than this share of observed values are dropped (the
+# 15K-31K and 1K-13K global series only have a handful of points)
+MIN_COVERAGE = 0.5
+
+
+def load_price_frame(path, date_column='Date', min_coverage=MIN_COVERAGE):
+    """Return a date-indexed float frame of every sufficiently populated series."""
+    df = datastore.load(path)
+    df.columns = df.columns.str.strip()
+    df[date_column] = pd.to_datetime(df[date_column], errors='coerce')
+    df = df.dropna(subset=[date_column]).set_index(date_column).sort_index()
+
+    prices = df.select_dtypes('number')
+    coverage = prices.notna().mean()
+    prices = prices.loc[:, coverage >= min_coverage]
+    # One vectorized pass over all columns; edges are filled from the nearest
+    # observation so every series covers the same dates.
+    prices = prices.interpolate(method='linear', limit_direction='both')
+    return prices.astype(np.float64)
+
+
+def minmax_scale(values):
+    """Scale each column to [0, 1]; returns ``(scaled float32, low, span)``."""
+    low = np.nanmin(values, axis=0)
+    span = np.nanmax(values, axis=0) - low
+    span[span == 0] = 1.0
+    scaled = ((values - low) / span).astype(np.float32)
+    return scaled, low, span
+
+
+def multi_output_lstm(frame, train_size, val_size, sequence_length=SEQUENCE_LENGTH,
+                      epochs=LSTM_EPOCHS, batch_size=LSTM_BATCH_SIZE):
+    """Train one LSTM on all columns jointly; returns ``(model, forecast, metrics)``.
+
+    ``forecast`` is a frame aligned with the test rows after the first
+    window, and ``metrics`` maps each column to its MAE/RMSE/R^2.
+    """
+    values = frame.to_numpy(dtype=np.float64)
+    scaled, low, span = minmax_scale(values)
+    train_scaled, val_scaled, test_scaled = split_series(scaled, train_size, val_size)
+
+    X_train, y_train = create_sequences(train_scaled, sequence_length)
+    X_val, y_val = create_sequences(val_scaled, sequence_length)
+    X_test, _ = create_sequences(test_scaled, sequence_length)
+
+    n_series = values.shape[1]
+    model = build_lstm(sequence_length, n_features=n_series, n_outputs=n_series)
+    model.fit(X_train, y_train, validation_data=(X_val, y_val), batch_size=batch_size,
+              epochs=epochs, verbose=0)
+
+    prediction = model.predict(X_test, verbose=0) * span + low
+    test = frame.iloc[train_size + val_size:]
+    forecast = pd.DataFrame(prediction, index=test.index[sequence_length:], columns=frame.columns)
+    actual = test.iloc[sequence_length:]
+    metrics = {column: evaluate(actual[column], forecast[column]) for column in frame.columns}
+    return model, forecast, metrics
+
+
+def forecast_all(frame, models=('arima', 'sarima', 'lstm'), cache=None, max_workers=None):
+    """Fit ``models`` on every column of ``frame`` and return a tidy results table.
+
+    The table has one row per (series, model) with MAE, RMSE, R^2, the fit
+    time and any error text.
+    """
+    train_size, val_size = split_sizes(len(frame))
+    rows = []
+
+    per_series = [name for name in models if name != 'lstm']
+    if per_series:
+        runs = run_frame(frame, train_size, val_size, models=per_series, cache=cache,
+                         max_workers=max_workers)
+        for column, run in runs.items():
+            for name, result in run.results.items():
+                rows.append(dict({'series': column, 'model': name, 'seconds': result.seconds,
+                                  'error': result.error}, **(result.metrics or {})))
+
+    if 'lstm' in models:
+        started = time.perf_counter()
+        try:
+            _, _, metrics = multi_output_lstm(frame, train_size, val_size)
+            error = None
+        except Exception as e:
+            metrics, error = {}, f"{type(e).__name__}: {e}"
+        # One shared network: report its time once per series as the amortized cost
+        seconds = (time.perf_counter() - started) / len(frame.columns)
+        for column in frame.columns:
+            rows.append(dict({'series': column, 'model': 'lstm', 'seconds': seconds,
+                              'error': error}, **metrics.get(column, {})))
+
+    table = pd.DataFrame(rows, columns=['series', 'model', 'mae', 'rmse', 'r2', 'seconds', 'error'])
+    return table.sort_values(['series', 'model']).reset_index(drop=True)
+
+
+def main(argv=None):
+    from .cache import ModelCache
+
+    parser = argparse.ArgumentParser(description="Forecast every gold price series in one run.")
+    parser.add_argument('path', nargs='?', default=str(datastore.SERVICES_DIR / 'data.csv'))
+    parser.add_argument('--models', default='arima,sarima,lstm')
+    parser.add_argument('--min-coverage', type=float, default=MIN_COVERAGE)
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--out', help="write the results table to this CSV")
+    args = parser.parse_args(argv)
+
+    frame = load_price_frame(args.path, min_coverage=args.min_coverage)
+    print(f"Forecasting {len(frame.columns)} series over {len(frame)} dates")
+    cache = None if args.no_cache else ModelCache()
+    table = forecast_all(frame, models=tuple(args.models.split(',')), cache=cache,
+                         max_workers=args.workers)
+    if args.out:
+        table.to_csv(args.out, index=False)
+    with pd.option_context('display.width', 160, 'display.max_rows', None,
+                           'display.max_columns', None):
+        print(table.drop(columns='error'))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""Incremental daily updates for the gold and EGX100 models.
+
+A refit conditions the fitted models on the whole series and saves that
+state.  Each later ``update`` compares the series with what the state has
+seen and, when only new tail rows were appended:
+
+* ARIMA/SARIMA filter the new rows through ``results.extend`` with the
+  estimated parameters unchanged (no re-estimation);
+* the LSTM's ``MinMaxScaler`` is checked against the new values; rows
+  outside its bounds flag a rescale (``scaler_policy='expand'`` widens the
+  bounds instead), and the network is fine-tuned for a few epochs on the
+  latest windows.
+
+Before each model takes the new rows, its one-step-ahead errors on them are
+recorded.  When the mean absolute error over the most recent rows exceeds
+``threshold`` times the error it had right after the last refit, or new
+values overshoot the scaler range by more than ``rescale_tolerance``, the
+models are refit from scratch (through the model cache).  An edited
+history (anything but appended rows) also forces a refit.
+
+Command line::
+
+    python -m forecasting.online update gold egx100
+    python -m forecasting.online status gold
+    python -m forecasting.online simulate egx100 --days 20
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+
+from .cache import fingerprint
+from .datastore import SERVICES_DIR
+from .models import run_stage, split_sizes
+from .trace import span
+
+DEFAULT_STATE_DIR = Path(os.environ.get('FORECAST_ONLINE_DIR', SERVICES_DIR / '.online'))
+ONLINE_MODELS = ('arima', 'sarima', 'lstm')
+STATE_VERSION = 1
+
+# Refit when recent one-step MAE / post-refit one-step MAE exceeds this
+DRIFT_THRESHOLD = 2.0
+# One-step errors kept per model, and how many are needed to judge drift
+DRIFT_WINDOW = 20
+MIN_DRIFT_POINTS = 5
+# New values beyond the scaler range by more than this fraction of the
+# range force a refit
+RESCALE_TOLERANCE = 0.1
+FINETUNE_WINDOWS = 64
+FINETUNE_EPOCHS = 3
+FORECAST_STEPS = 5
+
+
+@dataclass
+class UpdateReport:
+    name: str
+    target: str
+    rows: int
+    new_rows: int
+    action: str                     # 'current', 'updated' or 'refit'
+    reason: str = ''
+    drift: dict = field(default_factory=dict)       # model -> recent / baseline MAE
+    rescale: dict = None            # set when new values left the scaler range
+    forecasts: dict = field(default_factory=dict)   # model -> next steps
+    seconds: float = 0.0
+
+    def summary(self):
+        parts = [f"{self.name}: {self.action} with {self.new_rows} new row(s) of {self.rows:,} "
+                 f"in {self.seconds:.2f}s" + (f" ({self.reason})" if self.reason else '')]
+        if self.drift:
+            parts.append("drift " + ', '.join(f"{m}={r:.2f}" for m, r in self.drift.items()))
+        if self.rescale:
+            parts.append(f"rescale {'applied' if self.rescale['expanded'] else 'needed'}: "
+                         f"overshoot {self.rescale['overshoot']:.1%} of the scaler range")
+        for model, values in self.forecasts.items():
+            parts.append(f"{model} next: " + ', '.join(f"{v:,.2f}" for v in values))
+        return '\n  '.join(parts)
+
+
+def state_dir(name, target, root=DEFAULT_STATE_DIR):
+    tag = hashlib.sha1(str(target).encode()).hexdigest()[:8]
+    return Path(root) / f"{name}-{tag}"
+
+
+def _save(directory, meta, models):
+    """Write the whole state into a scratch directory, then swap it in."""
+    directory.parent.mkdir(parents=True, exist_ok=True)
+    tmp = directory.with_name(directory.name + '.tmp')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir()
+    for name, fitted in models.items():
+        if name == 'lstm':
+            fitted['model'].save(tmp / 'lstm.keras')
+            with open(tmp / 'lstm.pkl', 'wb') as fh:
+                pickle.dump({k: v for k, v in fitted.items() if k != 'model'}, fh)
+        else:
+            with open(tmp / f'{name}.pkl', 'wb') as fh:
+                pickle.dump(fitted, fh, protocol=pickle.HIGHEST_PROTOCOL)
+    (tmp / 'state.json').write_text(json.dumps(meta, indent=1))
+    old = directory.with_name(directory.name + '.old')
+    if directory.exists():
+        directory.rename(old)
+    tmp.rename(directory)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _load_meta(directory):
+    try:
+        meta = json.loads((directory / 'state.json').read_text())
+    except (OSError, ValueError):
+        return None
+    return meta if meta.get('version') == STATE_VERSION else None
+
+
+def _load_model(directory, name):
+    if name == 'lstm':
+        from tensorflow.keras.models import load_model
+
+        with open(directory / 'lstm.pkl', 'rb') as fh:
+            bundle = pickle.load(fh)
+        bundle['model'] = load_model(directory / 'lstm.keras')
+        return bundle
+    with open(directory / f'{name}.pkl', 'rb') as fh:
+        return pickle.load(fh)
+
+
+def _windows(scaled, length, ends):
+    # Inputs for predicting positions ``ends`` from the preceding ``length`` values
+    ends = np.asarray(ends)
+    index = ends[:, None] - length + np.arange(length)[None, :]
+    return scaled[index][..., None].astype(np.float32)
+
+
+def _lstm_one_step(bundle, values, ends):
+    """One-step LSTM predictions (original units) for positions ``ends``."""
+    scaler, length = bundle['scaler'], bundle['sequence_length']
+    scaled = scaler.transform(values.reshape(-1, 1)).ravel()
+    predicted = bundle['model'].predict(_windows(scaled, length, ends), verbose=0)
+    return scaler.inverse_transform(predicted.reshape(-1, 1)).ravel()
+
+
+def _lstm_forecast(bundle, values, steps):
+    scaler, length = bundle['scaler'], bundle['sequence_length']
+    window = scaler.transform(values[-length:].reshape(-1, 1)).astype(np.float32)[None]
+    out = []
+    for _ in range(steps):
+        step = bundle['model'].predict(window, verbose=0)
+        out.append(float(step[0, 0]))
+        window = np.concatenate([window[:, 1:], step.reshape(1, 1, 1)], axis=1)
+    return scaler.inverse_transform(np.array(out).reshape(-1, 1)).ravel()
+
+
+def _forecasts(models, values, steps):
+    out = {}
+    for name, fitted in models.items():
+        if name == 'lstm':
+            out[name] = _lstm_forecast(fitted, values, steps).tolist()
+        else:
+            out[name] = np.asarray(fitted.forecast(steps=steps), dtype=float).tolist()
+    return out
+
+
+def refit(name, series, cache=None, models=ONLINE_MODELS, root=DEFAULT_STATE_DIR,
+          steps=FORECAST_STEPS, reason='refit'):
+    """Fit ``models`` on ``series`` (via ``cache``) and save them as the online state."""
+    started = time.perf_counter()
+    values = np.asarray(series, dtype=float)
+    target = series.name
+    train_size, val_size = split_sizes(len(series))
+    fitted_models = {}
+    baseline = {}
+    with span('online.refit', asset=name, rows=len(series)):
+        for model in models:
+            fitted, _, _ = run_stage(model, series, train_size, val_size, cache=cache, target=target)
+            if model == 'lstm':
+                bundle = dict(fitted)
+                ends = np.arange(max(train_size, bundle['sequence_length']), len(values))
+                errors = values[ends] - _lstm_one_step(bundle, values, ends)
+                fitted_models[model] = bundle
+            else:
+                # Condition on everything after the training slice, same
+                # parameters; its residuals are the one-step errors there
+                fitted_models[model] = fitted.extend(values[train_size:])
+                errors = np.asarray(fitted_models[model].resid, dtype=float)
+            baseline[model] = float(np.mean(np.abs(errors)))
+
+    meta = {
+        'version': STATE_VERSION,
+        'name': name,
+        'target': str(target),
+        'rows': len(series),
+        'fingerprint': fingerprint(series),
+        'last_index': str(series.index[-1]),
+        'baseline_mae': baseline,
+        'recent_errors': {model: [] for model in models},
+        'refit_at': time.time(),
+        'refit_rows': len(series),
+        'updates': 0,
+        'rescale': None,
+    }
+    _save(state_dir(name, target, root), meta, fitted_models)
+    return UpdateReport(name, str(target), len(series), 0, 'refit', reason,
+                        forecasts=_forecasts(fitted_models, values, steps),
+                        seconds=time.perf_counter() - started)
+
+
+def update(name, series, cache=None, models=ONLINE_MODELS, root=DEFAULT_STATE_DIR,
+           threshold=DRIFT_THRESHOLD, rescale_tolerance=RESCALE_TOLERANCE,
+           scaler_policy='flag', finetune_epochs=FINETUNE_EPOCHS,
+           finetune_windows=FINETUNE_WINDOWS, steps=FORECAST_STEPS):
+    """Bring the saved state for ``name`` up to date with ``series``.
+
+    Returns an ``UpdateReport``; ``action`` says whether the state was
+    already current, updated incrementally, or refit (and why).
+    """
+    from .cache import ModelCache
+
+    started = time.perf_counter()
+    cache = cache or ModelCache()
+    directory = state_dir(name, series.name, root)
+    meta = _load_meta(directory)
+
+    def full(reason):
+        report = refit(name, series, cache, models, root, steps, reason)
+        report.new_rows = len(series) - (meta['rows'] if meta else 0)
+        report.seconds = time.perf_counter() - started
+        return report
+
+    if meta is None or sorted(meta['baseline_mae']) != sorted(models):
+        return full('no saved state for these models')
+    seen = meta['rows']
+    if len(series) < seen or fingerprint(series.iloc[:seen]) != meta['fingerprint']:
+        return full('history changed')
+
+    values = np.asarray(series, dtype=float)
+    new = values[seen:]
+    fitted_models = {model: _load_model(directory, model) for model in models}
+    if not len(new):
+        return UpdateReport(name, meta['target'], len(series), 0, 'current',
+                            forecasts=_forecasts(fitted_models, values, steps),
+                            seconds=time.perf_counter() - started)
+
+    rescale = None
+    with span('online.update', asset=name, new_rows=len(new)):
+        for model in models:
+            fitted = fitted_models[model]
+            if model == 'lstm':
+                # One-step errors with the network and scaler as they were
+                ends = np.arange(seen, len(values))
+                errors = new - _lstm_one_step(fitted, values, ends)
+                scaler = fitted['scaler']
+                low, high = float(scaler.data_min_[0]), float(scaler.data_max_[0])
+                span_ = (high - low) or 1.0
+                overshoot = max(0.0, (new.max() - high) / span_, (low - new.min()) / span_)
+                if overshoot > 0:
+                    expanded = scaler_policy == 'expand'
+                    if expanded:
+                        scaler.partial_fit(new.reshape(-1, 1))
+                    rescale = {'overshoot': float(overshoot), 'expanded': expanded,
+                               'bounds': [low, high]}
+                if finetune_epochs:
+                    with span('online.finetune', epochs=finetune_epochs):
+                        length = fitted['sequence_length']
+                        scaled = scaler.transform(values.reshape(-1, 1)).ravel()
+                        ends = np.arange(max(length, len(values) - finetune_windows), len(values))
+                        fitted['model'].fit(_windows(scaled, length, ends), scaled[ends],
+                                            epochs=finetune_epochs, batch_size=32, verbose=0)
+            else:
+                fitted = fitted_models[model] = fitted.extend(new)
+                errors = np.asarray(fitted.resid, dtype=float)
+            recent = (meta['recent_errors'].get(model, []) + np.abs(errors).tolist())[-DRIFT_WINDOW:]
+            meta['recent_errors'][model] = recent
+
+    drift = {}
+    for model in models:
+        recent = meta['recent_errors'][model]
+        baseline = meta['baseline_mae'][model]
+        if len(recent) >= MIN_DRIFT_POINTS and baseline > 0:
+            drift[model] = float(np.mean(recent) / baseline)
+    drifted = {model: ratio for model, ratio in drift.items() if ratio > threshold}
+    if drifted:
+        report = full(', '.join(f"{m} drift {r:.2f} > {threshold}" for m, r in drifted.items()))
+        report.drift, report.rescale = drift, rescale
+        return report
+    if rescale and rescale['overshoot'] > rescale_tolerance:
+        report = full(f"values {rescale['overshoot']:.1%} outside the LSTM scaler range")
+        report.drift, report.rescale = drift, rescale
+        return report
+
+    meta.update(rows=len(series), fingerprint=fingerprint(series),
+                last_index=str(series.index[-1]), updates=meta['updates'] + 1,
+                rescale=rescale or meta.get('rescale'))
+    _save(directory, meta, fitted_models)
+    return UpdateReport(name, meta['target'], len(series), len(new), 'updated', drift=drift,
+                        rescale=rescale, forecasts=_forecasts(fitted_models, values, steps),
+                        seconds=time.perf_counter() - started)
+
+
+def status(name, target, root=DEFAULT_STATE_DIR):
+    meta = _load_meta(state_dir(name, target, root))
+    if meta is None:
+        return None
+    return {k: meta[k] for k in ('rows', 'last_index', 'baseline_mae', 'updates', 'refit_rows',
+                                 'refit_at', 'rescale')}
+
+
+def simulate(name, days=20, models=ONLINE_MODELS, root=None, **options):
+    """Replay the last ``days`` rows of ``name`` one at a time; returns the reports."""
+    import tempfile
+
+    from .assets import load_series
+    from .cache import ModelCache
+
+    series = load_series(name)
+    cache = ModelCache()
+    with tempfile.TemporaryDirectory() as scratch:
+        root = root or scratch
+        reports = [refit(name, series.iloc[:-days], cache, models, root)]
+        for end in range(len(series) - days + 1, len(series) + 1):
+            reports.append(update(name, series.iloc[:end], cache, models, root, **options))
+    return reports
+
+
+def main(argv=None):
+    from .assets import load_series
+
+    parser = argparse.ArgumentParser(description="Incrementally update the saved online models.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command in ('update', 'status', 'simulate'):
+        cmd = sub.add_parser(command)
+        cmd.add_argument('assets', nargs='+')
+        cmd.add_argument('--models', default=','.join(ONLINE_MODELS))
+    for command in ('update', 'simulate'):
+        cmd = sub.choices[command]
+        cmd.add_argument('--threshold', type=float, default=DRIFT_THRESHOLD)
+        cmd.add_argument('--expand-scaler', action='store_true',
+                         help="widen the LSTM scaler bounds instead of only flagging")
+        cmd.add_argument('--finetune-epochs', type=int, default=FINETUNE_EPOCHS)
+    sub.choices['simulate'].add_argument('--days', type=int, default=20)
+    args = parser.parse_args(argv)
+    models = tuple(m.strip() for m in args.models.split(',') if m.strip())
+
+    for asset in args.assets:
+        if args.command == 'status':
+            print(asset, json.dumps(status(asset, load_series(asset).name), indent=1))
+            continue
+        options = dict(threshold=args.threshold, finetune_epochs=args.finetune_epochs,
+                       scaler_policy='expand' if args.expand_scaler else 'flag')
+        if args.command == 'update':
+            print(update(asset, load_series(asset), models=models, **options).summary())
+            continue
+        reports = simulate(asset, args.days, models, **options)
+        for report in reports:
+            print(report.summary())
+        daily = [r.seconds for r in reports[1:] if r.action == 'updated']
+        if daily:
+            print(f"\n{asset}: {len(daily)} incremental updates, median {np.median(daily):.2f}s, "
+                  f"{sum(r.action == 'refit' for r in reports[1:])} drift refit(s)")
+
+
+if __name__ == '__main__':
+    main()
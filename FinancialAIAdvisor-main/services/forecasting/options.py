@@ -0,0 +1,79 @@
+"""Opt-in features of the forecasting scripts, defined once.
+
+``Gold_Forecasting.py``, ``Stock_Price_Forecasting_Project.py`` and
+``Real_Estate_Forecasting.py`` read their flags from
+``PipelineOptions.from_env()``.  ``FORECAST_OPTIONS`` lists the fields to
+turn on, comma-separated; a ``no_`` prefix turns one off::
+
+    FORECAST_OPTIONS=search_orders,route_models python Gold_Forecasting.py
+    FORECAST_OPTIONS=incremental_update,no_store_results python Stock_Price_Forecasting_Project.py
+"""
+
+import os
+from dataclasses import dataclass, fields
+
+from .models import LSTM_FAST, PROPHET_WARM
+
+
+@dataclass
+class PipelineOptions:
+    """What a script run does besides fitting, scoring and charting the models.
+
+    ``search_orders``: choose the ARIMA/SARIMA orders by AIC on the training
+    slice (``order_search``) instead of the (1,1,1)(1,1,1,12) defaults.
+
+    ``fast_lstm_training``: train the LSTM through a streaming tf.data
+    pipeline with larger batches and early stopping (``LSTM_FAST``).
+
+    ``route_models``: fit only the models that have been winning on the
+    validation slice, plus periodic exploration of the others, and add a
+    validation-weighted ensemble (``routing``).
+
+    ``warm_prophet``: start Prophet from the previous run's parameters when
+    the data has only grown and skip its intervals (``PROPHET_WARM``);
+    ``yhat`` may move by up to ``prophet_warm.WARM_TOLERANCE`` of the level.
+
+    ``incremental_update``: feed only the rows appended since the last run
+    to the saved ARIMA/SARIMA/LSTM state, refitting only on drift
+    (``online``); Prophet and the model charts are skipped.
+
+    ``store_results``: record forecasts, intervals and metrics in the
+    results store (``results``) that the server and analytics read.
+
+    ``probabilistic_forecasts``: draw sample paths past the end of the data
+    from ARIMA, SARIMA and the LSTM and log (and store) their median and
+    90% band (``paths``).
+
+    The real-estate script has no dated series to update or extend, so it
+    ignores ``incremental_update`` and ``probabilistic_forecasts``.
+    """
+
+    search_orders: bool = False
+    fast_lstm_training: bool = False
+    route_models: bool = False
+    warm_prophet: bool = False
+    incremental_update: bool = False
+    store_results: bool = True
+    probabilistic_forecasts: bool = False
+
+    @classmethod
+    def from_env(cls, value=None):
+        """Options from ``value`` (default: ``FORECAST_OPTIONS``) over the defaults."""
+        value = os.environ.get('FORECAST_OPTIONS', '') if value is None else value
+        names = [field.name for field in fields(cls)]
+        flags = {}
+        for item in filter(None, (part.strip() for part in value.split(','))):
+            name, on = (item[3:], False) if item.startswith('no_') else (item, True)
+            if name not in names:
+                raise ValueError(f"Unknown option {item!r} in FORECAST_OPTIONS; "
+                                 f"expected one of {', '.join(names)}")
+            flags[name] = on
+        return cls(**flags)
+
+    def model_configs(self, configs=None):
+        """``configs`` plus the LSTM and Prophet modes these options select."""
+        if self.fast_lstm_training:
+            configs = dict(configs or {}, lstm=LSTM_FAST)
+        if self.warm_prophet:
+            configs = dict(configs or {}, prophet=PROPHET_WARM)
+        return configs
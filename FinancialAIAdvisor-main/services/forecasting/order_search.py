@@ -0,0 +1,321 @@
+"""Automatic (p,d,q)(P,D,Q,s) order selection for the ARIMA/SARIMA stages.
+
+Candidates are fitted in a worker pool and ranked by AIC or BIC.  A
+seasonal search also runs a non-seasonal one for the ``arima`` stage, since
+a ``(p,d,q)`` picked next to seasonal terms is not the best plain ARIMA;
+each search fits candidates with the class its stage fits (``ARIMA`` or
+``SARIMAX``).  The default stepwise search (after Hyndman & Khandakar) picks ``d``/``D`` with
+cheap differencing heuristics, starts from a handful of small models and
+only expands the neighbours of the current best, so most of the grid is
+never fitted.  ``search='grid'`` fits every candidate instead.
+
+Each fit runs under a time budget enforced from the optimizer callback, and
+non-converged fits are never selected.  Every candidate's criteria are
+memoized in the model cache, so later searches over overlapping grids only
+fit what is new, and the worker pool is only started when something is.
+
+Command line::
+
+    python -m forecasting.order_search --asset gold --seasonal-period 12
+"""
+
+import argparse
+import itertools
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .runner import DEFAULT_THREADS, DEFAULT_WORKERS, thread_caps
+
+FIT_TIMEOUT = 30.0
+MAX_ITER = 50
+
+# Stepwise moves over (p, q, P, Q): one term at a time, or p/q and P/Q together
+NEIGHBOUR_MOVES = [
+    (1, 0, 0, 0), (-1, 0, 0, 0), (0, 1, 0, 0), (0, -1, 0, 0),
+    (0, 0, 1, 0), (0, 0, -1, 0), (0, 0, 0, 1), (0, 0, 0, -1),
+    (1, 1, 0, 0), (-1, -1, 0, 0), (0, 0, 1, 1), (0, 0, -1, -1),
+]
+
+
+class FitTimeout(Exception):
+    pass
+
+
+@dataclass
+class SearchResult:
+    order: tuple
+    seasonal_order: tuple
+    criterion: str
+    table: pd.DataFrame  # every candidate considered, best first
+    fitted: int          # candidates fitted in this search (not memoized)
+    seconds: float
+    arima: 'SearchResult' = None  # the non-seasonal search behind a seasonal one
+
+    def configs(self):
+        """Stage overrides for ``runner.run_models(configs=...)``."""
+        arima = self.arima or self
+        return {
+            'arima': {'order': arima.order},
+            'sarima': {'order': self.order, 'seasonal_order': self.seasonal_order},
+        }
+
+
+def select_d(values, max_d=2):
+    """Smallest ``d`` whose differenced series passes a KPSS level-stationarity test."""
+    import warnings
+    from statsmodels.tsa.stattools import kpss
+
+    x = np.asarray(values, dtype=float)
+    for d in range(max_d + 1):
+        if len(x) < 10:
+            return d
+        try:
+            with warnings.catch_warnings():
+                # p-values outside the lookup table are clipped, which is fine here
+                warnings.simplefilter('ignore')
+                p_value = kpss(x, regression='c', nlags='auto')[1]
+        except (ValueError, OverflowError):
+            return d
+        if p_value >= 0.05:
+            return d
+        x = np.diff(x)
+    return max_d
+
+
+def select_seasonal_d(values, period, d=0):
+    """1 when seasonal differencing removes more variance than it adds, else 0."""
+    x = np.diff(np.asarray(values, dtype=float), n=d) if d else np.asarray(values, dtype=float)
+    if period < 2 or len(x) < 3 * period:
+        return 0
+    seasonal = x[period:] - x[:-period]
+    return int(np.var(seasonal) < 0.64 * np.var(x))
+
+
+def _fit_candidate(values, order, seasonal_order, timeout, maxiter, estimator='sarimax'):
+    """Fit one candidate in a worker and report its criteria."""
+    import warnings
+    from statsmodels.tsa.arima.model import ARIMA
+    from statsmodels.tsa.statespace.sarimax import SARIMAX
+
+    started = time.perf_counter()
+
+    def deadline(_params):
+        if time.perf_counter() - started > timeout:
+            raise FitTimeout()
+
+    row = {'aic': np.nan, 'bic': np.nan, 'converged': False, 'error': None}
+    try:
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore')
+            if estimator == 'arima':
+                # What arima_stage fits
+                fitted = ARIMA(values, order=order).fit(
+                    method_kwargs={'maxiter': maxiter, 'callback': deadline})
+            else:
+                fitted = SARIMAX(values, order=order, seasonal_order=seasonal_order).fit(
+                    disp=False, maxiter=maxiter, callback=deadline)
+        row.update(aic=float(fitted.aic), bic=float(fitted.bic),
+                   converged=bool(fitted.mle_retvals.get('converged', True)))
+    except FitTimeout:
+        row['error'] = 'timeout'
+    except Exception as e:
+        row['error'] = f"{type(e).__name__}: {e}"
+    row['seconds'] = time.perf_counter() - started
+    return row
+
+
+class _Evaluator:
+    """Fits candidates in a shared pool, consulting the memo first.
+
+    The pool is started on the first candidate the memo cannot answer.
+    """
+
+    def __init__(self, series, workers, cache, target, timeout, maxiter):
+        self.series = series
+        self.values = np.asarray(series, dtype=float)
+        self.workers = workers
+        self.pool = None
+        self.estimator = 'sarimax'
+        self.cache = cache
+        self.target = target
+        self.timeout = timeout
+        self.maxiter = maxiter
+        self.rows = {}
+        self.fitted = 0
+
+    def _key(self, order, seasonal_order):
+        config = {'order': order, 'seasonal_order': seasonal_order, 'estimator': self.estimator,
+                  'timeout': self.timeout, 'maxiter': self.maxiter}
+        return self.cache.key(self.series, self.target, (len(self.series),), 'order-search', config)
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def evaluate(self, candidates):
+        pending = {}
+        for order, seasonal_order in candidates:
+            if (order, seasonal_order) in self.rows:
+                continue
+            memo = None
+            if self.cache is not None:
+                memo = self.cache.load(self._key(order, seasonal_order))
+            if memo is not None:
+                self.rows[(order, seasonal_order)] = dict(memo[2], memoized=True)
+            else:
+                if self.pool is None:
+                    self.pool = ProcessPoolExecutor(
+                        max_workers=self.workers, mp_context=multiprocessing.get_context('spawn'))
+                pending[(order, seasonal_order)] = self.pool.submit(
+                    _fit_candidate, self.values, order, seasonal_order, self.timeout, self.maxiter,
+                    self.estimator)
+
+        for (order, seasonal_order), future in pending.items():
+            row = future.result()
+            self.fitted += 1
+            self.rows[(order, seasonal_order)] = dict(row, memoized=False)
+            if self.cache is not None:
+                self.cache.store(self._key(order, seasonal_order), None, None, row,
+                                 model='order-search', target=self.target)
+
+    def score(self, candidate, criterion):
+        row = self.rows.get(candidate)
+        if row is None or not row['converged'] or row['error']:
+            return np.inf
+        return row[criterion]
+
+
+def _clip(value, upper):
+    return 0 <= value <= upper
+
+
+def _search(evaluator, seasonal_period, criterion, search, max_p, max_q, max_P, max_Q, d, D,
+            started):
+    """One stepwise or grid search; candidates are fitted with ``evaluator.estimator``."""
+    s = seasonal_period or 0
+    seasonal = s > 1
+    max_P, max_Q = (max_P, max_Q) if seasonal else (0, 0)
+    evaluator.rows = {}
+    evaluator.fitted = 0
+
+    def candidate(p, q, P, Q):
+        return (p, d, q), ((P, D, Q, s) if seasonal else (0, 0, 0, 0))
+
+    if search == 'grid':
+        evaluator.evaluate([candidate(p, q, P, Q) for p, q, P, Q in itertools.product(
+            range(max_p + 1), range(max_q + 1), range(max_P + 1), range(max_Q + 1))])
+    else:
+        start = [(2, 2, 1, 1), (0, 0, 0, 0), (1, 0, 1, 0), (0, 1, 0, 1)]
+        start = [c for c in start if _clip(c[0], max_p) and _clip(c[1], max_q)
+                 and _clip(c[2], max_P) and _clip(c[3], max_Q)]
+        # Without seasonal terms several starting points collapse into one
+        start = list(dict.fromkeys(start))
+        evaluator.evaluate([candidate(*c) for c in start])
+        best = min(start, key=lambda c: evaluator.score(candidate(*c), criterion))
+        # Move to the best neighbour until no neighbour improves
+        while True:
+            neighbours = []
+            for move in NEIGHBOUR_MOVES:
+                c = tuple(b + m for b, m in zip(best, move))
+                if (_clip(c[0], max_p) and _clip(c[1], max_q)
+                        and _clip(c[2], max_P) and _clip(c[3], max_Q)):
+                    neighbours.append(c)
+            evaluator.evaluate([candidate(*c) for c in neighbours])
+            challenger = min(neighbours, key=lambda c: evaluator.score(candidate(*c), criterion),
+                             default=best)
+            if (evaluator.score(candidate(*challenger), criterion)
+                    >= evaluator.score(candidate(*best), criterion)):
+                break
+            best = challenger
+
+    rows = [dict(order=order, seasonal_order=seasonal_order, **row)
+            for (order, seasonal_order), row in evaluator.rows.items()]
+    table = pd.DataFrame(rows)
+    table['rank_score'] = [evaluator.score((o, so), criterion)
+                           for o, so in zip(table['order'], table['seasonal_order'])]
+    table = table.sort_values('rank_score').drop(columns='rank_score').reset_index(drop=True)
+    if not np.isfinite(evaluator.score((table['order'][0], table['seasonal_order'][0]), criterion)):
+        raise RuntimeError("No candidate order converged")
+    return SearchResult(tuple(table['order'][0]), tuple(table['seasonal_order'][0]), criterion,
+                        table, evaluator.fitted, time.perf_counter() - started)
+
+
+def search_order(series, seasonal_period=12, criterion='aic', search='stepwise', max_p=3, max_q=3,
+                 max_P=1, max_Q=1, d=None, D=None, max_workers=DEFAULT_WORKERS,
+                 threads_per_worker=DEFAULT_THREADS, cache=None, target=None,
+                 timeout=FIT_TIMEOUT, maxiter=MAX_ITER):
+    """Pick ARIMA/SARIMA orders for ``series`` (normally the training slice).
+
+    With a seasonal period the result's ``arima`` holds the separate
+    non-seasonal search that ``configs()`` gives the ``arima`` stage.
+    """
+    started = time.perf_counter()
+    values = np.asarray(series, dtype=float)
+    d = select_d(values) if d is None else d
+    s = seasonal_period or 0
+    D = (select_seasonal_d(values, s, d) if s else 0) if D is None else D
+
+    evaluator = _Evaluator(pd.Series(values), max_workers or os.cpu_count() or 1, cache,
+                           target or getattr(series, 'name', None), timeout, maxiter)
+    with thread_caps(threads_per_worker):
+        try:
+            options = dict(criterion=criterion, search=search, max_p=max_p, max_q=max_q,
+                           max_P=max_P, max_Q=max_Q, d=d)
+            arima = None
+            if s > 1:
+                evaluator.estimator = 'arima'
+                arima = _search(evaluator, 0, D=0, started=time.perf_counter(), **options)
+                evaluator.estimator = 'sarimax'
+            else:
+                evaluator.estimator = 'arima'
+            result = _search(evaluator, s, D=D, started=started, **options)
+        finally:
+            evaluator.close()
+    result.arima = arima
+    return result
+
+
+def main(argv=None):
+    from .assets import ASSETS, load_series
+    from .cache import ModelCache
+    from .models import split_sizes
+
+    parser = argparse.ArgumentParser(description="Search ARIMA/SARIMA orders by AIC/BIC.")
+    parser.add_argument('--asset', choices=sorted(ASSETS), default='gold')
+    parser.add_argument('--target')
+    parser.add_argument('--seasonal-period', type=int, default=12)
+    parser.add_argument('--criterion', choices=('aic', 'bic'), default='aic')
+    parser.add_argument('--search', choices=('stepwise', 'grid'), default='stepwise')
+    parser.add_argument('--max-p', type=int, default=3)
+    parser.add_argument('--max-q', type=int, default=3)
+    parser.add_argument('--timeout', type=float, default=FIT_TIMEOUT)
+    parser.add_argument('--workers', type=int)
+    args = parser.parse_args(argv)
+
+    series = load_series(args.asset, args.target)
+    train_size, _ = split_sizes(len(series))
+    result = search_order(series[:train_size], seasonal_period=args.seasonal_period,
+                          criterion=args.criterion, search=args.search, max_p=args.max_p,
+                          max_q=args.max_q, timeout=args.timeout, max_workers=args.workers,
+                          cache=ModelCache(), target=series.name)
+    with pd.option_context('display.width', 160, 'display.max_columns', None):
+        print(result.table.head(15))
+    print(f"\nBest by {result.criterion.upper()}: order={result.order} "
+          f"seasonal_order={result.seasonal_order} "
+          f"({result.fitted} fitted, {len(result.table) - result.fitted} memoized, "
+          f"{result.seconds:.1f}s)")
+    if result.arima is not None:
+        print(f"Best non-seasonal order for the ARIMA stage: {result.arima.order} "
+              f"({result.arima.fitted} fitted, {len(result.arima.table) - result.arima.fitted} "
+              f"memoized)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,267 @@
+"""Probabilistic forecasts: thousands of sample paths per model, drawn as one batch.
+
+Every stage gives a point forecast.  ``forecast_paths`` conditions each
+model on the whole series and draws ``n_paths`` future paths of ``steps``
+values from it:
+
+* ARIMA / SARIMA: simulation of the fitted state-space model from the
+  filtered state at the end of the data (what statsmodels'
+  ``simulate(..., repetitions=n, anchor='end')`` does).  ``simulate``
+  loops over the repetitions in Python; ``statespace_paths`` draws the
+  initial states and all shocks up front and advances every path with one
+  matmul per step.
+* LSTM: residual bootstrap.  The one-step errors of the model on the
+  validation and test slices (in scaled units) are resampled and added to
+  each step's prediction before it is fed back, all paths as one batch of
+  the NumPy forward pass (``NumpyLSTM.sample_paths``).  The model has no
+  dropout layers, so MC dropout does not apply.
+
+``quantile_bands`` turns the ``(paths, steps)`` arrays into quantiles per
+step in one ``np.quantile`` call.  Scripts record the median and 5-95% band
+in the results store (``forecasting/results.py``).
+
+Command line::
+
+    python -m forecasting.paths run gold --paths 2000 --steps 30
+    python -m forecasting.paths bench egx100 --paths 10000 --steps 30
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+
+from .models import split_sizes
+from .trace import span
+
+PATH_MODELS = ('arima', 'sarima', 'lstm')
+DEFAULT_PATHS = 2000
+DEFAULT_STEPS = 30
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+# Central band recorded as lower/upper in the results store
+COVERAGE = 0.9
+
+
+def _normal(cov, shape, rng):
+    """Draws of N(0, ``cov``) with leading ``shape``; ``cov`` may be singular."""
+    values, vectors = np.linalg.eigh(np.atleast_2d(cov))
+    factor = vectors * np.sqrt(values.clip(min=0))
+    return rng.standard_normal(tuple(shape) + (len(values),)) @ factor.T
+
+
+def statespace_paths(results, steps, n_paths, rng=None):
+    """``(n_paths, steps)`` draws after the data of a fitted statsmodels state-space model."""
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    fr = results.filter_results
+    if fr.k_endog != 1 or not fr.time_invariant:
+        raise ValueError("Batched simulation needs a univariate, time-invariant model; "
+                         "use simulate_paths")
+    design, obs_intercept, obs_cov = fr.design[..., 0], fr.obs_intercept[:, 0], fr.obs_cov[..., 0]
+    transition, state_intercept = fr.transition[..., 0], fr.state_intercept[:, 0]
+    selection, state_cov = fr.selection[..., 0], fr.state_cov[..., 0]
+    # The state one step past the data and its uncertainty
+    state = results.predicted_state[:, -1] + _normal(results.predicted_state_cov[:, :, -1],
+                                                     (n_paths,), rng)
+    measurement = _normal(obs_cov, (steps, n_paths), rng)[..., 0] + obs_intercept[0]
+    shocks = _normal(state_cov, (steps, n_paths), rng) @ selection.T + state_intercept
+    out = np.empty((n_paths, steps))
+    for t in range(steps):
+        out[:, t] = state @ design[0] + measurement[t]
+        state = state @ transition.T + shocks[t]
+    return out
+
+
+def simulate_paths(results, steps, n_paths, rng=None):
+    """The same draws through ``results.simulate`` (one Python iteration per path)."""
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    simulated = results.simulate(steps, repetitions=n_paths, anchor='end', rng=rng)
+    return np.asarray(simulated, dtype=float).reshape(steps, n_paths).T
+
+
+def lstm_residuals(bundle, values, start):
+    """One-step errors (scaled units) of ``bundle`` for positions ``start`` onwards."""
+    length = bundle.sequence_length
+    scaled = bundle.scaler.transform(np.asarray(values, dtype=float).reshape(-1, 1)).ravel()
+    ends = np.arange(max(start, length), len(scaled))
+    windows = scaled[ends[:, None] - length + np.arange(length)[None, :]]
+    return scaled[ends] - bundle.model.predict(windows)[:, 0]
+
+
+def lstm_paths(bundle, values, residuals, steps, n_paths, rng=None, share_prefix=True):
+    """``(n_paths, steps)`` rollouts after ``values`` with bootstrapped ``residuals``."""
+    rng = rng if isinstance(rng, np.random.Generator) else np.random.default_rng(rng)
+    length = bundle.sequence_length
+    window = bundle.scaler.transform(np.asarray(values, dtype=float)[-length:].reshape(-1, 1))
+    noise = rng.choice(np.asarray(residuals, dtype=np.float32), size=(n_paths, steps))
+    scaled = bundle.model.sample_paths(window.ravel(), noise, share_prefix=share_prefix)
+    return bundle.scaler.inverse_transform(scaled.reshape(-1, 1)).reshape(n_paths, steps)
+
+
+def quantile_bands(paths, quantiles=QUANTILES):
+    """``(len(quantiles), steps)`` quantiles of ``paths`` at every step."""
+    return np.quantile(paths, quantiles, axis=0)
+
+
+@dataclass
+class PathForecast:
+    model: str
+    paths: np.ndarray           # (n_paths, steps), original units
+    quantiles: tuple
+    bands: np.ndarray           # (len(quantiles), steps)
+    seconds: float = 0.0
+
+    @property
+    def median(self):
+        return np.quantile(self.paths, 0.5, axis=0)
+
+    def interval(self, coverage=COVERAGE):
+        """``(lower, upper)`` of the central ``coverage`` band at every step."""
+        tail = (1 - coverage) / 2
+        lower, upper = np.quantile(self.paths, (tail, 1 - tail), axis=0)
+        return lower, upper
+
+    def summary(self):
+        lower, upper = self.interval()
+        return (f"{self.model}: {len(self.paths):,} paths in {self.seconds:.2f}s; "
+                f"step {self.paths.shape[1]} median {self.median[-1]:,.2f}, "
+                f"{COVERAGE:.0%} band {lower[-1]:,.2f} to {upper[-1]:,.2f}")
+
+
+def conditioned_models(series, models=PATH_MODELS, cache=None, train_size=None, val_size=None,
+                       configs=None):
+    """The stages' fits (``configs`` as in ``run_models``), conditioned on the whole series.
+
+    Returns ``({name: model}, {name: lstm residuals})``; the LSTM comes back
+    as an ``lstm_numpy.LSTMBundle``.
+    """
+    from .lstm_numpy import to_numpy
+    from .models import run_stage
+
+    if train_size is None:
+        train_size, val_size = split_sizes(len(series))
+    values = np.asarray(series, dtype=float)
+    fitted, residuals = {}, {}
+    for name in models:
+        model, _, _ = run_stage(name, series, train_size, val_size, cache=cache,
+                                target=series.name, **(configs or {}).get(name, {}))
+        if name == 'lstm':
+            fitted[name] = to_numpy(model)
+            residuals[name] = lstm_residuals(fitted[name], values, train_size)
+        else:
+            # Fitted on the training slice; condition on the rest as well
+            fitted[name] = model.extend(values[train_size:])
+    return fitted, residuals
+
+
+def forecast_paths(series, models=PATH_MODELS, steps=DEFAULT_STEPS, n_paths=DEFAULT_PATHS,
+                   quantiles=QUANTILES, cache=None, seed=None, train_size=None, val_size=None,
+                   configs=None):
+    """``{model: PathForecast}`` of ``n_paths`` paths ``steps`` past the end of ``series``."""
+    rng = np.random.default_rng(seed)
+    values = np.asarray(series, dtype=float)
+    fitted, residuals = conditioned_models(series, models, cache, train_size, val_size, configs)
+    out = {}
+    for name, model in fitted.items():
+        with span('paths', model=name, paths=n_paths, steps=steps):
+            started = time.perf_counter()
+            if name == 'lstm':
+                paths = lstm_paths(model, values, residuals[name], steps, n_paths, rng)
+            else:
+                paths = statespace_paths(model, steps, n_paths, rng)
+            bands = quantile_bands(paths, quantiles)
+            out[name] = PathForecast(name, paths, tuple(quantiles), bands,
+                                     time.perf_counter() - started)
+    return out
+
+
+def store_paths(asset, series, forecasts, coverage=COVERAGE, source='paths', store=None):
+    """Record the medians and central ``coverage`` bands in the results store."""
+    from .results import ResultStore
+
+    store = store or ResultStore()
+    intervals = {name: f.interval(coverage) for name, f in forecasts.items()}
+    return store.record_forecasts(asset, series, {name: f.median for name, f in forecasts.items()},
+                                  intervals=intervals, source=source)
+
+
+def _best(fn, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), result
+
+
+def _bench(asset, n_paths=10000, steps=DEFAULT_STEPS, repeat=3, seed=0):
+    from .assets import load_series
+    from .cache import ModelCache
+
+    series = load_series(asset)
+    values = np.asarray(series, dtype=float)
+    fitted, residuals = conditioned_models(series, cache=ModelCache())
+    rows = {}
+    for name in ('arima', 'sarima'):
+        batched, paths = _best(lambda: statespace_paths(fitted[name], steps, n_paths, seed),
+                               repeat)
+        looped, reference = _best(lambda: simulate_paths(fitted[name], steps, n_paths, seed), 1)
+        scale = np.abs(quantile_bands(reference)).max()
+        rows[name] = {'batched': batched, 'reference': looped, 'reference method': 'simulate()',
+                      'max band difference': np.abs(quantile_bands(paths)
+                                                    - quantile_bands(reference)).max() / scale}
+    lstm = fitted['lstm']
+    batched, paths = _best(lambda: lstm_paths(lstm, values, residuals['lstm'], steps, n_paths,
+                                              seed), 1)
+    full, reference = _best(lambda: lstm_paths(lstm, values, residuals['lstm'], steps, n_paths,
+                                               seed, share_prefix=False), 1)
+    rows['lstm'] = {'batched': batched, 'reference': full,
+                    'reference method': 'full windows',
+                    'max band difference': np.abs(paths - reference).max()
+                    / np.abs(reference).max()}
+    quantile_seconds, _ = _best(lambda: quantile_bands(paths), repeat)
+    return rows, quantile_seconds
+
+
+def main(argv=None):
+    import pandas as pd
+
+    from .assets import ASSETS, load_series
+    from .cache import ModelCache
+
+    parser = argparse.ArgumentParser(description="Sample forecast paths and quantile bands.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command in ('run', 'bench'):
+        cmd = sub.add_parser(command)
+        cmd.add_argument('asset', choices=sorted(ASSETS))
+        cmd.add_argument('--paths', type=int,
+                         default=DEFAULT_PATHS if command == 'run' else 10000)
+        cmd.add_argument('--steps', type=int, default=DEFAULT_STEPS)
+        cmd.add_argument('--seed', type=int, default=0)
+    run_cmd = sub.choices['run']
+    run_cmd.add_argument('--models', default=','.join(PATH_MODELS))
+    run_cmd.add_argument('--store', action='store_true',
+                         help="record medians and 90%% bands in the results store")
+    args = parser.parse_args(argv)
+
+    if args.command == 'bench':
+        rows, quantile_seconds = _bench(args.asset, args.paths, args.steps, seed=args.seed)
+        print(f"{args.asset}: {args.paths:,} paths x {args.steps} steps")
+        print(pd.DataFrame(rows).T.to_string(float_format=lambda v: f"{v:,.4g}"))
+        print(f"quantile_bands({len(QUANTILES)} quantiles): {quantile_seconds * 1000:.2f}ms")
+        return
+
+    series = load_series(args.asset)
+    forecasts = forecast_paths(series, [m for m in args.models.split(',') if m], args.steps,
+                               args.paths, cache=ModelCache(), seed=args.seed)
+    for forecast in forecasts.values():
+        print(forecast.summary())
+        print(pd.DataFrame(forecast.bands.T, columns=[f"q{q:g}" for q in forecast.quantiles],
+                           index=pd.RangeIndex(1, args.steps + 1, name='step'))
+              .iloc[[0, args.steps // 2, args.steps - 1]].to_string(float_format=lambda v: f"{v:,.2f}"))
+    if args.store:
+        print(f"stored as run {store_paths(args.asset, series, forecasts)}")
+
+
+if __name__ == '__main__':
+    main()
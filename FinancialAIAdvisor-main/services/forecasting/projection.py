@@ -0,0 +1,254 @@
+"""Monte-Carlo projection of monthly investments into gold and the EGX100.
+
+Monthly returns for each asset come from its fitted ARIMA stage (the same
+model ``Gold_Forecasting.py`` and ``Stock_Price_Forecasting_Project.py``
+fit, reused from the model cache):
+
+* the shocks are the model's one-step residuals over the whole series,
+  expressed as log returns and summed over one month of observations;
+* a mix of assets bootstraps whole calendar months jointly: the residuals
+  are summed per calendar month, aligned on the month labels, and one
+  drawn month supplies every asset's shock, so the assets keep their
+  co-movement.  With fewer than ``MIN_JOINT_MONTHS`` months in common (the
+  bundled gold and EGX100 files do not overlap at all) each asset draws
+  its own overlapping monthly blocks independently, and the projection
+  says so (``joint_months == 0``);
+* the drift is the monthly log return implied by the model's own forecast
+  from the end of the data (``drift='history'`` uses the historical mean
+  instead).
+
+Paths are simulated in chunks with a seeded generator.  Each chunk's
+wealth is binned into a fixed per-month histogram of log(wealth / amount
+invested so far), so memory depends on the chunk size and horizon, never
+on the number of paths.  Percentile bands are read from the merged
+histograms (to within ``1 / BINS_PER_UNIT`` in log terms) and the mean is
+exact.
+
+Command line::
+
+    python -m forecasting.projection --monthly 4500 --years 10 --weights gold=0.5,egx100=0.5
+"""
+
+import argparse
+import time
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from .assets import load_series
+from .models import run_stage, split_sizes
+
+PERCENTILES = (5, 25, 50, 75, 95)
+PATHS = 20_000
+# Histogram of log(wealth / invested): range and resolution
+LOG_RANGE = (-6.0, 6.0)
+BINS_PER_UNIT = 512
+# Upper bound on simulated values held at once (paths x months per chunk)
+CHUNK_ELEMENTS = 2_000_000
+# Calendar months all assets must share before they are drawn jointly
+MIN_JOINT_MONTHS = 24
+DEFAULT_WEIGHTS = {'gold': 0.5, 'egx100': 0.5}
+
+
+@dataclass
+class ReturnModel:
+    asset: str
+    shocks: np.ndarray   # bootstrappable monthly log-return shocks
+    drift: float         # monthly log-return drift
+    steps_per_month: float
+    calendar: pd.Series = None  # shocks per calendar month (Period index); None if undated
+
+    def describe(self):
+        return (f"{self.asset}: drift {np.expm1(self.drift) * 100:+.2f}%/month, "
+                f"shock sd {self.shocks.std() * 100:.2f}%/month from {len(self.shocks)} blocks")
+
+
+def _steps_per_month(index):
+    if isinstance(index, pd.DatetimeIndex) and len(index) > 1:
+        months = (index[-1] - index[0]).days / 30.4375
+        return len(index) / max(months, 1.0)
+    return 21.0
+
+
+def return_model(asset, cache=None, drift='forecast'):
+    """Monthly return distribution for ``asset`` from its ARIMA stage."""
+    series = load_series(asset)
+    values = series.to_numpy(dtype=float)
+    train_size, val_size = split_sizes(len(series))
+    fitted, _, _ = run_stage('arima', series, train_size, val_size, cache=cache,
+                             target=series.name)
+    # Same parameters, filtered over the full series (no re-estimation)
+    full = fitted.apply(values)
+    steps = _steps_per_month(series.index)
+    block = max(1, int(round(steps)))
+
+    # One-step residuals as log returns relative to the previous price; the
+    # first residuals only reflect the filter's diffuse start
+    burn = max(1, sum(full.model.order[1:2]) + 1)
+    relative = np.asarray(full.resid)[burn:] / values[burn - 1:-1]
+    daily = np.log1p(np.clip(relative, -0.99, None))
+    monthly = np.convolve(daily, np.ones(block), mode='valid')
+    shocks = monthly - monthly.mean()
+    calendar = None
+    if isinstance(series.index, pd.DatetimeIndex):
+        by_month = pd.Series(daily, index=series.index[burn:].to_period('M'))
+        grouped = by_month.groupby(level=0)
+        # Partial months at either end would understate the shock
+        calendar = grouped.sum()[grouped.size() >= steps / 2]
+        calendar = calendar - calendar.mean()
+
+    if drift == 'forecast':
+        horizon = block * 12
+        path = np.asarray(full.forecast(steps=horizon))
+        mu = np.log(path[-1] / values[-1]) / 12
+    elif drift == 'history':
+        mu = np.log(values[-1] / values[0]) / (len(values) / steps)
+    else:
+        mu = float(drift)
+    return ReturnModel(asset, shocks.astype(np.float64), float(mu), steps, calendar)
+
+
+def joint_shocks(models, min_months=MIN_JOINT_MONTHS):
+    """``(months, len(models))`` calendar-month shocks all models share, or None.
+
+    None when fewer than ``min_months`` months are common to every model.
+    """
+    if any(model.calendar is None for model in models):
+        return None
+    aligned = pd.concat([model.calendar for model in models], axis=1, join='inner')
+    if len(aligned) < min_months:
+        return None
+    return aligned.to_numpy(dtype=np.float64)
+
+
+@dataclass
+class Projection:
+    months: np.ndarray
+    invested: np.ndarray      # cumulative contributions
+    mean: np.ndarray
+    bands: dict               # percentile -> wealth per month
+    paths: int
+    seconds: float
+    joint_months: int = 0     # calendar months drawn jointly; 0 = independent draws
+
+    def table(self):
+        frame = pd.DataFrame({'month': self.months, 'invested': self.invested, 'mean': self.mean})
+        for q, values in self.bands.items():
+            frame[f'p{q}'] = values
+        return frame
+
+
+def _histogram_percentiles(counts, edges, percentiles):
+    # counts: (months, bins); linear interpolation inside the bin
+    cumulative = np.cumsum(counts, axis=1)
+    total = cumulative[:, -1:]
+    out = {}
+    for q in percentiles:
+        target = total * q / 100
+        idx = np.argmax(cumulative >= target, axis=1)
+        before = np.where(idx > 0, np.take_along_axis(cumulative, (idx - 1)[:, None], 1)[:, 0], 0)
+        inside = np.take_along_axis(counts, idx[:, None], 1)[:, 0]
+        fraction = np.where(inside > 0, (target[:, 0] - before) / np.maximum(inside, 1), 0.5)
+        out[q] = edges[idx] + fraction * (edges[1] - edges[0])
+    return out
+
+
+def project(contributions, models, weights=None, paths=PATHS, seed=0, percentiles=PERCENTILES,
+            chunk_elements=CHUNK_ELEMENTS, initial=0.0):
+    """Simulate monthly investing into a fixed-weight mix of ``models``.
+
+    ``contributions`` is one amount per month (a scalar is broadcast by
+    passing ``np.full(months, amount)``).  Each month the contribution is
+    added and the portfolio grows by the weighted mix of the assets'
+    simple returns, i.e. it is rebalanced monthly.  Several models share
+    one drawn calendar month per path-month (see ``joint_shocks``).
+    """
+    contributions = np.asarray(contributions, dtype=np.float64)
+    months = len(contributions)
+    weights = np.asarray(weights if weights is not None else [1 / len(models)] * len(models),
+                         dtype=np.float64)
+    weights = weights / weights.sum()
+    invested = initial + np.cumsum(contributions)
+
+    rng = np.random.default_rng(seed)
+    low, high = LOG_RANGE
+    n_bins = int((high - low) * BINS_PER_UNIT)
+    edges = np.linspace(low, high, n_bins + 1)
+    counts = np.zeros((months, n_bins), dtype=np.int64)
+    total = np.zeros(months)
+    chunk = max(1, min(paths, chunk_elements // max(months, 1)))
+    joint = joint_shocks(models) if len(models) > 1 else None
+    started = time.perf_counter()
+
+    done = 0
+    while done < paths:
+        size = min(chunk, paths - done)
+        growth = np.zeros((size, months))
+        if joint is not None:
+            picks = rng.integers(0, len(joint), size=(size, months))
+        for i, (model, weight) in enumerate(zip(models, weights)):
+            if joint is not None:
+                draws = joint[picks, i]
+            else:
+                draws = model.shocks[rng.integers(0, len(model.shocks), size=(size, months))]
+            growth += weight * np.expm1(draws + model.drift)
+        np.log1p(growth, out=growth)  # portfolio log return per month
+
+        wealth = np.empty((size, months))
+        current = np.full(size, float(initial))
+        for m in range(months):
+            current = (current + contributions[m]) * np.exp(growth[:, m])
+            wealth[:, m] = current
+
+        total += wealth.sum(axis=0)
+        ratio = np.log(np.maximum(wealth, 1e-12) / invested)
+        bins = np.clip(((ratio - low) * BINS_PER_UNIT).astype(np.int64), 0, n_bins - 1)
+        bins += np.arange(months) * n_bins
+        counts += np.bincount(bins.ravel(), minlength=months * n_bins).reshape(months, n_bins)
+        done += size
+
+    ratios = _histogram_percentiles(counts, edges, percentiles)
+    bands = {q: invested * np.exp(r) for q, r in ratios.items()}
+    return Projection(np.arange(1, months + 1), invested, total / paths, bands, paths,
+                      time.perf_counter() - started, 0 if joint is None else len(joint))
+
+
+def project_assets(monthly, years, weights, paths=PATHS, seed=0, cache=None, drift='forecast'):
+    """Convenience wrapper: ``weights`` maps asset name to portfolio weight."""
+    models = [return_model(asset, cache=cache, drift=drift) for asset in weights]
+    contributions = np.full(int(years * 12), float(monthly))
+    return project(contributions, models, list(weights.values()), paths=paths, seed=seed), models
+
+
+def main(argv=None):
+    from .cache import ModelCache
+
+    parser = argparse.ArgumentParser(description="Project monthly investments with Monte-Carlo paths.")
+    parser.add_argument('--monthly', type=float, required=True, help="amount invested each month")
+    parser.add_argument('--years', type=float, default=10)
+    parser.add_argument('--weights', default=','.join(f'{k}={v}' for k, v in DEFAULT_WEIGHTS.items()))
+    parser.add_argument('--paths', type=int, default=PATHS)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--drift', default='forecast', help="forecast, history or a monthly log return")
+    parser.add_argument('--out', help="write the monthly bands to this CSV")
+    args = parser.parse_args(argv)
+
+    weights = {name: float(w) for name, w in (item.split('=') for item in args.weights.split(','))}
+    projection, models = project_assets(args.monthly, args.years, weights, paths=args.paths,
+                                        seed=args.seed, cache=ModelCache(), drift=args.drift)
+    for model in models:
+        print(model.describe())
+    table = projection.table()
+    if args.out:
+        table.to_csv(args.out, index=False)
+    yearly = table[table['month'] % 12 == 0]
+    if len(models) > 1:
+        print(f"Calendar months drawn jointly: {projection.joint_months}" if projection.joint_months
+              else "The assets share too few calendar months; their shocks are drawn independently")
+    print(f"\n{projection.paths:,} paths in {projection.seconds:.2f}s")
+    print(yearly.to_string(index=False, float_format=lambda v: f"{v:,.0f}"))
+
+
+if __name__ == '__main__':
+    main()
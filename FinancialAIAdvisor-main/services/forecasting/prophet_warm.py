@@ -0,0 +1,251 @@
+"""Warm-started Prophet fits with cached seasonality features.
+
+``fit_prophet`` fits a ``CachedProphet`` (a ``Prophet`` whose Fourier
+seasonality features come from ``FOURIER``) and remembers the fitted
+parameters per target and settings under ``FORECAST_PROPHET_DIR`` (default
+``services/.prophet``).  When the next series starts with the one fitted
+last time, those parameters are the optimizer's starting point instead of
+Prophet's cold initialization.  Parameters whose shape no longer fits (for
+instance fewer changepoints on a short history) fall back to Prophet's
+defaults inside Prophet itself.
+
+Warm starts are opt-in (``warm_start=True``).  Prophet's MAP objective is
+very flat along the changepoint deltas, so L-BFGS stops at a slightly
+different point from a different start.  Tighter L-BFGS tolerances and
+warm-starting only ``k``/``m``/``sigma_obs``/``beta`` (``delta`` left at
+zero) were both tried and moved ``yhat`` as much or more, so a warm refit
+after one new row takes about half the time and its ``yhat`` differs from
+a cold fit's by up to ``WARM_TOLERANCE`` of the series level (0.2% on
+gold, 1% on the EGX100).  ``bench`` fails when either bound is exceeded.
+Cold fits, with or without ``fast``, give the cold ``yhat``.
+
+The Fourier features of a date depend only on the date, the period and the
+order, so ``FourierCache`` computes them once per date and serves the fit,
+the prediction over history plus future, and later refits in the same
+process from one table.
+
+``fast=True`` sets ``uncertainty_samples=0``: MAP fit, ``yhat`` only, no
+simulated intervals (the largest part of ``predict`` on long histories).
+
+Command line::
+
+    python -m forecasting.prophet_warm bench gold --new-rows 1
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cache import fingerprint
+from .datastore import SERVICES_DIR
+from .trace import span
+
+DEFAULT_WARM_DIR = Path(os.environ.get('FORECAST_PROPHET_DIR', SERVICES_DIR / '.prophet'))
+WARM_VERSION = 1
+# Largest |yhat - cold yhat| ``bench`` accepts, as a fraction of the mean
+# absolute level of the series: warm starts, and everything else
+WARM_TOLERANCE = 0.02
+EXACT_TOLERANCE = 1e-6
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class FourierCache:
+    """Fourier seasonality features per (period, order), computed once per date."""
+
+    def __init__(self):
+        self._tables = {}   # (period, order) -> (sorted days since epoch, features)
+        self.hits = 0
+        self.misses = 0
+
+    def clear(self):
+        self._tables.clear()
+
+    def features(self, dates, period, series_order):
+        # Same time axis and formula as Prophet.fourier_series
+        if not (series_order >= 1):
+            raise ValueError("series_order must be >= 1")
+        epoch = pd.Timestamp("1970-01-01", tz=dates.dt.tz)
+        t = ((dates - epoch).dt.total_seconds() / SECONDS_PER_DAY).to_numpy(dtype=float)
+        key = (float(period), int(series_order))
+        known, table = self._tables.get(key, (np.empty(0), np.empty((0, 2 * series_order))))
+        position = np.searchsorted(known, t).clip(max=max(len(known) - 1, 0))
+        found = (known[position] == t) if len(known) else np.zeros(len(t), dtype=bool)
+        if not found.all():
+            missing = np.unique(t[~found])
+            x = 2 * np.pi * missing[:, None] * (np.arange(1, series_order + 1) / period)[None, :]
+            computed = np.empty((len(missing), 2 * series_order))
+            computed[:, 0::2] = np.sin(x)
+            computed[:, 1::2] = np.cos(x)
+            order = np.argsort(np.concatenate([known, missing]), kind='stable')
+            known = np.concatenate([known, missing])[order]
+            table = np.concatenate([table, computed])[order]
+            self._tables[key] = (known, table)
+            position = np.searchsorted(known, t)
+            self.misses += len(missing)
+        self.hits += int(found.sum())
+        return table[position]
+
+
+FOURIER = FourierCache()
+
+
+def _prophet_class():
+    # Built on first use so importing this module does not import Prophet;
+    # stored as a module global so fitted models pickle (runner workers)
+    cls = globals().get('CachedProphet')
+    if cls is None:
+        from prophet import Prophet
+
+        class CachedProphet(Prophet):
+            """``Prophet`` drawing its seasonality features from ``FOURIER``."""
+
+            @staticmethod
+            def fourier_series(dates, period, series_order):
+                return FOURIER.features(dates, period, series_order)
+
+        CachedProphet.__qualname__ = 'CachedProphet'
+        cls = globals()['CachedProphet'] = CachedProphet
+    return cls
+
+
+def __getattr__(name):
+    if name == 'CachedProphet':
+        return _prophet_class()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def warm_start_params(model):
+    """A fitted (MAP) model's parameters in the form ``Prophet.fit(init=...)`` takes."""
+    params = {name: float(model.params[name][0][0]) for name in ('k', 'm', 'sigma_obs')}
+    params.update({name: np.asarray(model.params[name][0]) for name in ('delta', 'beta')})
+    return params
+
+
+def _state_path(name, settings, root):
+    blob = json.dumps([str(name), settings], sort_keys=True, default=str)
+    return Path(root) / f"{hashlib.sha1(blob.encode()).hexdigest()[:16]}.json"
+
+
+def _load_state(path, history):
+    """Stored parameters if ``history`` starts with the series they were fitted on."""
+    try:
+        state = json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+    rows = state.get('rows', 0)
+    if state.get('version') != WARM_VERSION or not 0 < rows <= len(history):
+        return None
+    if fingerprint(history.iloc[:rows]) != state['fingerprint']:
+        return None
+    params = state['params']
+    return {name: np.asarray(value) if name in ('delta', 'beta') else value
+            for name, value in params.items()}
+
+
+def _save_state(path, history, model):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    params = {name: value.tolist() if isinstance(value, np.ndarray) else value
+              for name, value in warm_start_params(model).items()}
+    state = {'version': WARM_VERSION, 'rows': len(history),
+             'fingerprint': fingerprint(history), 'params': params}
+    tmp = path.with_suffix('.tmp')
+    tmp.write_text(json.dumps(state))
+    tmp.replace(path)
+
+
+def fit_prophet(frame, name=None, warm_start=False, fast=False, root=DEFAULT_WARM_DIR, **settings):
+    """Fit Prophet on ``frame`` (``ds``/``y``); returns ``(model, warm)``.
+
+    ``settings`` go to the ``Prophet`` constructor.  With ``warm_start``
+    the parameters are remembered per ``name`` (the target) and
+    ``settings``, and ``warm`` says whether the previous fit's were used as
+    the starting point.
+    """
+    if fast:
+        settings = dict(settings, uncertainty_samples=0)
+    model = _prophet_class()(**settings)
+    history = frame[['ds', 'y']].reset_index(drop=True)
+    # Interval sampling happens after the fit and does not change it
+    path = _state_path(name, {k: v for k, v in settings.items() if k != 'uncertainty_samples'},
+                       root)
+    init = _load_state(path, history) if warm_start else None
+    with span('prophet.fit', warm=init is not None, rows=len(frame)):
+        if init is not None:
+            model.fit(frame, init=init)
+        else:
+            model.fit(frame)
+    if warm_start and model.mcmc_samples == 0:
+        _save_state(path, history, model)
+    return model, init is not None
+
+
+def _bench(asset, new_rows=1):
+    import logging
+    import tempfile
+
+    from .assets import load_series
+    from .models import prophet_frame
+
+    logging.getLogger('cmdstanpy').setLevel(logging.WARNING)
+    series = load_series(asset)
+    rows = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        def run(series_, label, **options):
+            frame = prophet_frame(series_)
+            started = time.perf_counter()
+            model, warm = fit_prophet(frame, asset, root=scratch, yearly_seasonality=True, **options)
+            fitted = time.perf_counter() - started
+            forecast = model.predict(model.make_future_dataframe(periods=30))
+            rows[label] = {'warm': warm, 'fit': fitted,
+                           'fit+predict': time.perf_counter() - started,
+                           'yhat': forecast['yhat'].to_numpy()}
+
+        from prophet import Prophet
+
+        started = time.perf_counter()
+        frame = prophet_frame(series)
+        model = Prophet(yearly_seasonality=True).fit(frame)
+        fitted = time.perf_counter() - started
+        forecast = model.predict(model.make_future_dataframe(periods=30))
+        rows['plain prophet'] = {'warm': False, 'fit': fitted,
+                                 'fit+predict': time.perf_counter() - started,
+                                 'yhat': forecast['yhat'].to_numpy()}
+        run(series.iloc[:-new_rows], 'previous run', warm_start=True)
+        FOURIER.clear()
+        run(series, 'cold', warm_start=False)
+        run(series, 'cold, fast', warm_start=False, fast=True)
+        run(series, 'warm', warm_start=True)
+        run(series, 'warm, fast', warm_start=True, fast=True)
+    reference = rows['cold']['yhat']
+    level = float(np.abs(series).mean())
+    table = pd.DataFrame({label: {'warm': r['warm'], 'fit': r['fit'], 'fit+predict': r['fit+predict'],
+                                  'max |yhat - cold|': (np.abs(r['yhat'] - reference).max()
+                                                      if len(r['yhat']) == len(reference) else np.nan),
+                                  'bound': (WARM_TOLERANCE if r['warm'] else EXACT_TOLERANCE) * level}
+                          for label, r in rows.items()}).T
+    return table
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm-started Prophet fits.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    bench = sub.add_parser('bench', help="cold vs warm refits after new rows arrive")
+    bench.add_argument('asset')
+    bench.add_argument('--new-rows', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    table = _bench(args.asset, args.new_rows)
+    print(table.to_string(float_format=lambda v: f"{v:,.4f}"))
+    over = table[table['max |yhat - cold|'] > table['bound']]
+    if len(over):
+        raise SystemExit(f"yhat moved past its bound for: {', '.join(over.index)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,282 @@
+"""Daily / weekly / monthly aggregates of the dated price series.
+
+A pyramid holds, for each resolution, one row per calendar bin with the
+bin's open, high, low, close, sum and count (``mean`` is ``sum / count``).
+Days are built from the raw rows (gold has several rows for some dates),
+weeks (Sunday to Saturday, the EGX trading week plus the weekend) and
+months from the days.  Every column is a ``.npy`` file, memory-mapped on
+read, under ``FORECAST_PYRAMID_DIR`` (default ``services/.pyramids``).
+
+``sync`` keeps a pyramid in step with its source series: when rows were
+only appended, just those rows are aggregated and merged into the last
+(possibly partial) bin of each level; any other change rebuilds it.
+
+Stages get coarser data through ``assets.load_series(..., resolution='W')``
+(with ``seasonal_order_for`` matching SARIMA's period to it); charts get at
+most ``max_points`` bins of any date range from ``Pyramid.window``, which
+picks the finest level that fits and reads only those bins.
+
+Command line::
+
+    python -m forecasting.pyramid sync gold egx100
+    python -m forecasting.pyramid show egx100 --resolution M
+    python -m forecasting.pyramid bench egx100
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cache import fingerprint
+from .datastore import SERVICES_DIR
+from .trace import span
+
+DEFAULT_PYRAMID_DIR = Path(os.environ.get('FORECAST_PYRAMID_DIR', SERVICES_DIR / '.pyramids'))
+PYRAMID_VERSION = 1
+RESOLUTIONS = ('D', 'W', 'M')
+FIELDS = ('open', 'high', 'low', 'close', 'sum', 'count')
+HOW = FIELDS[:4] + ('mean',)
+# Yearly seasonality at each resolution, for SARIMA's seasonal period
+SEASONAL_PERIODS = {'W': 52, 'M': 12}
+
+
+def bin_starts(index, resolution):
+    """Start of the ``resolution`` bin holding each timestamp of ``index``."""
+    days = pd.DatetimeIndex(index).normalize()
+    if resolution == 'D':
+        return days
+    if resolution == 'W':
+        # Monday is 0, so Sunday starts the week
+        return days - pd.to_timedelta((days.dayofweek + 1) % 7, unit='D')
+    if resolution == 'M':
+        return days.to_period('M').to_timestamp()
+    raise ValueError(f"Unknown resolution {resolution!r}; use one of {', '.join(RESOLUTIONS)}")
+
+
+def _aggregate(labels, columns):
+    """Merge rows with equal (sorted, int64) ``labels``; ``columns`` as in ``FIELDS``."""
+    if not len(labels):
+        return labels, columns
+    starts = np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1])
+    ends = np.concatenate([starts[1:], [len(labels)]])
+    return labels[starts], {
+        'open': columns['open'][starts],
+        'high': np.maximum.reduceat(columns['high'], starts),
+        'low': np.minimum.reduceat(columns['low'], starts),
+        'close': columns['close'][ends - 1],
+        'sum': np.add.reduceat(columns['sum'], starts),
+        'count': np.add.reduceat(columns['count'], starts),
+    }
+
+
+def _raw_columns(values):
+    return {'open': values, 'high': values, 'low': values, 'close': values, 'sum': values,
+            'count': np.ones(len(values), dtype=np.int64)}
+
+
+def aggregate(series):
+    """``{resolution: (bin starts as int64 ns, columns)}`` for a dated series."""
+    series = series.dropna()
+    if not isinstance(series.index, pd.DatetimeIndex):
+        raise ValueError("Pyramids need a series indexed by date")
+    if not series.index.is_monotonic_increasing:
+        series = series.sort_index(kind='stable')
+    values = series.to_numpy(dtype=np.float64)
+    days = bin_starts(series.index, 'D').as_unit('ns').asi8
+    levels = {'D': _aggregate(days, _raw_columns(values))}
+    day_index = pd.DatetimeIndex(levels['D'][0].view('datetime64[ns]'))
+    for resolution in RESOLUTIONS[1:]:
+        labels = bin_starts(day_index, resolution).as_unit('ns').asi8
+        levels[resolution] = _aggregate(labels, levels['D'][1])
+    return levels
+
+
+def _merge_tail(stored_bins, stored, new_bins, new):
+    """Fold ``new`` bins (all at or after the last stored bin) into ``stored``."""
+    if not len(new_bins):
+        return stored_bins, stored
+    if not len(stored_bins):
+        return new_bins, new
+    last = len(stored_bins) - 1
+    bins = np.concatenate([stored_bins[last:], new_bins])
+    tail_bins, tail = _aggregate(bins, {f: np.concatenate([stored[f][last:], new[f]])
+                                        for f in FIELDS})
+    return (np.concatenate([stored_bins[:last], tail_bins]),
+            {f: np.concatenate([stored[f][:last], tail[f]]) for f in FIELDS})
+
+
+class Pyramid:
+    """The stored pyramid of one named series (asset + target)."""
+
+    def __init__(self, name, target, root=DEFAULT_PYRAMID_DIR):
+        tag = hashlib.sha1(str(target).encode()).hexdigest()[:8]
+        self.name = name
+        self.target = str(target)
+        self.path = Path(root) / f"{name}-{tag}"
+        try:
+            self.meta = json.loads((self.path / 'meta.json').read_text())
+            if self.meta.get('version') != PYRAMID_VERSION:
+                self.meta = None
+        except (OSError, ValueError):
+            self.meta = None
+
+    def _read(self, resolution, mmap_mode='r'):
+        bins = np.load(self.path / f'{resolution}.bin.npy', mmap_mode=mmap_mode)
+        return bins, {f: np.load(self.path / f'{resolution}.{f}.npy', mmap_mode=mmap_mode)
+                      for f in FIELDS}
+
+    def _write(self, levels, meta):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_name(self.path.name + '.tmp')
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir()
+        for resolution, (bins, columns) in levels.items():
+            np.save(tmp / f'{resolution}.bin.npy', np.ascontiguousarray(bins, dtype=np.int64))
+            for f in FIELDS:
+                np.save(tmp / f'{resolution}.{f}.npy', np.ascontiguousarray(columns[f]))
+        (tmp / 'meta.json').write_text(json.dumps(meta, indent=1))
+        old = self.path.with_name(self.path.name + '.old')
+        if self.path.exists():
+            self.path.rename(old)
+        tmp.rename(self.path)
+        shutil.rmtree(old, ignore_errors=True)
+        self.meta = meta
+
+    def sync(self, series):
+        """Bring the pyramid up to date with ``series``; returns 'current', 'appended' or 'built'."""
+        rows = len(series)
+        meta = {'version': PYRAMID_VERSION, 'name': self.name, 'target': self.target,
+                'rows': rows, 'fingerprint': fingerprint(series),
+                'last': int(pd.Timestamp(series.index[-1]).value) if rows else None}
+        seen = self.meta['rows'] if self.meta else None
+        if seen == rows and self.meta['fingerprint'] == meta['fingerprint']:
+            return 'current'
+        appendable = (seen is not None and 0 < seen < rows
+                      and fingerprint(series.iloc[:seen]) == self.meta['fingerprint']
+                      and series.index[seen:].min() >= pd.Timestamp(self.meta['last']))
+        with span('pyramid.sync', series=self.name, rows=rows, new_rows=rows - (seen or 0)):
+            if not appendable:
+                self._write(aggregate(series), meta)
+                return 'built'
+            new = aggregate(series.iloc[seen:])
+            levels = {}
+            for resolution in RESOLUTIONS:
+                stored_bins, stored = self._read(resolution, mmap_mode=None)
+                levels[resolution] = _merge_tail(stored_bins, stored, *new[resolution])
+            self._write(levels, meta)
+            return 'appended'
+
+    def bins(self, resolution):
+        return self._read(resolution)[0]
+
+    def frame(self, resolution, start=None, stop=None):
+        """Bins ``start:stop`` (positions) of ``resolution`` with ``HOW`` columns."""
+        bins, columns = self._read(resolution)
+        part = slice(start, stop)
+        frame = pd.DataFrame({f: np.asarray(columns[f][part]) for f in FIELDS[:4]},
+                             index=pd.DatetimeIndex(np.asarray(bins[part]).view('datetime64[ns]'),
+                                                    name='date'))
+        frame['mean'] = np.asarray(columns['sum'][part]) / np.asarray(columns['count'][part])
+        frame['count'] = np.asarray(columns['count'][part])
+        return frame
+
+    def series(self, resolution, how='close'):
+        if how not in HOW:
+            raise ValueError(f"Unknown aggregate {how!r}; use one of {', '.join(HOW)}")
+        return self.frame(resolution)[how].rename(self.target)
+
+    def window(self, max_points, start=None, end=None, how='close'):
+        """The finest level with at most ``max_points`` bins in ``[start, end]``.
+
+        Returns ``(resolution, series)``; only the bins in range are read,
+        so the cost follows the points returned, not the series length.
+        """
+        lo = None if start is None else pd.Timestamp(start).value
+        hi = None if end is None else pd.Timestamp(end).value
+        for resolution in RESOLUTIONS:
+            bins = self.bins(resolution)
+            first = 0 if lo is None else int(np.searchsorted(bins, lo, side='left'))
+            last = len(bins) if hi is None else int(np.searchsorted(bins, hi, side='right'))
+            if last - first <= max_points or resolution == RESOLUTIONS[-1]:
+                return resolution, self.frame(resolution, first, last)[how].rename(self.target)
+
+
+def pyramid(name, series, root=DEFAULT_PYRAMID_DIR):
+    """The synced pyramid of ``series`` stored as ``name``."""
+    stored = Pyramid(name, series.name, root)
+    stored.sync(series)
+    return stored
+
+
+def seasonal_order_for(resolution, order=(1, 1, 1)):
+    """SARIMA seasonal order with a yearly period at ``resolution``, or None for daily."""
+    period = SEASONAL_PERIODS.get(resolution)
+    return None if period is None else tuple(order) + (period,)
+
+
+def _bench(asset, repeat=5):
+    from .assets import load_series
+    from .models import sarima_stage, split_sizes
+
+    raw = load_series(asset)
+    out = {}
+    for resolution in (None,) + RESOLUTIONS[1:]:
+        series = raw if resolution is None else load_series(asset, resolution=resolution)
+        train_size, val_size = split_sizes(len(series))
+        seasonal = seasonal_order_for(resolution) or (1, 1, 1, 12)
+        started = time.perf_counter()
+        _, _, metrics = sarima_stage(series, train_size, val_size, seasonal_order=seasonal)
+        out[resolution or 'raw'] = (len(series), time.perf_counter() - started, metrics['mae'])
+    stored = pyramid(asset, raw)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        resolution, points = stored.window(500)
+        timings.append(time.perf_counter() - started)
+    return out, (resolution, len(points), min(timings))
+
+
+def main(argv=None):
+    from .assets import load_series
+
+    parser = argparse.ArgumentParser(description="Build and read daily/weekly/monthly pyramids.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sync_cmd = sub.add_parser('sync')
+    sync_cmd.add_argument('assets', nargs='+')
+    show = sub.add_parser('show')
+    show.add_argument('asset')
+    show.add_argument('--resolution', choices=RESOLUTIONS, default='M')
+    show.add_argument('--rows', type=int, default=12)
+    bench = sub.add_parser('bench', help="SARIMA fit time per resolution and chart reads")
+    bench.add_argument('asset')
+    args = parser.parse_args(argv)
+
+    if args.command == 'sync':
+        for asset in args.assets:
+            series = load_series(asset)
+            started = time.perf_counter()
+            stored = Pyramid(asset, series.name)
+            action = stored.sync(series)
+            sizes = ', '.join(f"{r}={len(stored.bins(r)):,}" for r in RESOLUTIONS)
+            print(f"{asset}: {action} in {time.perf_counter() - started:.3f}s ({sizes})")
+    elif args.command == 'show':
+        series = load_series(args.asset)
+        print(pyramid(args.asset, series).frame(args.resolution).tail(args.rows)
+              .to_string(float_format=lambda v: f"{v:,.2f}"))
+    else:
+        fits, (resolution, points, seconds) = _bench(args.asset)
+        for name, (rows, fit_seconds, mae) in fits.items():
+            print(f"sarima {name:>4}: {rows:6,} points, fit+forecast {fit_seconds:7.2f}s, "
+                  f"test MAE {mae:,.2f}")
+        print(f"window(500): {points} {resolution} points in {seconds * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,413 @@
+"""Forecast points, intervals and metrics of every run in one SQLite file.
+
+The scripts and ``forecast.py`` record each run here: every forecast point
+with its interval (Prophet's ``yhat_lower``/``yhat_upper``, the sample-path
+bands of ``forecasting/paths.py``; None where a model has none), every
+metric and each model's status.  Downstream code
+(the Express routes, analytics, the chatbot) reads the answers instead of
+rerunning a script.  The file lives at ``FORECAST_RESULTS_DB`` (default
+``services/.results/forecasts.sqlite``).
+
+Tables:
+
+* ``runs``: one row per run (asset, target column, resolution, source,
+  rows, last observed date, split sizes);
+* ``points``: ``(run_id, model, position)`` with the date, kind
+  (``validation``, ``test`` or ``future``), ``yhat``, ``lower``, ``upper``.
+  ``position`` counts rows of the series the run saw, so positions at or
+  past ``runs.rows`` are forecasts beyond the data;
+* ``metrics``: ``(run_id, model, metric, value)``, long format, so new
+  metrics need no schema change;
+* ``models``: ``(run_id, model, status, seconds, error)``.
+
+Runs are indexed by asset, target and time, points by run, model and
+position and separately by date and model.  The query side only needs
+``sqlite3``: reading never imports pandas or a model library, and
+``latest_forecast`` answers in about a millisecond.
+
+Command line::
+
+    python -m forecasting.results latest gold --target 24K --days 30
+    python -m forecasting.results runs gold
+    python -m forecasting.results metrics egx100 --model sarima
+"""
+
+import argparse
+import json
+import numbers
+import os
+import sqlite3
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+# Not imported from .datastore, which loads pandas
+SERVICES_DIR = Path(__file__).resolve().parent.parent
+DEFAULT_RESULTS_PATH = Path(os.environ.get('FORECAST_RESULTS_DB',
+                                           SERVICES_DIR / '.results' / 'forecasts.sqlite'))
+SCHEMA_VERSION = 1
+KINDS = ('validation', 'test', 'future')
+# Points past the data that record_run stores for every fitted model
+FUTURE_STEPS = 30
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    asset TEXT NOT NULL,
+    target TEXT NOT NULL,
+    resolution TEXT,
+    source TEXT,
+    created REAL NOT NULL,
+    rows INTEGER NOT NULL,
+    last_ds TEXT,
+    train_size INTEGER,
+    val_size INTEGER
+);
+CREATE INDEX IF NOT EXISTS runs_by_asset ON runs (asset, target, resolution, created);
+CREATE TABLE IF NOT EXISTS points (
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    ds TEXT,
+    kind TEXT NOT NULL,
+    yhat REAL,
+    lower REAL,
+    upper REAL,
+    PRIMARY KEY (run_id, model, position)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS points_by_date ON points (ds, model);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    value REAL,
+    PRIMARY KEY (run_id, model, metric)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS models (
+    run_id TEXT NOT NULL,
+    model TEXT NOT NULL,
+    status TEXT NOT NULL,
+    seconds REAL,
+    error TEXT,
+    PRIMARY KEY (run_id, model)
+) WITHOUT ROWID;
+"""
+
+
+def _ds(value):
+    """A timestamp as ISO text: the date alone at midnight (sorts like the dates)."""
+    if value is None:
+        return None
+    text = value.isoformat()
+    return text[:10] if text[10:] in ('', 'T00:00:00') else text
+
+
+def _float(value):
+    value = float(value)
+    return None if value != value else value   # NaN -> NULL
+
+
+def _metric_rows(run_id, model, metrics):
+    # Numbers only (numpy scalars included); anything else stays in the logs
+    return [(run_id, model, metric, _float(value)) for metric, value in (metrics or {}).items()
+            if isinstance(value, numbers.Real)]
+
+
+def _dated(series):
+    return hasattr(series.index, 'dayofweek')
+
+
+def _kind(position, train_size, val_size, rows):
+    if position >= rows:
+        return 'future'
+    return 'test' if position >= train_size + val_size else 'validation'
+
+
+def result_points(name, result, series, train_size, val_size):
+    """``(position, ds, kind, yhat, lower, upper)`` rows of one ``ModelResult``.
+
+    Prophet's frame covers the whole series (one row per distinct date)
+    plus the days after it; only rows from the validation slice on are
+    kept.  Other forecasts are aligned to the end of the series (the LSTM's
+    starts ``sequence_length`` points into the test slice).
+    """
+    import numpy as np
+
+    rows = len(series)
+    dated = _dated(series)
+    forecast = result.forecast
+    if name == 'prophet':
+        yhat = forecast['yhat'].to_numpy(dtype=float)
+        positions = np.arange(len(yhat))
+        if dated:
+            # A date's position is its first row; rows after the data follow on
+            ds = forecast['ds'].to_numpy(dtype='datetime64[ns]')
+            index = series.index.as_unit('ns').to_numpy()
+            inside = ds <= index[-1]
+            positions[inside] = np.searchsorted(index, ds[inside])
+            positions[~inside] = rows + np.arange((~inside).sum())
+        lower = forecast['yhat_lower'].to_numpy(dtype=float) if 'yhat_lower' in forecast else None
+        upper = forecast['yhat_upper'].to_numpy(dtype=float) if 'yhat_upper' in forecast else None
+        dates = list(forecast['ds']) if dated else None
+    else:
+        yhat = np.asarray(forecast, dtype=float)
+        positions = np.arange(rows - len(yhat), rows)
+        lower = upper = None
+        dates = list(series.index[positions]) if dated else None
+    keep = np.flatnonzero(positions >= train_size)
+    return [(int(positions[i]), _ds(dates[i]) if dates else None,
+             _kind(int(positions[i]), train_size, val_size, rows), _float(yhat[i]),
+             None if lower is None else _float(lower[i]),
+             None if upper is None else _float(upper[i]))
+            for i in keep]
+
+
+class ResultStore:
+    """The SQLite results file; the connection opens on first use."""
+
+    def __init__(self, path=DEFAULT_RESULTS_PATH):
+        self.path = Path(path)
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            # Readers (the server) keep reading while a script writes
+            connection.execute('PRAGMA journal_mode=WAL')
+            if connection.execute('PRAGMA user_version').fetchone()[0] != SCHEMA_VERSION:
+                connection.executescript(SCHEMA)
+                connection.execute(f'PRAGMA user_version={SCHEMA_VERSION}')
+            self._connection = connection
+        return self._connection
+
+    def close(self):
+        if self._connection is not None:
+            self._connection.close()
+            self._connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- writing
+
+    def _add_run(self, asset, series, train_size=None, val_size=None, resolution=None,
+                 source=None, run_id=None):
+        run_id = run_id or f"{asset}-{datetime.now(timezone.utc):%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:6]}"
+        last_ds = _ds(series.index[-1]) if _dated(series) and len(series) else None
+        self.connection.execute(
+            'INSERT INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            (run_id, asset, str(series.name), resolution, source, time.time(), len(series),
+             last_ds, train_size, val_size))
+        return run_id
+
+    def record_run(self, asset, run, series, resolution=None, source=None, run_id=None,
+                   metrics=None, future_steps=FUTURE_STEPS):
+        """Store a ``ForecastRun`` of ``series``; returns the new run id.
+
+        Besides its validation/test points, every model whose fitted object
+        is on the run also gets ``future_steps`` points past the end of the
+        data (``models.forecast_ahead``), dated on the series' own calendar.
+        ``metrics`` adds ``{model: {metric: value}}`` scored outside the run
+        (the real-estate hedonic valuation).
+        """
+        from .assets import future_dates
+        from .models import forecast_ahead
+
+        rows = len(series)
+        dates = future_dates(series.index, future_steps) if _dated(series) else None
+        with self.connection:
+            run_id = self._add_run(asset, series, run.train_size, run.val_size, resolution,
+                                   source, run_id)
+            points, scores, models = [], [], []
+            for name, result in run.results.items():
+                status = 'skipped' if result.skipped else 'ok' if result.ok else 'failed'
+                models.append((run_id, name, status, result.seconds, result.error))
+                if not result.ok or result.forecast is None:
+                    continue
+                past = result_points(name, result, series, run.train_size, run.val_size)
+                if result.model is not None and future_steps:
+                    yhat, lower, upper = forecast_ahead(name, result.model, series,
+                                                        run.train_size, future_steps)
+                    # These replace the days Prophet's own frame runs past the data
+                    past = [row for row in past if row[0] < rows]
+                    past.extend(
+                        (rows + step, _ds(dates[step]) if dates is not None else None, 'future',
+                         _float(yhat[step]), None if lower is None else _float(lower[step]),
+                         None if upper is None else _float(upper[step]))
+                        for step in range(future_steps))
+                points.extend((run_id, name) + row for row in past)
+                scores.extend(_metric_rows(run_id, name, result.metrics))
+            for name, values in (metrics or {}).items():
+                models.append((run_id, name, 'ok', None, None))
+                scores.extend(_metric_rows(run_id, name, values))
+            self.connection.executemany('INSERT INTO models VALUES (?, ?, ?, ?, ?)', models)
+            self.connection.executemany('INSERT INTO points VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                        points)
+            self.connection.executemany('INSERT INTO metrics VALUES (?, ?, ?, ?)', scores)
+        return run_id
+
+    def record_forecasts(self, asset, series, forecasts, intervals=None, metrics=None,
+                         resolution=None, source=None, run_id=None):
+        """Store forecasts past the end of ``series`` (``{model: values}``); returns the run id.
+
+        ``intervals`` maps a model to ``(lower, upper)`` arrays, ``metrics``
+        to a dict of numbers.  Dated series get dates on their own trading
+        calendar (``assets.future_dates``).
+        """
+        from .assets import future_dates
+
+        rows = len(series)
+        with self.connection:
+            run_id = self._add_run(asset, series, resolution=resolution, source=source,
+                                   run_id=run_id)
+            points = []
+            for name, values in forecasts.items():
+                values = list(values)
+                dates = future_dates(series.index, len(values)) if _dated(series) else None
+                lower, upper = (intervals or {}).get(name, (None, None))
+                points.extend(
+                    (run_id, name, rows + step, _ds(dates[step]) if dates is not None else None,
+                     'future', _float(value),
+                     None if lower is None else _float(lower[step]),
+                     None if upper is None else _float(upper[step]))
+                    for step, value in enumerate(values))
+            self.connection.executemany('INSERT INTO models VALUES (?, ?, ?, ?, ?)',
+                                        [(run_id, name, 'ok', None, None) for name in
+                                         dict.fromkeys([*forecasts, *(metrics or {})])])
+            self.connection.executemany('INSERT INTO points VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                                        points)
+            self.connection.executemany(
+                'INSERT INTO metrics VALUES (?, ?, ?, ?)',
+                [row for name, values in (metrics or {}).items()
+                 for row in _metric_rows(run_id, name, values)])
+        return run_id
+
+    # -- reading (sqlite3 only)
+
+    def runs(self, asset=None, target=None, resolution=None, limit=20):
+        """Most recent runs first; ``target`` matches the column name or its start."""
+        query = 'SELECT * FROM runs WHERE resolution IS ?'
+        params = [resolution]
+        if asset is not None:
+            query += ' AND asset = ?'
+            params.append(asset)
+        if target is not None:
+            query += ' AND target LIKE ?'
+            params.append(f'{target}%')
+        query += ' ORDER BY created DESC LIMIT ?'
+        return [dict(row) for row in self.connection.execute(query, params + [limit])]
+
+    def latest_forecast(self, asset, target=None, model=None, days=30, resolution=None):
+        """Forecast points past the data of the newest run that has any.
+
+        Dated runs return points up to ``days`` calendar days after the last
+        observation, undated ones the first ``days`` steps.  ``model`` picks
+        one model; by default every model of that run is returned.  Rows are
+        dicts with ``run_id, model, ds, position, yhat, lower, upper``.
+        """
+        query = ('SELECT r.run_id, r.rows, r.last_ds FROM runs r WHERE r.asset = ?'
+                 ' AND r.resolution IS ?')
+        params = [asset, resolution]
+        if target is not None:
+            query += ' AND r.target LIKE ?'
+            params.append(f'{target}%')
+        query += (' AND EXISTS (SELECT 1 FROM points p WHERE p.run_id = r.run_id'
+                  ' AND p.position >= r.rows' + (' AND p.model = ?' if model else '') + ')'
+                  ' ORDER BY r.created DESC LIMIT 1')
+        if model:
+            params.append(model)
+        run = self.connection.execute(query, params).fetchone()
+        if run is None:
+            return []
+        query = ('SELECT run_id, model, ds, position, yhat, lower, upper FROM points'
+                 ' WHERE run_id = ? AND position >= ?')
+        params = [run['run_id'], run['rows']]
+        if model:
+            query += ' AND model = ?'
+            params.append(model)
+        if run['last_ds'] is not None:
+            last = datetime.fromisoformat(run['last_ds'])
+            query += ' AND ds <= ?'
+            params.append(_ds(last + timedelta(days=days)))
+        else:
+            query += ' AND position < ?'
+            params.append(run['rows'] + days)
+        query += ' ORDER BY model, position'
+        return [dict(row) for row in self.connection.execute(query, params)]
+
+    def metrics(self, asset, target=None, model=None, resolution=None, runs=1):
+        """Metrics of the ``runs`` most recent runs as ``{run_id: {model: {metric: value}}}``."""
+        out = {}
+        for run in self.runs(asset, target, resolution, limit=runs):
+            query = 'SELECT model, metric, value FROM metrics WHERE run_id = ?'
+            params = [run['run_id']]
+            if model:
+                query += ' AND model = ?'
+                params.append(model)
+            scores = out[run['run_id']] = {}
+            for row in self.connection.execute(query, params):
+                scores.setdefault(row['model'], {})[row['metric']] = row['value']
+        return out
+
+    def points(self, run_id, model=None, kind=None):
+        query = 'SELECT * FROM points WHERE run_id = ?'
+        params = [run_id]
+        for column, value in (('model', model), ('kind', kind)):
+            if value is not None:
+                query += f' AND {column} = ?'
+                params.append(value)
+        return [dict(row) for row in self.connection.execute(query + ' ORDER BY model, position',
+                                                             params)]
+
+
+def latest_forecast(asset, target=None, model=None, days=30, resolution=None,
+                    path=DEFAULT_RESULTS_PATH):
+    """``ResultStore(path).latest_forecast(...)`` on a connection closed afterwards."""
+    with ResultStore(path) as store:
+        return store.latest_forecast(asset, target, model, days, resolution)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query stored forecasts and metrics.")
+    parser.add_argument('--db', default=DEFAULT_RESULTS_PATH, help="results file")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for command in ('latest', 'runs', 'metrics'):
+        cmd = sub.add_parser(command)
+        cmd.add_argument('asset')
+        cmd.add_argument('--target', help="target column or its start")
+        cmd.add_argument('--resolution', choices=('D', 'W', 'M'))
+        if command != 'runs':
+            cmd.add_argument('--model')
+    sub.choices['latest'].add_argument('--days', type=int, default=30)
+    sub.choices['runs'].add_argument('--limit', type=int, default=20)
+    sub.choices['metrics'].add_argument('--runs', type=int, default=1)
+    args = parser.parse_args(argv)
+
+    with ResultStore(args.db) as store:
+        started = time.perf_counter()
+        if args.command == 'latest':
+            rows = store.latest_forecast(args.asset, args.target, args.model, args.days,
+                                         args.resolution)
+        elif args.command == 'runs':
+            rows = store.runs(args.asset, args.target, args.resolution, args.limit)
+        else:
+            rows = store.metrics(args.asset, args.target, args.model, args.resolution, args.runs)
+        seconds = time.perf_counter() - started
+    if args.command == 'metrics':
+        print(json.dumps(rows, indent=1))
+    else:
+        for row in rows:
+            print('  '.join(f"{key}={value:,.4f}" if isinstance(value, float) else f"{key}={value}"
+                            for key, value in row.items() if value is not None))
+    print(f"{len(rows)} row(s) in {seconds * 1000:.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,286 @@
+"""Validation-driven model routing: fit only the families that keep winning.
+
+Every stage scores itself on the validation slice (``val_mae`` and friends
+in its metrics), out of sample and over the same horizon for every family
+(see ``forecasting.models``).  ``route`` keeps a small JSON history per
+asset and target of those scores and, on each run, fits only
+
+* the ``top_k`` families with the lowest recent validation error, relative
+  to the best model of the same run (so the ranking is scale-free);
+* families that have never been scored;
+* exploration runs: a family left out for ``explore_every`` recorded runs
+  is fitted again, so one that would now win gets its chance back.
+
+Skipped families come back as ``ModelResult(skipped=True)``.  The fitted
+survivors are combined into an ``ensemble`` result weighted by inverse
+validation MSE.  Runs on unchanged data (cache hits) are not recorded
+twice.
+
+Command line::
+
+    python -m forecasting.routing run real_estate --top-k 2
+    python -m forecasting.routing status gold
+    python -m forecasting.routing reset gold
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from .cache import fingerprint
+from .datastore import SERVICES_DIR
+from .models import MODEL_NAMES, evaluate, split_series
+from .runner import ModelResult, run_models
+from .trace import span
+
+DEFAULT_ROUTING_DIR = Path(os.environ.get('FORECAST_ROUTING_DIR', SERVICES_DIR / '.routing'))
+# 2: validation scores became comparable across families; older ones are dropped
+ROUTING_VERSION = 2
+DEFAULT_TOP_K = 2
+EXPLORE_EVERY = 5
+# Recent runs a family's rank is averaged over
+HISTORY_WINDOW = 10
+# Relative error recorded for a family that failed to fit
+FAILURE_PENALTY = 10.0
+
+
+def _empty_model():
+    return {'wins': 0, 'losses': 0, 'failures': 0, 'relative_errors': [], 'val_mae': [],
+            'last_run': None, 'seconds': None}
+
+
+class RoutingHistory:
+    """Per asset/target record of how each model family scored on validation."""
+
+    def __init__(self, asset, target, root=DEFAULT_ROUTING_DIR):
+        tag = hashlib.sha1(str(target).encode()).hexdigest()[:8]
+        self.path = Path(root) / f"{asset}-{tag}.json"
+        self.data = {'version': ROUTING_VERSION, 'asset': asset, 'target': str(target),
+                     'runs': 0, 'fingerprint': None, 'models': {}}
+        try:
+            loaded = json.loads(self.path.read_text())
+            if loaded.get('version') == ROUTING_VERSION:
+                self.data = loaded
+        except (OSError, ValueError):
+            pass
+
+    @property
+    def runs(self):
+        return self.data['runs']
+
+    def model(self, name):
+        return self.data['models'].setdefault(name, _empty_model())
+
+    def score(self, name):
+        """Mean relative validation error over recent runs; None when never scored."""
+        errors = self.model(name)['relative_errors'][-HISTORY_WINDOW:]
+        return float(np.mean(errors)) if errors else None
+
+    def idle_runs(self, name):
+        last = self.model(name)['last_run']
+        return self.runs if last is None else self.runs - last
+
+    def select(self, models, top_k=DEFAULT_TOP_K, explore_every=EXPLORE_EVERY):
+        """``(selected, explored, skipped)`` for the next run."""
+        scored = sorted((m for m in models if self.score(m) is not None), key=self.score)
+        unscored = [m for m in models if self.score(m) is None]
+        selected = scored[:top_k] + unscored
+        explored = [m for m in scored[top_k:] if self.idle_runs(m) >= explore_every]
+        skipped = [m for m in scored[top_k:] if m not in explored]
+        return selected, explored, skipped
+
+    def record(self, data_fingerprint, results):
+        """Add one run's validation scores; returns False for unchanged data."""
+        if data_fingerprint == self.data['fingerprint']:
+            return False
+        self.data['fingerprint'] = data_fingerprint
+        self.data['runs'] += 1
+        run = self.data['runs']
+        val_mae = {name: r.metrics['val_mae'] for name, r in results.items()
+                   if r.ok and 'val_mae' in (r.metrics or {})}
+        best = min(val_mae.values(), default=None)
+        winner = min(val_mae, key=val_mae.get) if val_mae else None
+        for name, result in results.items():
+            if result.skipped:
+                continue
+            entry = self.model(name)
+            entry['last_run'] = run
+            entry['seconds'] = result.seconds
+            if name in val_mae:
+                relative = val_mae[name] / best if best else 1.0
+                entry['relative_errors'] = (entry['relative_errors'] + [relative])[-HISTORY_WINDOW:]
+                entry['val_mae'] = (entry['val_mae'] + [val_mae[name]])[-HISTORY_WINDOW:]
+                entry['wins' if name == winner else 'losses'] += 1
+            elif not result.ok:
+                entry['failures'] += 1
+                entry['relative_errors'] = (entry['relative_errors']
+                                            + [FAILURE_PENALTY])[-HISTORY_WINDOW:]
+        return True
+
+    def save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(self.data, indent=1))
+        tmp.replace(self.path)
+
+    def table(self):
+        rows = [dict(model=name, score=self.score(name), wins=entry['wins'],
+                     losses=entry['losses'], failures=entry['failures'],
+                     idle_runs=self.idle_runs(name), seconds=entry['seconds'])
+                for name, entry in self.data['models'].items()]
+        if not rows:
+            return pd.DataFrame(columns=['score'])
+        return pd.DataFrame(rows).set_index('model').sort_values('score')
+
+
+def test_prediction(name, result, n_test):
+    """The test-slice forecast of ``result`` as an array of ``n_test`` values (NaN-padded)."""
+    if name == 'prophet':
+        values = result.forecast['yhat'].to_numpy(dtype=float)[-n_test:]
+    else:
+        values = np.asarray(result.forecast, dtype=float)
+    # LSTM forecasts start sequence_length points into the test slice
+    out = np.full(n_test, np.nan)
+    out[n_test - len(values):] = values
+    return out
+
+
+def ensemble(results, test):
+    """Inverse-validation-MSE weighted mean of the fitted forecasts on ``test``.
+
+    Where a model has no forecast (the LSTM's first window), the others'
+    weights are renormalized.  Returns ``(weights, forecast, metrics)``.
+    """
+    scored = {name: r for name, r in results.items()
+              if r.ok and r.metrics and r.metrics.get('val_rmse') is not None}
+    if not scored:
+        return {}, None, None
+    inverse = {name: 1.0 / max(r.metrics['val_rmse'], 1e-12) ** 2 for name, r in scored.items()}
+    total = sum(inverse.values())
+    weights = {name: w / total for name, w in inverse.items()}
+    predictions = np.vstack([test_prediction(name, scored[name], len(test)) for name in weights])
+    w = np.array(list(weights.values()))[:, None]
+    present = ~np.isnan(predictions)
+    denominator = (w * present).sum(axis=0)
+    with np.errstate(invalid='ignore'):
+        combined = (w * np.nan_to_num(predictions)).sum(axis=0) / denominator
+    forecast = pd.Series(combined, index=test.index)
+    covered = ~np.isnan(combined)
+    metrics = evaluate(test.to_numpy()[covered], combined[covered]) if covered.any() else None
+    return weights, forecast, metrics
+
+
+@dataclass
+class RoutedRun:
+    run: object                 # ForecastRun; skipped models and 'ensemble' included
+    selected: list
+    explored: list
+    skipped: list
+    weights: dict = field(default_factory=dict)
+    recorded: bool = True
+
+    @property
+    def ensemble(self):
+        return self.run.results.get('ensemble')
+
+    def summary(self):
+        parts = [f"fitted {', '.join(self.selected + self.explored) or 'nothing'}"
+                 + (f" (exploring {', '.join(self.explored)})" if self.explored else '')]
+        if self.skipped:
+            parts.append(f"skipped {', '.join(self.skipped)}")
+        if self.weights:
+            parts.append("ensemble " + ', '.join(f"{m} {w:.2f}" for m, w in self.weights.items()))
+        ensemble_result = self.ensemble
+        if ensemble_result is not None and ensemble_result.metrics:
+            parts.append(f"ensemble MAE={ensemble_result.metrics['mae']:,.4f}, "
+                         f"RMSE={ensemble_result.metrics['rmse']:,.4f}")
+        return '; '.join(parts)
+
+
+def route(asset, series, train_size, val_size, models=MODEL_NAMES, top_k=DEFAULT_TOP_K,
+          explore_every=EXPLORE_EVERY, root=DEFAULT_ROUTING_DIR, explore_all=False, **run_options):
+    """Fit the routed subset of ``models`` (see the module docstring) and record the scores.
+
+    ``run_options`` go to ``run_models`` (``cache``, ``configs``,
+    ``parallel``...).  ``explore_all`` fits every model this time.
+    """
+    history = RoutingHistory(asset, series.name, root)
+    if explore_all:
+        selected, explored, skipped = list(models), [], []
+    else:
+        selected, explored, skipped = history.select(models, top_k, explore_every)
+    with span('route', asset=asset, selected=selected, explored=explored, skipped=skipped):
+        run = run_models(series, train_size, val_size, models=selected + explored, **run_options)
+        for name in skipped:
+            score = history.score(name)
+            run.results[name] = ModelResult(
+                name, skipped=True,
+                error=f"skipped by routing (recent validation error {score:.2f}x the best)")
+        recorded = history.record(fingerprint(series), run.results)
+        if recorded:
+            history.save()
+
+        _, _, test = split_series(series, train_size, val_size)
+        fitted = {name: r for name, r in run.results.items() if not r.skipped}
+        weights, forecast, metrics = ensemble(fitted, test)
+        if forecast is not None:
+            run.results['ensemble'] = ModelResult('ensemble', forecast=forecast, metrics=metrics)
+    # Keep the caller's order for the families
+    order = {name: i for i, name in enumerate(models)}
+    return RoutedRun(run, sorted(selected, key=order.get), sorted(explored, key=order.get),
+                     sorted(skipped, key=order.get), weights, recorded)
+
+
+def main(argv=None):
+    from .assets import ASSETS, load_series
+    from .cache import ModelCache
+    from .models import split_sizes
+
+    parser = argparse.ArgumentParser(description="Fit only the models that win on validation.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    run_cmd = sub.add_parser('run')
+    run_cmd.add_argument('asset', choices=sorted(ASSETS))
+    run_cmd.add_argument('--models', default=','.join(MODEL_NAMES))
+    run_cmd.add_argument('--top-k', type=int, default=DEFAULT_TOP_K)
+    run_cmd.add_argument('--explore-every', type=int, default=EXPLORE_EVERY)
+    run_cmd.add_argument('--explore-all', action='store_true', help="fit every model this run")
+    run_cmd.add_argument('--no-cache', action='store_true')
+    run_cmd.add_argument('--serial', action='store_true', help="fit in this process")
+    for command in ('status', 'reset'):
+        cmd = sub.add_parser(command)
+        cmd.add_argument('asset', choices=sorted(ASSETS))
+    args = parser.parse_args(argv)
+
+    series = load_series(args.asset)
+    if args.command == 'status':
+        history = RoutingHistory(args.asset, series.name)
+        print(f"{args.asset}: {history.runs} recorded run(s)")
+        print(history.table().to_string(float_format=lambda v: f"{v:,.3f}"))
+        return
+    if args.command == 'reset':
+        RoutingHistory(args.asset, series.name).path.unlink(missing_ok=True)
+        return
+
+    train_size, val_size = split_sizes(len(series))
+    started = time.perf_counter()
+    routed = route(args.asset, series, train_size, val_size,
+                   models=[m for m in args.models.split(',') if m], top_k=args.top_k,
+                   explore_every=args.explore_every, explore_all=args.explore_all,
+                   cache=None if args.no_cache else ModelCache(), parallel=not args.serial)
+    table = routed.run.metrics_table()
+    columns = [c for c in ('mae', 'rmse', 'val_mae', 'val_rmse', 'seconds') if c in table]
+    print(table[columns].to_string(float_format=lambda v: f"{v:,.4f}"))
+    print(f"\n{routed.summary()}")
+    print(f"{time.perf_counter() - started:.1f}s"
+          + ('' if routed.recorded else " (unchanged data; history not updated)"))
+
+
+if __name__ == '__main__':
+    main()
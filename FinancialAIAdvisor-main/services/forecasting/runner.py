@@ -0,0 +1,178 @@
+"""Run the model stages for one series concurrently in a process pool.
+
+Each family is submitted to its own worker, so a full run takes roughly as
+long as the slowest model instead of the sum of all four.  Worker processes
+get capped BLAS/OpenMP/TensorFlow thread counts so the fits do not fight over
+cores, and a failure in one model is recorded on its result instead of
+aborting the others.
+"""
+
+import multiprocessing
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+
+import pandas as pd
+
+from .models import MODEL_NAMES, run_stage
+from .trace import span
+
+# Worker count and per-worker thread cap can be set without touching the scripts
+DEFAULT_WORKERS = int(os.environ.get('FORECAST_WORKERS', 0)) or None
+DEFAULT_THREADS = int(os.environ.get('FORECAST_THREADS_PER_WORKER', 1)) or None
+
+THREAD_ENV_VARS = (
+    'OMP_NUM_THREADS',
+    'OPENBLAS_NUM_THREADS',
+    'MKL_NUM_THREADS',
+    'VECLIB_MAXIMUM_THREADS',
+    'NUMEXPR_NUM_THREADS',
+    'TF_NUM_INTRAOP_THREADS',
+    'TF_NUM_INTEROP_THREADS',
+)
+
+
+@dataclass
+class ModelResult:
+    name: str
+    model: object = None
+    forecast: object = None
+    metrics: dict = None
+    error: str = None
+    seconds: float = 0.0
+    skipped: bool = False  # not fitted on purpose (model routing); ``error`` says why
+
+    @property
+    def ok(self):
+        return self.error is None
+
+
+@dataclass
+class ForecastRun:
+    target: str
+    train_size: int
+    val_size: int
+    results: dict = field(default_factory=dict)
+    seconds: float = 0.0
+
+    def __getitem__(self, name):
+        return self.results[name]
+
+    @property
+    def failures(self):
+        return {name: r.error for name, r in self.results.items() if not r.ok and not r.skipped}
+
+    def metrics_table(self):
+        rows = []
+        for name, result in self.results.items():
+            row = {'model': name, 'seconds': result.seconds, 'error': result.error}
+            row.update(result.metrics or {})
+            rows.append(row)
+        return pd.DataFrame(rows).set_index('model')
+
+
+@contextmanager
+def thread_caps(threads):
+    """Temporarily export thread caps so freshly started workers inherit them.
+
+    Spawned workers import numpy before any initializer runs, so the limits
+    have to be in the environment when the process starts.
+    """
+    if threads is None:
+        yield
+        return
+    saved = {name: os.environ.get(name) for name in THREAD_ENV_VARS}
+    os.environ.update({name: str(threads) for name in THREAD_ENV_VARS})
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            if value is None:
+                os.environ.pop(name, None)
+            else:
+                os.environ[name] = value
+
+
+def _run_one(name, series, train_size, val_size, cache, target, overrides, load_model=True):
+    started = time.perf_counter()
+    try:
+        model, forecast, metrics = run_stage(
+            name, series, train_size, val_size, cache=cache, target=target,
+            load_model=load_model, **overrides
+        )
+        return ModelResult(name, model, forecast, metrics, seconds=time.perf_counter() - started)
+    except Exception:
+        return ModelResult(name, error=traceback.format_exc(), seconds=time.perf_counter() - started)
+
+
+def _execute(tasks, max_workers, threads_per_worker, parallel):
+    """Run ``_run_one`` for each task tuple and return results in task order."""
+    if not parallel:
+        return [_run_one(*task) for task in tasks]
+
+    max_workers = max_workers or min(len(tasks), os.cpu_count() or 1)
+    results = [None] * len(tasks)
+    # spawn keeps workers free of the parent's already-initialized BLAS pools
+    context = multiprocessing.get_context('spawn')
+    with thread_caps(threads_per_worker):
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=context) as pool:
+            futures = {pool.submit(_run_one, *task): i for i, task in enumerate(tasks)}
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception:
+                    # The worker died or the result could not be pickled back
+                    results[i] = ModelResult(tasks[i][0], error=traceback.format_exc())
+    return results
+
+
+def run_models(series, train_size, val_size, models=MODEL_NAMES, max_workers=DEFAULT_WORKERS,
+               threads_per_worker=DEFAULT_THREADS, cache=None, target=None, configs=None, parallel=True,
+               load_models=True):
+    """Fit ``models`` on ``series`` and gather them into one ``ForecastRun``.
+
+    ``configs`` maps a model name to keyword overrides for its stage (for
+    example ``{'arima': {'order': (2, 1, 2)}}``).  With ``parallel=False`` the
+    stages run one after another in this process, which is handy when
+    debugging a single model.  ``load_models=False`` leaves cached models on
+    disk and returns only their forecasts and metrics.
+    """
+    configs = configs or {}
+    target = target or series.name
+    run = ForecastRun(target, train_size, val_size)
+    started = time.perf_counter()
+    tasks = [(name, series, train_size, val_size, cache, target, configs.get(name, {}), load_models)
+             for name in models]
+    with span('run_models', target=str(target), models=list(models), parallel=parallel):
+        for result in _execute(tasks, max_workers, threads_per_worker, parallel):
+            run.results[result.name] = result
+    run.seconds = time.perf_counter() - started
+    return run
+
+
+def run_frame(frame, train_size, val_size, models=MODEL_NAMES, max_workers=DEFAULT_WORKERS,
+              threads_per_worker=DEFAULT_THREADS, cache=None, configs=None, parallel=True):
+    """Fit ``models`` on every column of ``frame`` through one shared pool.
+
+    Returns ``{column: ForecastRun}``.  All (column, model) pairs are queued
+    at once, so workers stay busy across series instead of idling at the end
+    of each one.
+    """
+    configs = configs or {}
+    started = time.perf_counter()
+    tasks = [(name, frame[column], train_size, val_size, cache, column, configs.get(name, {}))
+             for column in frame.columns for name in models]
+    with span('run_frame', series=len(frame.columns), models=list(models), parallel=parallel):
+        results = _execute(tasks, max_workers, threads_per_worker, parallel)
+
+    runs = {column: ForecastRun(column, train_size, val_size) for column in frame.columns}
+    for task, result in zip(tasks, results):
+        runs[task[5]].results[result.name] = result
+    elapsed = time.perf_counter() - started
+    for run in runs.values():
+        run.seconds = elapsed
+    return runs
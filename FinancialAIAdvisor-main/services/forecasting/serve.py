@@ -0,0 +1,350 @@
+"""Long-running forecast service with warm models.
+
+The service loads each asset's fitted models once (from the model cache,
+fitting only on a miss), conditions them on the full series and then
+answers forecast requests from memory.  Concurrent LSTM requests are
+grouped by a micro-batcher into one forward pass per step.
+
+Requests and responses are JSON.  ``ForecastService.handle`` is the single
+entry point; the HTTP server (TCP or Unix socket) and ``LocalClient`` both
+go through it, so the service can be exercised in-process with no network.
+
+With ``--lstm-backend numpy`` the LSTM runs from the cache entry's
+exported weights (``forecasting.lstm_numpy``) and TensorFlow is only
+imported if an LSTM has to be fitted.
+
+Command line::
+
+    python -m forecasting.serve --port 8765 --assets gold,egx100
+    python -m forecasting.serve --cached-only --lstm-backend numpy
+    python -m forecasting.serve --socket /tmp/forecast.sock
+
+    GET  /health
+    GET  /forecast?asset=gold&model=lstm&steps=30
+    POST /forecast  {"asset": "egx100", "model": "arima", "steps": 10}
+"""
+
+import argparse
+import json
+import queue
+import socketserver
+import threading
+import time
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+
+from .assets import ASSETS, future_dates, load_series
+from .cache import ModelCache
+from .models import run_stage, split_sizes, stage_config
+
+SERVED_MODELS = ('arima', 'sarima', 'prophet', 'lstm')
+LSTM_BACKENDS = ('keras', 'numpy')
+MAX_STEPS = 365
+
+
+class MicroBatcher:
+    """Collect concurrent LSTM requests and run them as one batch.
+
+    Each request is a scaled window of shape ``(L, 1)`` plus a step count.
+    The worker thread waits up to ``max_wait`` seconds (or until
+    ``max_batch`` requests are queued), stacks the windows and rolls them
+    forward together for the largest requested horizon.  ``model`` is a
+    Keras model or a ``NumpyLSTM``.
+    """
+
+    def __init__(self, model, max_batch=64, max_wait=0.002):
+        if hasattr(model, 'rollout'):
+            self.model = model.predict
+        else:
+            import tensorflow as tf
+
+            # One traced graph for any batch size; eager Keras calls cost far
+            # more than the network itself at these sizes.
+            traced = tf.function(lambda x: model(x, training=False), reduce_retracing=True,
+                                 input_signature=[tf.TensorSpec([None] + list(model.input_shape[1:]),
+                                                                tf.float32)])
+            self.model = lambda x: traced(x).numpy()
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def submit(self, window, steps):
+        future = Future()
+        self._queue.put((np.asarray(window, dtype=np.float32), steps, future))
+        return future
+
+    def _collect(self):
+        items = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(items) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                items.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return items
+
+    def _loop(self):
+        while True:
+            items = self._collect()
+            try:
+                windows = np.stack([window for window, _, _ in items])
+                steps = max(n for _, n, _ in items)
+                out = np.empty((len(items), steps), dtype=np.float32)
+                for h in range(steps):
+                    step = self.model(windows)[:, 0]
+                    out[:, h] = step
+                    windows[:, :-1, 0] = windows[:, 1:, 0]
+                    windows[:, -1, 0] = step
+                self.batches += 1
+                for i, (_, n, future) in enumerate(items):
+                    future.set_result(out[i, :n])
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+
+
+class ServiceError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class WarmAsset:
+    """Fitted models for one asset, conditioned on the full series."""
+
+    def __init__(self, asset, cache, models=SERVED_MODELS, fit_missing=True,
+                 lstm_backend='keras'):
+        self.asset = asset
+        self.series = load_series(asset)
+        self.target = self.series.name
+        train_size, val_size = split_sizes(len(self.series))
+        values = np.asarray(self.series, dtype=float)
+        self.models = {}
+        self.errors = {}
+
+        for name in models:
+            try:
+                key = cache.key(self.series, self.target, (train_size, val_size), name,
+                                stage_config(name))
+                if not fit_missing and cache.load(key, load_model=False) is None:
+                    raise ServiceError(f"{name} is not in the model cache", status=503)
+                fitted = None
+                if name == 'lstm' and lstm_backend == 'numpy':
+                    from .lstm_numpy import load_cached
+
+                    fitted = load_cached(cache, key)
+                if fitted is None:
+                    fitted, _, _ = run_stage(name, self.series, train_size, val_size,
+                                             cache=cache, target=self.target)
+                    if name == 'lstm' and lstm_backend == 'numpy':
+                        fitted = load_cached(cache, key)
+            except Exception as e:
+                self.errors[name] = f"{type(e).__name__}: {e}"
+                continue
+            if name in ('arima', 'sarima'):
+                # The stages fit on the training slice; filter the rest of the
+                # series through without re-estimating so forecasts start today.
+                fitted = fitted.extend(values[train_size:])
+            elif name == 'lstm':
+                scaler = fitted['scaler']
+                length = fitted['sequence_length']
+                last = scaler.transform(values[-length:].reshape(-1, 1)).astype(np.float32)
+                batcher = MicroBatcher(fitted['model'])
+                batcher.submit(last, 1).result()  # trace the graph before the first request
+                fitted = dict(fitted, last_window=last, batcher=batcher)
+            self.models[name] = fitted
+
+    def future_index(self, steps):
+        index = self.series.index
+        if isinstance(index, pd.DatetimeIndex):
+            return future_dates(index, steps)
+        return pd.RangeIndex(index[-1] + 1, index[-1] + 1 + steps)
+
+    def forecast(self, name, steps):
+        if name not in self.models:
+            raise ServiceError(self.errors.get(name, f"Unknown model {name!r}"), status=404)
+        fitted = self.models[name]
+        if name in ('arima', 'sarima'):
+            return np.asarray(fitted.forecast(steps=steps))
+        if name == 'prophet':
+            if isinstance(self.series.index, pd.DatetimeIndex):
+                # Predict on the dates the response is labelled with
+                future = pd.DataFrame({'ds': self.future_index(steps)})
+            else:
+                future = fitted.make_future_dataframe(periods=steps, include_history=False)
+            return fitted.predict(future)['yhat'].to_numpy()
+        scaled = fitted['batcher'].submit(fitted['last_window'], steps).result()
+        return fitted['scaler'].inverse_transform(scaled.reshape(-1, 1)).ravel()
+
+
+class ForecastService:
+    def __init__(self, assets=('gold', 'egx100'), cache=None, models=SERVED_MODELS,
+                 fit_missing=True, lstm_backend='keras'):
+        cache = cache or ModelCache()
+        self.started = time.time()
+        self.assets = {asset: WarmAsset(asset, cache, models, fit_missing, lstm_backend)
+                       for asset in assets}
+
+    def health(self):
+        return {
+            'status': 'ok',
+            'uptime': time.time() - self.started,
+            'assets': {name: {'target': warm.target, 'models': sorted(warm.models),
+                              'errors': warm.errors}
+                       for name, warm in self.assets.items()},
+        }
+
+    def handle(self, request):
+        """Answer one forecast request (a dict) with a JSON-ready dict."""
+        started = time.perf_counter()
+        asset = request.get('asset', 'gold')
+        model = request.get('model', 'arima')
+        if not isinstance(asset, str) or not isinstance(model, str):
+            raise ServiceError("asset and model must be strings")
+        steps = request.get('steps', 30)
+        if isinstance(steps, str):
+            # Query-string values arrive as text
+            try:
+                steps = int(steps)
+            except ValueError:
+                raise ServiceError("steps must be an integer") from None
+        # JSON true is an int to Python and 2.9 would truncate; both are errors
+        if isinstance(steps, bool) or not isinstance(steps, int):
+            raise ServiceError("steps must be an integer")
+        if not 1 <= steps <= MAX_STEPS:
+            raise ServiceError(f"steps must be between 1 and {MAX_STEPS}")
+        if asset not in self.assets:
+            raise ServiceError(f"Unknown asset {asset!r}", status=404)
+
+        warm = self.assets[asset]
+        values = warm.forecast(model, steps)
+        index = warm.future_index(steps)
+        return {
+            'asset': asset,
+            'target': warm.target,
+            'model': model,
+            'steps': steps,
+            'index': [str(i.date()) if hasattr(i, 'date') else int(i) for i in index],
+            'forecast': [float(v) for v in values],
+            'elapsed_ms': (time.perf_counter() - started) * 1000,
+        }
+
+
+class LocalClient:
+    """In-process stand-in for an HTTP client; same routing, no sockets."""
+
+    def __init__(self, service):
+        self.service = service
+
+    def get(self, path):
+        return _route(self.service, 'GET', path, b'')
+
+    def post(self, path, payload):
+        return _route(self.service, 'POST', path, json.dumps(payload).encode())
+
+
+def _route(service, method, path, body):
+    """Return ``(status, payload)`` for a request; shared by HTTP and LocalClient."""
+    url = urlparse(path)
+    try:
+        if url.path == '/health':
+            return 200, service.health()
+        if url.path == '/forecast':
+            if method == 'POST':
+                request = json.loads(body or b'{}')
+                if not isinstance(request, dict):
+                    raise ServiceError("request body must be a JSON object")
+            else:
+                request = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            return 200, service.handle(request)
+        return 404, {'error': f"No route for {url.path}"}
+    except ServiceError as e:
+        return e.status, {'error': str(e)}
+    except ValueError as e:
+        return 400, {'error': str(e)}
+    except Exception as e:
+        return 500, {'error': f"{type(e).__name__}: {e}"}
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        def _reply(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self._reply(*_route(service, 'GET', self.path, b''))
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length') or 0)
+            self._reply(*_route(service, 'POST', self.path, self.rfile.read(length)))
+
+        def address_string(self):
+            # Unix-socket peers have no (host, port)
+            return self.client_address[0] if isinstance(self.client_address, tuple) else 'unix'
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+class ThreadingUnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def main(argv=None):
+    import os
+
+    parser = argparse.ArgumentParser(description="Serve forecasts from warm models.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--socket', help="listen on this Unix socket instead of TCP")
+    parser.add_argument('--assets', default='gold,egx100')
+    parser.add_argument('--models', default=','.join(SERVED_MODELS))
+    parser.add_argument('--cached-only', action='store_true',
+                        help="serve only models already in the cache instead of fitting misses")
+    parser.add_argument('--lstm-backend', choices=LSTM_BACKENDS, default='keras',
+                        help="numpy serves the LSTM from exported weights without TensorFlow")
+    args = parser.parse_args(argv)
+
+    assets = [a for a in args.assets.split(',') if a]
+    unknown = set(assets) - set(ASSETS)
+    if unknown:
+        parser.error(f"unknown assets: {', '.join(sorted(unknown))}")
+    service = ForecastService(assets, models=tuple(args.models.split(',')),
+                              fit_missing=not args.cached_only, lstm_backend=args.lstm_backend)
+    handler = make_handler(service)
+    if args.socket:
+        if os.path.exists(args.socket):
+            os.unlink(args.socket)
+        server = ThreadingUnixHTTPServer(args.socket, handler)
+        where = args.socket
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), handler)
+        where = f"http://{args.host}:{args.port}"
+    print(f"Serving forecasts on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,341 @@
+"""Nested timing spans, memory counters and progress events for the pipelines.
+
+Tracing is off unless ``FORECAST_TRACE`` names an output file (or
+``configure`` is called).  While it is off, ``span`` hands back one shared
+no-op context manager and ``keras_callbacks`` returns an empty list, so the
+instrumented code pays a single ``None`` check per call.
+
+With tracing on, every span records wall and CPU time, its parent (spans
+nest per thread) and the process's resident-set change.  With
+``FORECAST_TRACE_MEMORY=1`` it also records the Python heap peak and the net
+allocation inside the span through ``tracemalloc``, which slows the run.
+Keras fits get one span per epoch with the epoch's losses.
+
+Records are appended to the file as they finish, so worker processes
+(which inherit the environment) write to the same file:
+
+* ``*.jsonl``: one JSON object per span or event.
+* ``*.json``: Chrome trace events, viewable in ``chrome://tracing`` or
+  Perfetto as a flame chart.  The closing bracket is optional in that
+  format, which keeps the file appendable.
+
+``log`` keeps the scripts' ``DEBUG:`` output and adds an instant event.
+``capture`` collects a block's records in memory, which is how the
+benchmarks read the stages' own spans.
+
+Command line::
+
+    FORECAST_TRACE=run.jsonl python Gold_Forecasting.py
+    python -m forecasting.trace summary run.jsonl
+    python -m forecasting.trace folded run.jsonl > run.folded   # for flamegraph.pl
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+_NULL = nullcontext()
+_sink = None
+_local = threading.local()
+
+
+class _Sink:
+    def __init__(self, path, memory=False, truncate=True):
+        self.path = Path(path)
+        self.chrome = self.path.suffix == '.json'
+        self.memory = memory
+        self.pid = os.getpid()
+        self.lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        if truncate:
+            self.path.write_text('[\n' if self.chrome else '')
+        # One unbuffered O_APPEND write per record keeps lines from
+        # different processes intact
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        if memory:
+            import tracemalloc
+
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def write(self, record):
+        if self.chrome:
+            line = json.dumps(_chrome_event(record)) + ',\n'
+        else:
+            line = json.dumps(record, default=str) + '\n'
+        with self.lock:
+            os.write(self.fd, line.encode())
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _chrome_event(record):
+    event = {'name': record['name'], 'pid': record['pid'], 'tid': record['tid'],
+             'ts': record['start'] * 1e6, 'cat': record.get('category', 'stage')}
+    if record['type'] == 'span':
+        event.update(ph='X', dur=record['wall'] * 1e6)
+    else:
+        event.update(ph='i', s='t')
+    event['args'] = {k: v for k, v in record.items()
+                     if k not in ('type', 'name', 'pid', 'tid', 'start', 'wall')}
+    return event
+
+
+class _ListSink:
+    """Keeps records in memory for ``capture``, passing them on to ``forward``."""
+
+    def __init__(self, forward=None):
+        self.records = []
+        self.forward = forward
+        self.memory = forward.memory if forward is not None else False
+
+    def write(self, record):
+        self.records.append(record)
+        if self.forward is not None:
+            self.forward.write(record)
+
+    def close(self):
+        pass
+
+
+@contextmanager
+def capture():
+    """Collect the records finished inside the block in a list, tracing or not.
+
+    Records still reach the configured trace file, if any.  Only spans of
+    this process are seen.
+    """
+    global _sink
+    previous = _sink
+    _sink = _ListSink(previous)
+    try:
+        yield _sink.records
+    finally:
+        _sink = previous
+
+
+def configure(path=None, memory=None):
+    """Start tracing to ``path`` (``None`` turns tracing off).
+
+    The file is truncated by the main process only; spawned workers that
+    pick the settings up from the environment append to it.
+    """
+    global _sink
+    if _sink is not None:
+        _sink.close()
+        _sink = None
+    if not path:
+        os.environ.pop('FORECAST_TRACE', None)
+        return
+    if memory is None:
+        memory = os.environ.get('FORECAST_TRACE_MEMORY', '') not in ('', '0')
+    # Spawned workers import the main module before multiprocessing knows
+    # they are children, so ownership travels in the environment instead
+    owner = os.environ.get('FORECAST_TRACE_OWNER')
+    truncate = owner is None or owner == str(os.getpid())
+    _sink = _Sink(path, memory=memory, truncate=truncate)
+    # Child processes started after this inherit the same settings
+    os.environ['FORECAST_TRACE'] = str(Path(path).resolve())
+    os.environ['FORECAST_TRACE_MEMORY'] = '1' if memory else '0'
+    os.environ.setdefault('FORECAST_TRACE_OWNER', str(os.getpid()))
+
+
+def enabled():
+    return _sink is not None
+
+
+def _rss_mib():
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1024 ** 2
+    except (OSError, ValueError):
+        return None
+
+
+def _stack():
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def _span(name, attrs):
+    sink = _sink
+    stack = _stack()
+    frame = {'name': name, 'peak': 0}
+    path = '/'.join([f['name'] for f in stack] + [name])
+    if sink.memory:
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        if stack:
+            # The parent keeps whatever peak it reached before this child
+            stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        tracemalloc.reset_peak()
+        frame['heap_start'] = current
+    stack.append(frame)
+    rss = _rss_mib()
+    start, wall, cpu = time.time(), time.perf_counter(), time.process_time()
+    error = None
+    try:
+        yield frame.setdefault('attrs', attrs)
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        record = {
+            'type': 'span', 'name': name, 'path': path, 'depth': len(stack) - 1,
+            'start': start, 'wall': time.perf_counter() - wall,
+            'cpu': time.process_time() - cpu,
+            'pid': os.getpid(), 'tid': threading.get_ident(),
+        }
+        end_rss = _rss_mib()
+        if rss is not None and end_rss is not None:
+            record['rss_delta_mib'] = end_rss - rss
+            record['rss_mib'] = end_rss
+        stack.pop()
+        if sink.memory:
+            import tracemalloc
+
+            current, peak = tracemalloc.get_traced_memory()
+            peak = max(peak, frame['peak'])
+            record['heap_peak_mib'] = (peak - frame['heap_start']) / 1024 ** 2
+            record['heap_net_mib'] = (current - frame['heap_start']) / 1024 ** 2
+            if stack:
+                stack[-1]['peak'] = max(stack[-1]['peak'], peak)
+        if error:
+            record['error'] = error
+        if frame['attrs']:
+            record['attrs'] = frame['attrs']
+        sink.write(record)
+
+
+def span(name, **attrs):
+    """Time the enclosed block as ``name``; nested spans form a tree.
+
+    The context value is the span's attribute dict, so results known only
+    at the end (cache hits, row counts) can still be attached.
+    """
+    if _sink is None:
+        return _NULL
+    return _span(name, attrs)
+
+
+def event(name, **attrs):
+    """Record an instant event under the current span."""
+    if _sink is None:
+        return
+    stack = _stack()
+    record = {'type': 'event', 'name': name, 'category': 'log',
+              'path': '/'.join([f['name'] for f in stack] + [name]),
+              'start': time.time(), 'pid': os.getpid(), 'tid': threading.get_ident()}
+    if attrs:
+        record['attrs'] = attrs
+    _sink.write(record)
+
+
+def log(message):
+    """The scripts' debug print, also recorded as a trace event."""
+    print(f"DEBUG: {message}")
+    event(message)
+
+
+def keras_callbacks():
+    """Per-epoch spans for ``model.fit(callbacks=...)``; empty when tracing is off."""
+    if _sink is None:
+        return []
+    from tensorflow import keras
+
+    class EpochSpans(keras.callbacks.Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self._span = span('epoch', epoch=epoch + 1)
+            self._attrs = self._span.__enter__()
+
+        def on_epoch_end(self, epoch, logs=None):
+            self._attrs.update({k: float(v) for k, v in (logs or {}).items()})
+            self._span.__exit__(None, None, None)
+
+    return [EpochSpans()]
+
+
+def read(path):
+    """Load span and event records from a JSONL or Chrome trace file."""
+    path = Path(path)
+    text = path.read_text()
+    if path.suffix != '.json':
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+    body = text.strip().rstrip(',').lstrip('[').rstrip(']').rstrip().rstrip(',')
+    records = []
+    for event in json.loads('[' + body + ']') if body else []:
+        record = dict(event.get('args', {}), name=event['name'], pid=event['pid'],
+                      tid=event['tid'], start=event['ts'] / 1e6)
+        if event['ph'] == 'X':
+            record.update(type='span', wall=event['dur'] / 1e6)
+        else:
+            record['type'] = 'event'
+        records.append(record)
+    return records
+
+
+def summary(records):
+    """Aggregate spans by their nesting path: calls, total wall/CPU, max RSS growth."""
+    totals = defaultdict(lambda: {'calls': 0, 'wall': 0.0, 'cpu': 0.0, 'rss_delta_mib': 0.0,
+                                  'heap_peak_mib': None})
+    for record in records:
+        if record['type'] != 'span':
+            continue
+        row = totals[record['path']]
+        row['calls'] += 1
+        row['wall'] += record['wall']
+        row['cpu'] += record['cpu']
+        row['rss_delta_mib'] = max(row['rss_delta_mib'], record.get('rss_delta_mib', 0.0))
+        if 'heap_peak_mib' in record:
+            row['heap_peak_mib'] = max(row['heap_peak_mib'] or 0.0, record['heap_peak_mib'])
+    return dict(sorted(totals.items()))
+
+
+def folded(records):
+    """Folded stacks (``a;b;c <microseconds>``) of self time, for flamegraph tools."""
+    child_time = defaultdict(float)
+    own = defaultdict(float)
+    for record in records:
+        if record['type'] == 'span':
+            own[record['path']] += record['wall']
+            parent = record['path'].rpartition('/')[0]
+            if parent:
+                child_time[parent] += record['wall']
+    return [f"{path.replace('/', ';')} {max(0, int((total - child_time[path]) * 1e6))}"
+            for path, total in sorted(own.items())]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize a forecasting trace file.")
+    parser.add_argument('command', choices=('summary', 'folded'))
+    parser.add_argument('path')
+    args = parser.parse_args(argv)
+
+    records = read(args.path)
+    if args.command == 'folded':
+        print('\n'.join(folded(records)))
+        return
+    for path, row in summary(records).items():
+        depth = path.count('/')
+        label = '  ' * depth + path.rpartition('/')[2]
+        memory = f"  rss +{row['rss_delta_mib']:.1f} MiB"
+        if row['heap_peak_mib'] is not None:
+            memory += f"  heap peak {row['heap_peak_mib']:.1f} MiB"
+        print(f"{label:<40} {row['calls']:>5}x  {row['wall']:9.3f}s wall  {row['cpu']:9.3f}s cpu{memory}")
+
+
+if os.environ.get('FORECAST_TRACE') and __name__ != '__main__':
+    configure(os.environ['FORECAST_TRACE'])
+
+if __name__ == '__main__':
+    main()
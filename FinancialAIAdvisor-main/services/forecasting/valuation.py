@@ -0,0 +1,268 @@
+"""Hedonic valuation and comparable-listing search for the house listings.
+
+The listings are a cross-section, not a time series, so instead of
+forecasting ``Price`` by row order this fits a gradient-boosted model of
+log price on the listing attributes (``HedonicModel``) and scores any
+number of listings in one ``predict`` call.
+
+``ComparablesIndex`` keeps one nearest-neighbour tree per City over
+standardized size/room/floor features plus weighted one-hot property type
+and finishing, so "listings like this one" is a single tree query inside
+the listing's city.
+
+Command line::
+
+    python -m forecasting.valuation fit
+    python -m forecasting.valuation comparables --city "Nasr City" --type Apartment --area 160 --bedrooms 3 --bathrooms 2
+    python -m forecasting.valuation bench
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from .listings import CATEGORICAL, encode_categories, load_listings
+from .models import evaluate
+
+NUMERIC_FEATURES = ['Bedrooms', 'Bathrooms', 'Area', 'Level']
+# What the hedonic model reads; callers streaming the listings keep only these
+VALUATION_COLUMNS = ['Price'] + NUMERIC_FEATURES + CATEGORICAL
+# Histogram boosting needs fewer categories than bins; rarer compounds are
+# folded into one 'Other' level
+MAX_CATEGORIES = 250
+MIN_CATEGORY_COUNT = 5
+BOOSTING_PARAMS = {'max_iter': 400, 'learning_rate': 0.08, 'max_leaf_nodes': 63,
+                   'l2_regularization': 1.0, 'random_state': 0}
+
+# Comparable search: how much a different property type / finishing weighs
+# against one standard deviation of size or rooms
+TYPE_WEIGHT = 3.0
+TERM_WEIGHT = 1.0
+
+
+class HedonicModel:
+    """Gradient-boosted log-price model over the listing attributes."""
+
+    def __init__(self, **params):
+        self.params = dict(BOOSTING_PARAMS, **params)
+        self.vocab = {}
+        self.model = None
+
+    def _features(self, listings):
+        columns = {name: listings[name].to_numpy(dtype=np.float64) for name in NUMERIC_FEATURES}
+        for name in CATEGORICAL:
+            values = listings[name].astype('string').fillna('Unknown')
+            codes = encode_categories(values, self.vocab[name])
+            # Values folded into 'Other' at fit time (or never seen) map there too
+            other = self.vocab[name].get_loc('Other') if 'Other' in self.vocab[name] else np.nan
+            columns[name] = np.where(np.isnan(codes), other, codes)
+        return pd.DataFrame(columns)
+
+    def fit(self, listings):
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        listings = listings[listings['Price'].notna() & (listings['Price'] > 0)]
+        for name in CATEGORICAL:
+            counts = listings[name].astype('string').fillna('Unknown').value_counts()
+            keep = counts[counts >= MIN_CATEGORY_COUNT].index[:MAX_CATEGORIES - 1]
+            self.vocab[name] = pd.Index(sorted(keep) + ['Other'])
+        X = self._features(listings)
+        self.model = HistGradientBoostingRegressor(
+            categorical_features=[X.columns.get_loc(name) for name in CATEGORICAL], **self.params)
+        self.model.fit(X, np.log(listings['Price'].to_numpy(dtype=np.float64)))
+        return self
+
+    def predict(self, listings):
+        """Estimated prices for every row of ``listings`` in one pass."""
+        return np.exp(self.model.predict(self._features(listings)))
+
+
+def fit_valuation(listings=None, test_fraction=0.2, seed=0, cache=None, **params):
+    """Fit on a random split and report holdout metrics; returns ``(model, metrics)``.
+
+    With a ``ModelCache`` the fitted model is reused while the listings and
+    parameters are unchanged.
+    """
+    listings = load_listings() if listings is None else listings
+    priced = listings.loc[listings['Price'].notna() & (listings['Price'] > 0), VALUATION_COLUMNS]
+    holdout = np.random.default_rng(seed).random(len(priced)) < test_fraction
+
+    def fit():
+        model = HedonicModel(**params).fit(priced[~holdout])
+        test = priced[holdout]
+        metrics = evaluate(test['Price'], model.predict(test))
+        log_error = np.log(model.predict(test)) - np.log(test['Price'].to_numpy())
+        metrics['median_abs_pct_error'] = float(np.median(np.abs(np.expm1(log_error))) * 100)
+        return model, None, metrics
+
+    if cache is None:
+        model, _, metrics = fit()
+        return model, metrics
+    config = dict(BOOSTING_PARAMS, **params, test_fraction=test_fraction, seed=seed)
+    key = cache.key(priced, 'Price', (len(priced),), 'hedonic', config)
+    model, _, metrics = cache.get_or_fit(key, fit, kind='pickle', model='hedonic', target='Price')
+    return model, metrics
+
+
+def _labels(values):
+    # A plain object array of strings, so comparisons broadcast like NumPy
+    labels = np.array(values.astype(object), dtype=object)
+    labels[pd.isna(labels)] = 'Unknown'
+    return labels
+
+
+def _numeric(listings):
+    # log area, rooms and floor as one float matrix
+    columns = [pd.to_numeric(listings[name], errors='coerce').to_numpy(dtype=np.float64)
+               for name in NUMERIC_FEATURES]
+    columns[2] = np.log(columns[2])
+    return np.column_stack(columns)
+
+
+class ComparablesIndex:
+    """Per-City nearest-neighbour trees over encoded listing attributes."""
+
+    def __init__(self, listings, leaf_size=32):
+        from sklearn.neighbors import BallTree, KDTree
+
+        self.listings = listings.reset_index(drop=True)
+        numeric = _numeric(self.listings)
+        self.fill = np.nanmedian(numeric, axis=0)
+        self.center = np.nanmean(numeric, axis=0)
+        self.scale = np.nanstd(numeric, axis=0)
+        self.scale[self.scale == 0] = 1.0
+        self.types = np.unique(_labels(self.listings['Type']))
+        self.terms = np.unique(_labels(self.listings['Delivery_Term']))
+
+        features = self._encode(self.listings)
+        # KD-trees prune well in low dimensions; past that a ball tree does better
+        tree_class = KDTree if features.shape[1] <= 12 else BallTree
+        cities = _labels(self.listings['City'])
+        self.trees = {}
+        for city in np.unique(cities):
+            rows = np.flatnonzero(cities == city)
+            self.trees[city] = (tree_class(features[rows], leaf_size=leaf_size), rows)
+        self.global_tree = (tree_class(features, leaf_size=leaf_size), np.arange(len(features)))
+
+    def _encode(self, listings):
+        numeric = _numeric(listings)
+        numeric = np.where(np.isnan(numeric), self.fill, numeric)
+        numeric = (numeric - self.center) / self.scale
+        types = _labels(listings['Type'])[:, None]
+        terms = _labels(listings['Delivery_Term'])[:, None]
+        return np.hstack([numeric,
+                          TYPE_WEIGHT * (types == self.types[None, :]),
+                          TERM_WEIGHT * (terms == self.terms[None, :])])
+
+    def nearest(self, listing, k=10):
+        """Fast path for one listing given as a dict: ``(row positions, distances)``.
+
+        Encodes the listing with plain NumPy (no frame construction), so a
+        lookup costs little more than the tree query itself.
+        """
+        # Nullable Int8 rooms/floor come back as None or pd.NA when missing
+        numeric = np.array([pd.to_numeric(listing.get(name), errors='coerce') for name in NUMERIC_FEATURES],
+                           dtype=np.float64)
+        numeric[2] = np.log(numeric[2])
+        numeric = np.where(np.isnan(numeric), self.fill, numeric)
+        features = np.concatenate([(numeric - self.center) / self.scale,
+                                   TYPE_WEIGHT * (self.types == listing.get('Type', 'Unknown')),
+                                   TERM_WEIGHT * (self.terms == listing.get('Delivery_Term', 'Unknown'))])
+        tree, rows = self.trees.get(listing.get('City', 'Unknown'), self.global_tree)
+        distances, positions = tree.query(features[None, :], k=min(k, len(rows)))
+        return rows[positions[0]], distances[0]
+
+    def query(self, listings, k=10):
+        """``k`` comparables for each row of ``listings`` within its City.
+
+        Returns one frame of matches with ``query`` (the row's position in
+        ``listings``) and ``distance`` columns, nearest first per query.
+        Listings in a city the index has never seen search all cities.
+        """
+        listings = listings.reset_index(drop=True)
+        features = self._encode(listings)
+        cities = _labels(listings['City'])
+        parts = []
+        for city in np.unique(cities):
+            queries = np.flatnonzero(cities == city)
+            tree, rows = self.trees.get(city, self.global_tree)
+            distances, positions = tree.query(features[queries], k=min(k, len(rows)))
+            match = self.listings.iloc[rows[positions.ravel()]].copy()
+            match.insert(0, 'query', np.repeat(queries, positions.shape[1]))
+            match.insert(1, 'distance', distances.ravel())
+            parts.append(match)
+        return pd.concat(parts).sort_values(['query', 'distance'], kind='stable')
+
+
+def _listing_from_args(args):
+    return pd.DataFrame([{'City': args.city, 'Type': args.type, 'Area': args.area,
+                          'Bedrooms': args.bedrooms, 'Bathrooms': args.bathrooms,
+                          'Level': args.level, 'Delivery_Term': args.delivery_term,
+                          'Furnished': args.furnished, 'Compound': args.compound,
+                          'Payment_Option': args.payment}])
+
+
+def main(argv=None):
+    from .cache import ModelCache
+
+    parser = argparse.ArgumentParser(description="Hedonic valuation and comparable listings.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('fit')
+    comparables = sub.add_parser('comparables')
+    comparables.add_argument('--city', required=True)
+    comparables.add_argument('--type', default='Apartment')
+    comparables.add_argument('--area', type=float, required=True)
+    comparables.add_argument('--bedrooms', type=float, default=np.nan)
+    comparables.add_argument('--bathrooms', type=float, default=np.nan)
+    comparables.add_argument('--level', type=float, default=np.nan)
+    comparables.add_argument('--delivery-term', default='Finished')
+    comparables.add_argument('--furnished', default='No')
+    comparables.add_argument('--compound', default='Unknown')
+    comparables.add_argument('--payment', default='Cash')
+    comparables.add_argument('-k', type=int, default=10)
+    sub.add_parser('bench')
+    args = parser.parse_args(argv)
+
+    listings = load_listings()
+    if args.command == 'fit':
+        started = time.perf_counter()
+        _, metrics = fit_valuation(listings, cache=ModelCache())
+        print(f"Fitted in {time.perf_counter() - started:.1f}s")
+        print(', '.join(f"{name}={value:,.3f}" for name, value in metrics.items()))
+        return
+
+    index = ComparablesIndex(listings[listings['Area'].notna()])
+    if args.command == 'comparables':
+        query = _listing_from_args(args)
+        model, _ = fit_valuation(listings, cache=ModelCache())
+        print(f"Estimated price: {model.predict(query)[0]:,.0f}")
+        rows, distances = index.nearest(query.iloc[0].to_dict(), k=args.k)
+        matches = index.listings.iloc[rows].assign(distance=distances)
+        print(matches.to_string(index=False))
+        return
+
+    sample = listings[listings['Area'].notna()].sample(2000, random_state=0)
+    started = time.perf_counter()
+    ComparablesIndex(listings[listings['Area'].notna()])
+    build = time.perf_counter() - started
+    rows = sample.to_dict('records')
+    started = time.perf_counter()
+    for row in rows:
+        index.nearest(row, k=10)
+    single = (time.perf_counter() - started) / len(rows)
+    started = time.perf_counter()
+    index.query(sample, k=10)
+    batch = (time.perf_counter() - started) / len(sample)
+    model, _ = fit_valuation(listings, cache=ModelCache())
+    started = time.perf_counter()
+    model.predict(listings)
+    scoring = time.perf_counter() - started
+    print(f"Index build: {build * 1000:.0f} ms for {len(index.listings):,} listings in {len(index.trees)} cities")
+    print(f"Comparables: {single * 1000:.3f} ms per single query, {batch * 1000:.3f} ms per query in a batch")
+    print(f"Valuation: {len(listings):,} listings scored in {scoring * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Sliding-window builders for the LSTM stages.
+
+The scripts used to build their 60-step windows with a Python loop and
+``np.array``, which copies every value ``sequence_length`` times.  The
+helpers here return strided views over a single float32 copy of the series,
+so memory grows with the input instead of with ``len(data) * sequence_length``.
+"""
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _as_column(data):
+    # MinMaxScaler hands back (n, 1) float64; keep the feature axis and
+    # convert once to float32 (no copy when it already is).
+    data = np.asarray(data, dtype=np.float32)
+    if data.ndim == 1:
+        data = data[:, None]
+    return data
+
+
+def create_sequences(data, sequence_length=60):
+    """Return ``(X, y)`` windows with the same shapes the old loop produced.
+
+    ``X`` has shape ``(n - sequence_length, sequence_length, features)`` and
+    ``y`` has shape ``(n - sequence_length, features)``.  Both are read-only
+    views on one float32 copy of ``data``.
+    """
+    data = _as_column(data)
+    n_windows = len(data) - sequence_length
+    if n_windows <= 0:
+        empty = np.empty((0, sequence_length, data.shape[1]), dtype=np.float32)
+        return empty, np.empty((0, data.shape[1]), dtype=np.float32)
+
+    # sliding_window_view puts the window axis last: (n_windows, features, L)
+    X = sliding_window_view(data[:-1], sequence_length, axis=0)
+    X = X.transpose(0, 2, 1)
+    y = data[sequence_length:]
+    return X, y
+
+
+def window_batches(data, sequence_length=60, batch_size=32, shuffle=False, seed=None):
+    """Yield ``(X_batch, y_batch)`` pairs lazily, materializing one batch at a time.
+
+    Useful with ``model.fit`` on series too long to hand Keras all windows at
+    once; each yielded batch is a contiguous float32 array.
+    """
+    X, y = create_sequences(data, sequence_length)
+    order = np.arange(len(X))
+    if shuffle:
+        np.random.default_rng(seed).shuffle(order)
+    for start in range(0, len(order), batch_size):
+        idx = order[start:start + batch_size]
+        yield np.ascontiguousarray(X[idx]), np.ascontiguousarray(y[idx])
+
+
+def window_dataset(data, sequence_length=60, batch_size=32, shuffle=False, seed=None):
+    """A prefetching ``tf.data`` pipeline of the ``create_sequences`` windows.
+
+    The series is held once as a float32 tensor; each batch gathers its
+    windows from it on the fly (reshuffled every epoch when ``shuffle``), so
+    no window array is ever materialized and the next batch is prepared
+    while the current one trains.
+    """
+    import tensorflow as tf
+
+    data = _as_column(data)
+    n_windows = max(len(data) - sequence_length, 0)
+    values = tf.constant(data)
+    offsets = tf.range(sequence_length, dtype=tf.int64)
+
+    def gather(starts):
+        windows = tf.gather(values, starts[:, None] + offsets[None, :])
+        return windows, tf.gather(values, starts + sequence_length)
+
+    dataset = tf.data.Dataset.range(n_windows)
+    if shuffle and n_windows:
+        dataset = dataset.shuffle(n_windows, seed=seed, reshuffle_each_iteration=True)
+    return (dataset.batch(batch_size)
+            .map(gather, num_parallel_calls=tf.data.AUTOTUNE)
+            .prefetch(tf.data.AUTOTUNE))
@@ -0,0 +1,9 @@
+import sys
+from pathlib import Path
+
+# The engine modules and the forecasting package are imported the way the
+# scripts import them: from the project root and from services/
+ROOT = Path(__file__).resolve().parent.parent
+for path in (ROOT, ROOT / 'services'):
+    if str(path) not in sys.path:
+        sys.path.insert(0, str(path))
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+from allocation import allocate_one
+from allocation_service import AllocationService, load_test
+
+
+@pytest.fixture
+def service():
+    return AllocationService()
+
+
+def _session(service):
+    status, created = service.route('POST', '/sessions', {})
+    assert status == 201
+    return created['session']
+
+
+def test_recommendation_then_custom_percent(service):
+    sid = _session(service)
+    status, body = service.route('POST', f'/sessions/{sid}/salary', {'salary': 45000})
+    assert status == 200
+    assert body['recommended_percent'] == 15
+    status, body = service.route('POST', f'/sessions/{sid}/allocation', {'percent': 30})
+    assert status == 200
+    assert (body['invest_amount'], body['manage_amount']) == allocate_one(45000, 30)[1:]
+
+
+@pytest.mark.parametrize('salary', [True, None, 'abc', [45000], 0, -10])
+def test_rejects_invalid_salary(service, salary):
+    sid = _session(service)
+    status, body = service.route('POST', f'/sessions/{sid}/salary', {'salary': salary})
+    assert status == 400
+    assert body['error'].startswith('❌')
+
+
+@pytest.mark.parametrize('percent', [False, 'x', -1, 101])
+def test_rejects_invalid_percent(service, percent):
+    sid = _session(service)
+    service.route('POST', f'/sessions/{sid}/salary', {'salary': 45000})
+    status, _ = service.route('POST', f'/sessions/{sid}/allocation', {'percent': percent})
+    assert status == 400
+
+
+def test_allocation_needs_a_salary_first(service):
+    sid = _session(service)
+    status, _ = service.route('POST', f'/sessions/{sid}/allocation', {})
+    assert status == 409
+
+
+def test_unknown_subpaths_do_not_touch_the_session(service):
+    sid = _session(service)
+    assert service.route('DELETE', f'/sessions/{sid}/salary/x', {})[0] == 404
+    assert service.route('GET', f'/sessions/{sid}/salary/x', {})[0] == 404
+    assert service.route('GET', f'/sessions/{sid}', {})[0] == 200
+
+
+def test_idle_sessions_are_evicted():
+    now = [0.0]
+    service = AllocationService(idle_timeout=10, clock=lambda: now[0])
+    old = _session(service)
+    now[0] = 8.0
+    fresh = _session(service)
+    now[0] = 15.0
+    assert service.evict_idle() == 1
+    assert old not in service.sessions and fresh in service.sessions
+
+
+def test_load_test_matches_allocate_one():
+    report = asyncio.run(load_test(sessions=50, concurrency=10))
+    assert report['mismatches'] == 0
+    assert report['open_sessions'] == 0
+    assert report['requests'] == 50 * 4
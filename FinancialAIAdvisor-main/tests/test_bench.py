@@ -0,0 +1,31 @@
+import pytest
+
+pytest.importorskip('statsmodels')
+
+from forecasting.assets import asset_path
+from forecasting.bench import _job_rows, run_isolated, run_suite
+
+
+def test_each_job_reports_its_rows_as_it_finishes():
+    seen = []
+    rows = run_suite(pipelines=('gold',), models=('arima',), on_rows=lambda new: seen.append(new))
+    assert [[row['stage'] for row in new] for new in seen] == [
+        ['load', 'preprocess', 'split'], ['fit:arima', 'predict:arima']]
+    assert rows == [row for new in seen for row in new]
+    assert {row['status'] for row in rows} == {'ok'}
+
+
+def test_a_job_past_its_timeout_is_killed():
+    status, error = run_isolated('gold', asset_path('gold'), ('sarima',), timeout=0.1)
+    assert status == 'timeout' and 'no result' in error
+
+
+def test_a_failing_job_becomes_a_row():
+    # The data store rejects the unknown option inside the worker
+    [row] = _job_rows('gold', 1, 'prophet', asset_path('gold'), {'not_an_option': 1}, 1, 0, 1, 60, 3072)
+    assert row['status'] == 'failed' and 'TypeError' in row['error']
+
+
+def test_sarima_is_skipped_on_scaled_listings():
+    [row] = _job_rows('real_estate', 10, 'sarima', None, {}, 1, 0, 1, 60, 3072)
+    assert (row['stage'], row['status']) == ('sarima', 'skipped')
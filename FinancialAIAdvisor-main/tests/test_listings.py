@@ -0,0 +1,29 @@
+import numpy as np
+import pandas as pd
+
+from forecasting.assets import load_series
+from forecasting.listings import (IMPUTE, ListingStats, concat_listings, iter_listings, load_listings,
+                                  read_listings)
+
+
+def test_chunked_fill_matches_the_whole_file():
+    whole = load_listings(impute=IMPUTE)
+    streamed = concat_listings(list(iter_listings(chunksize=1000)))
+    for column in IMPUTE:
+        pd.testing.assert_series_equal(streamed[column], whole[column])
+    assert not streamed[list(IMPUTE)].isna().any().any()
+
+
+def test_stats_from_chunks_do_not_depend_on_chunk_size():
+    small = ListingStats.from_chunks(read_listings(chunksize=997))
+    large = ListingStats.from_chunks(read_listings())
+    assert small.rows == large.rows == 27361
+    assert small.fill_values() == large.fill_values()
+
+
+def test_real_estate_series_is_the_streamed_price():
+    prices = pd.concat([chunk['Price'] for chunk in iter_listings(chunksize=5000, columns=['Price'])],
+                       ignore_index=True)
+    series = load_series('real_estate')
+    assert series.dtype == np.float64
+    np.testing.assert_array_equal(series.to_numpy(), prices.to_numpy(dtype=np.float64))
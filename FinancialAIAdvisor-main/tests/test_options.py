@@ -0,0 +1,19 @@
+import pytest
+
+from forecasting.models import PROPHET_WARM
+from forecasting.options import PipelineOptions
+
+
+def test_flags_come_from_the_environment(monkeypatch):
+    monkeypatch.setenv('FORECAST_OPTIONS', 'route_models, warm_prophet,no_store_results')
+    options = PipelineOptions.from_env()
+    assert options == PipelineOptions(route_models=True, warm_prophet=True, store_results=False)
+    assert options.model_configs({'arima': {}}) == {'arima': {}, 'prophet': PROPHET_WARM}
+
+
+def test_defaults_and_unknown_flags(monkeypatch):
+    monkeypatch.delenv('FORECAST_OPTIONS', raising=False)
+    assert PipelineOptions.from_env() == PipelineOptions()
+    assert PipelineOptions().model_configs() is None
+    with pytest.raises(ValueError, match='route_model'):
+        PipelineOptions.from_env('route_model')
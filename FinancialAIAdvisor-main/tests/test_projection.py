@@ -0,0 +1,40 @@
+import numpy as np
+import pandas as pd
+
+from forecasting.projection import ReturnModel, joint_shocks, project
+
+
+def _models(overlap_start='2010-01'):
+    rng = np.random.default_rng(0)
+    common = rng.normal(0, 0.05, 120)
+    months = pd.period_range('2010-01', periods=120, freq='M')
+    a = pd.Series(common, index=months)
+    b = pd.Series(common, index=pd.period_range(overlap_start, periods=120, freq='M'))
+    return [ReturnModel(name, shocks.to_numpy(), 0.005, 21.0, shocks)
+            for name, shocks in (('a', a), ('b', b))]
+
+
+def test_joint_shocks_align_on_calendar_months():
+    assert joint_shocks(_models()).shape == (120, 2)
+    assert joint_shocks(_models('2011-01')).shape == (108, 2)
+    assert joint_shocks(_models('2030-01')) is None
+
+
+def test_co_moving_assets_widen_the_bands():
+    contributions = np.full(60, 1000.0)
+    joint = project(contributions, _models(), paths=4000, seed=1)
+    independent = project(contributions, _models('2030-01'), paths=4000, seed=1)
+    assert joint.joint_months == 120 and independent.joint_months == 0
+    spread = lambda p: p.bands[95][-1] - p.bands[5][-1]
+    # Perfectly correlated assets do not diversify each other away
+    assert spread(joint) > 1.2 * spread(independent)
+
+
+def test_project_investment_reports_year_ends(tmp_path):
+    from allocation import project_investment
+    from forecasting.cache import ModelCache
+
+    yearly = project_investment(4500, years=2, paths=500, cache=ModelCache(tmp_path))
+    assert yearly['month'].tolist() == [12, 24]
+    assert yearly['invested'].tolist() == [54000, 108000]
+    assert (yearly['p5'] <= yearly['p95']).all()
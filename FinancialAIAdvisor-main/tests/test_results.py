@@ -0,0 +1,28 @@
+from datetime import date
+
+import pytest
+
+pytest.importorskip('statsmodels')
+
+from forecasting.assets import load_series
+from forecasting.models import split_sizes
+from forecasting.results import FUTURE_STEPS, ResultStore
+from forecasting.runner import run_models
+
+
+@pytest.mark.parametrize('asset', ['gold', 'egx100'])
+def test_every_stored_model_has_a_forecast_past_the_data(tmp_path, asset):
+    series = load_series(asset)
+    train_size, val_size = split_sizes(len(series))
+    run = run_models(series, train_size, val_size, models=('arima', 'sarima'), parallel=False)
+    with ResultStore(tmp_path / 'results.sqlite') as store:
+        store.record_run(asset, run, series)
+        rows = store.latest_forecast(asset, days=7)
+        future = store.points(rows[0]['run_id'], model='arima', kind='future')
+
+    assert {row['model'] for row in rows} == {'arima', 'sarima'}
+    assert len(future) == FUTURE_STEPS
+    assert future[0]['position'] == len(series)
+    # Forecasts stay on the series' own trading days
+    weekdays = set(series.index[-260:].dayofweek)
+    assert {date.fromisoformat(row['ds']).weekday() for row in rows} <= weekdays
@@ -0,0 +1,62 @@
+import pytest
+
+pytest.importorskip('statsmodels')
+
+from forecasting.cache import ModelCache
+from forecasting.serve import ForecastService, LocalClient
+
+
+@pytest.fixture(scope='module')
+def client(tmp_path_factory):
+    cache = ModelCache(tmp_path_factory.mktemp('model_cache'))
+    service = ForecastService(assets=('gold',), cache=cache, models=('arima', 'sarima'))
+    return LocalClient(service)
+
+
+def test_health_lists_the_warm_models(client):
+    status, body = client.get('/health')
+    assert status == 200
+    assert body['assets']['gold']['models'] == ['arima', 'sarima']
+
+
+@pytest.mark.parametrize('model', ['arima', 'sarima'])
+def test_post_forecast(client, model):
+    status, body = client.post('/forecast', {'asset': 'gold', 'model': model, 'steps': 5})
+    assert status == 200
+    assert body['model'] == model
+    assert len(body['forecast']) == len(body['index']) == 5
+    assert body['index'] == sorted(body['index'])
+
+
+def test_get_forecast_parses_the_query(client):
+    status, body = client.get('/forecast?asset=gold&model=arima&steps=3')
+    assert status == 200
+    assert len(body['forecast']) == 3
+
+
+def test_same_request_same_answer(client):
+    request = {'asset': 'gold', 'model': 'sarima', 'steps': 4}
+    assert client.post('/forecast', request)[1]['forecast'] == \
+        client.post('/forecast', request)[1]['forecast']
+
+
+@pytest.mark.parametrize('steps', [True, 2.9, '2.9', 'ten', None, [3], 0, 1000])
+def test_bad_steps_are_rejected(client, steps):
+    status, body = client.post('/forecast', {'asset': 'gold', 'model': 'arima', 'steps': steps})
+    assert status == 400
+    assert 'steps' in body['error']
+
+
+@pytest.mark.parametrize('payload', [[], 'x', 3])
+def test_body_must_be_an_object(client, payload):
+    assert client.post('/forecast', payload)[0] == 400
+
+
+def test_unknown_asset_and_model(client):
+    assert client.post('/forecast', {'asset': 'silver'})[0] == 404
+    assert client.post('/forecast', {'asset': 'gold', 'model': 'prophet'})[0] == 404
+    assert client.post('/forecast', {'asset': ['gold']})[0] == 400
+
+
+def test_unknown_route(client):
+    assert client.get('/nowhere')[0] == 404